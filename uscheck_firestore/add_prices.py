@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
 us_tourdata_final.txt 파일의 모든 아이템에 price 필드를 추가하는 스크립트
+(파일을 고치지 않고 적재까지 한 번에 하려면 tour_pipeline.py 사용)
 """
 import json
 import os
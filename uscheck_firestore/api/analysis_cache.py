@@ -0,0 +1,239 @@
+"""
+Gemini 쿼리 분석 결과 캐시
+
+공백/문장부호만 다른 같은 질의("의성 맛집 추천", "의성  맛집 추천!")가 매번 Gemini를 호출하지 않도록
+정규화된 질의 텍스트를 키로 `_parse_analysis_response` 결과를 저장합니다.
+메모리 LRU(TTL) 계층과 선택적인 SQLite 영속 계층으로 구성됩니다.
+"""
+import copy
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(text: str) -> str:
+    """캐시 키용 질의 정규화 (NFKC, 소문자, 문장부호 제거, 공백 정리)"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = _PUNCTUATION.sub(' ', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def analysis_key(text: str, namespace: str = '') -> str:
+    """분석 방식(namespace)별로 분리된 캐시/single-flight 키 (방식이 다르면 결과 형태도 다름)"""
+    normalized = normalize_query(text)
+    return f"{namespace}:{normalized}" if namespace else normalized
+
+
+class TTLCache:
+    """항목별 만료 시간을 가지는 스레드 안전 LRU 캐시"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class SQLiteAnalysisStore:
+    """워커 재시작/워커 간에 공유되는 로컬 SQLite 영속 계층"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS analysis_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM analysis_cache WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict, ttl: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO analysis_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), time.time() + ttl),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> int:
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM analysis_cache WHERE key = ?', (key,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM analysis_cache')
+            self._conn.commit()
+            return cursor.rowcount
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM analysis_cache WHERE expires_at <= ?', (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+
+
+class AnalysisCache:
+    """정규화 질의 -> 분석 결과 캐시 (메모리 LRU + 선택적 SQLite)"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 86400.0, store: SQLiteAnalysisStore = None,
+                 namespace: str = ''):
+        self.ttl = ttl
+        self.namespace = namespace
+        self.memory = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.store = store
+        self._lock = threading.Lock()
+        self.persistent_hits = 0
+        self.persistent_misses = 0
+        self.persistent_errors = 0
+
+    def get(self, query: str) -> Optional[dict]:
+        key = analysis_key(query, self.namespace)
+        value = self.memory.get(key)
+        if value is None and self.store is not None:
+            try:
+                value = self.store.get(key)
+            except Exception as e:
+                logger.warning(f"분석 캐시 영속 계층 조회 실패: {e}")
+                with self._lock:
+                    self.persistent_errors += 1
+                value = None
+            with self._lock:
+                if value is None:
+                    self.persistent_misses += 1
+                else:
+                    self.persistent_hits += 1
+            if value is not None:
+                self.memory.set(key, value)
+        return copy.deepcopy(value) if value is not None else None
+
+    def set(self, query: str, analysis: dict) -> None:
+        key = analysis_key(query, self.namespace)
+        value = copy.deepcopy(analysis)
+        self.memory.set(key, value)
+        if self.store is not None:
+            try:
+                self.store.set(key, value, self.ttl)
+            except Exception as e:
+                logger.warning(f"분석 캐시 영속 계층 저장 실패: {e}")
+                with self._lock:
+                    self.persistent_errors += 1
+
+    def purge(self, query: Optional[str] = None) -> Dict:
+        """관리자용 캐시 비우기 (query를 주면 해당 질의만)"""
+        if query is not None:
+            key = analysis_key(query, self.namespace)
+            removed = {
+                'memory': int(self.memory.delete(key)),
+                'persistent': self.store.delete(key) if self.store is not None else 0,
+            }
+        else:
+            removed = {
+                'memory': self.memory.clear(),
+                'persistent': self.store.clear() if self.store is not None else 0,
+            }
+        logger.info(f"🧹 분석 캐시 비움: {removed}")
+        return removed
+
+    def stats(self) -> Dict:
+        stats = {'memory': self.memory.stats()}
+        if self.store is not None:
+            with self._lock:
+                stats['persistent'] = {
+                    'path': self.store.path,
+                    'hits': self.persistent_hits,
+                    'misses': self.persistent_misses,
+                    'errors': self.persistent_errors,
+                }
+            try:
+                stats['persistent']['size'] = self.store.size()
+            except Exception:
+                stats['persistent']['size'] = None
+        return stats
@@ -1,6 +1,30 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # 쿼리 파이프라인 trace/metric exporter 설정 (none이면 no-op)
+        from .telemetry import configure_telemetry
+        configure_telemetry(getattr(settings, 'OTEL_EXPORTER', 'none'), getattr(settings, 'OTEL_SERVICE_NAME', 'uscheck-api'))
+
+
+def start_server_preload():
+    """서버 프로세스(wsgi.py/asgi.py)에서만 호출하는 시작 작업
+
+    ready()는 manage.py test/migrate/shell과 load.py 같은 스크립트에서도 불리므로 여기서 하지 않음
+    (tour_list 전체 리스너가 스크립트의 projection 조회를 무의미하게 만들고, 관리 명령마다 클라이언트를 생성함)
+    """
+    # 워커 시작 시 공유 클라이언트를 미리 생성
+    warm_up_clients = getattr(settings, 'CLIENT_WARM_UP', [])
+    if warm_up_clients:
+        from .services import REGISTRY
+        REGISTRY.warm_up_in_background(warm_up_clients)
+
+    # 워커 시작 시 tour_list 스냅샷을 미리 적재
+    if getattr(settings, 'TOUR_CACHE_PRELOAD', False):
+        from .services import TOUR_CACHE
+        TOUR_CACHE.start_in_background()
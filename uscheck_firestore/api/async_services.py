@@ -0,0 +1,257 @@
+"""
+/api/query/ 비동기 파이프라인 (ASGI)
+
+Gemini 분석과 tour_list 카탈로그 적재를 동시에 진행하고, 스냅샷에 없는 관광지 상세 정보는
+firestore.AsyncClient로 일괄 조회합니다. Gemini 응답을 기다리는 동안 워커 스레드를 점유하지 않으므로
+워커 하나가 많은 요청을 동시에 처리할 수 있습니다.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from django.conf import settings
+from google.api_core import exceptions as google_exceptions
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from .analysis_cache import analysis_key
+from .clients import get_async_firestore
+from .metrics import GEMINI_LATENCY
+from .resilience import AdmissionRejected, CircuitOpenError, Deadline
+from .services import (
+    ANALYSIS_CACHE,
+    FIRESTORE_IN_QUERY_LIMIT,
+    GEMINI_BREAKER,
+    GEMINI_HEDGE,
+    GEMINI_LIMITER,
+    MIN_CACHEABLE_CONFIDENCE,
+    TOUR_CACHE,
+    TOUR_INDEX,
+    VECTOR_INDEX,
+    GeminiService,
+    _after_wait,
+    _queue_timeout,
+    get_gemini_service,
+)
+from .singleflight import AsyncSingleFlight
+from .telemetry import record_firestore_reads, record_gemini_usage, request_scope, stage
+
+logger = logging.getLogger(__name__)
+
+# 같은 이벤트 루프에서 동시에 들어온 동일 질의의 Gemini 분석을 하나로 합침
+ASYNC_ANALYSIS_FLIGHTS = AsyncSingleFlight()
+
+
+class AsyncQueryPipeline:
+    """GeminiService의 프롬프트/파싱/선택 로직을 재사용하는 비동기 쿼리 처리기"""
+
+    def __init__(self, service: GeminiService):
+        self.service = service
+
+    async def process_query(self, user_query: str, top_k: int = None, deadline: Deadline = None) -> Dict:
+        deadline = deadline or Deadline(getattr(settings, 'QUERY_DEADLINE_SECONDS', None))
+        with request_scope('query.process_async', **{'query.length': len(user_query), 'query.top_k': top_k or 0}):
+            catalogue_task = asyncio.ensure_future(self._load_catalogue())
+            try:
+                # 카탈로그 적재와 Gemini 분석을 겹쳐서 실행
+                analysis_result = await self.analyze_user_query(user_query, deadline)
+                all_spots = await catalogue_task
+
+                if analysis_result['success']:
+                    # 키워드/BM25/벡터 점수 계산은 CPU 작업이므로 이벤트 루프를 막지 않도록 스레드에서 실행
+                    recommendation_result = await asyncio.to_thread(
+                        self.service.select_spots, user_query, analysis_result['analysis'], all_spots,
+                        index=TOUR_INDEX, top_k=top_k, vector_index=VECTOR_INDEX
+                    )
+                else:
+                    recommendation_result = analysis_result
+
+                full_spots = await self._hydrate_spots(recommendation_result.get('recommended_spots', []), deadline)
+
+                response_data = {
+                    'success': True,
+                    'query': user_query,
+                    'analysis': recommendation_result.get('analysis', {}),
+                    'recommended_spots': full_spots,
+                    'gemini_used': analysis_result.get('gemini_used', False),
+                }
+                if analysis_result.get('fallback_reason'):
+                    response_data['fallback_reason'] = analysis_result['fallback_reason']
+                return response_data
+            except AdmissionRejected:
+                raise
+            except Exception as e:
+                logger.error(f"Error processing query (async): {e}")
+                return {'success': False, 'message': str(e)}
+            finally:
+                if not catalogue_task.done():
+                    catalogue_task.cancel()
+
+    async def _load_catalogue(self) -> List[dict]:
+        with stage('catalogue_load'):
+            if TOUR_CACHE.is_ready():
+                return TOUR_CACHE.spots()
+            # 콜드 스타트면 동기 적재를 스레드에서 실행해 Gemini 호출과 겹치게 함
+            return await asyncio.to_thread(TOUR_CACHE.spots)
+
+    # ------------------------------------------------------------------
+    # 분석
+    # ------------------------------------------------------------------
+    async def analyze_user_query(self, user_query: str, deadline: Deadline = None) -> Dict:
+        """사용자 쿼리를 분석하여 관광지 검색 조건 추출 (비동기, 실패 시 로컬 폴백 분석)"""
+        try:
+            if ANALYSIS_CACHE is not None:
+                # 메모리 계층에 없으면 SQLite를 읽으므로 이벤트 루프 밖에서 조회
+                cached = await asyncio.to_thread(ANALYSIS_CACHE.get, user_query)
+                if cached is not None:
+                    logger.info(f"⚡ 쿼리 분석 캐시 적중: {user_query}")
+                    return {
+                        'success': True,
+                        'original_query': user_query,
+                        'analysis': cached,
+                        'processed_query': cached.get('processed_query', user_query),
+                        'gemini_used': True,
+                        'cached': True
+                    }
+
+            if self.service.model is None:
+                return self.service._fallback_result(user_query, 'gemini_unavailable')
+
+            timeout = settings.GEMINI_TIMEOUT_SECONDS
+            if deadline is not None:
+                timeout = deadline.timeout(cap=timeout, reserve=settings.QUERY_HYDRATION_RESERVE_SECONDS)
+                if timeout < settings.GEMINI_MIN_BUDGET_SECONDS:
+                    return self.service._fallback_result(user_query, 'deadline')
+
+            analysis_result = await ASYNC_ANALYSIS_FLIGHTS.do(
+                analysis_key(user_query, settings.GEMINI_ANALYSIS_MODE),
+                lambda: self._generate_and_cache_analysis(user_query, timeout),
+                timeout=timeout,
+            )
+            return {
+                'success': True,
+                'original_query': user_query,
+                'analysis': analysis_result,
+                'processed_query': analysis_result.get('processed_query', user_query),
+                'gemini_used': True,
+                'cached': False
+            }
+        except AdmissionRejected as e:
+            logger.warning(f"🚦 Gemini 동시 호출 한도 초과 ({e.reason}): {e}")
+            if settings.GEMINI_OVERLOAD_ACTION == 'reject':
+                raise
+            return self.service._fallback_result(user_query, 'overloaded', str(e))
+        except CircuitOpenError as e:
+            return self.service._fallback_result(user_query, 'circuit_open', str(e))
+        except (asyncio.TimeoutError, google_exceptions.DeadlineExceeded) as e:
+            logger.error(f"⏱️ Gemini 응답 시간 초과 (async): {e}")
+            return self.service._fallback_result(user_query, 'timeout', str(e))
+        except Exception as e:
+            logger.error(f"❌ Error analyzing user query with Gemini (async): {e}")
+            return self.service._fallback_result(user_query, 'gemini_error', str(e))
+
+    async def _generate_and_cache_analysis(self, user_query: str, timeout: float = None) -> Dict:
+        analysis_result = await self._generate_analysis(user_query, timeout)
+        if ANALYSIS_CACHE is not None and analysis_result.get('confidence', 0) >= MIN_CACHEABLE_CONFIDENCE:
+            await asyncio.to_thread(ANALYSIS_CACHE.set, user_query, analysis_result)
+        return analysis_result
+
+    async def _generate_analysis(self, user_query: str, timeout: float = None) -> Dict:
+        # 동기 경로와 같은 프로세스 단위 동시 호출 한도를 공유
+        with stage('gemini_call'):
+            waited = await GEMINI_LIMITER.acquire_async(_queue_timeout(timeout))
+            try:
+                response = await self._call_with_breaker(user_query, _after_wait(timeout, waited))
+            finally:
+                GEMINI_LIMITER.release()
+            record_gemini_usage(response)
+        with stage('parse'):
+            response_text = self.service._extract_response_text(response)
+            analysis_result = self.service._parse_generated_text(response_text)
+        logger.info(f"Query analysis completed for: {user_query}")
+        return analysis_result
+
+    async def _call_with_breaker(self, user_query: str, timeout: float = None):
+        if not GEMINI_BREAKER.allow():
+            raise CircuitOpenError("Gemini circuit breaker is open")
+
+        with stage('prompt_build'):
+            prompt = self.service._create_analysis_prompt(user_query)
+        logger.info(f"🤖 Gemini AI 비동기 호출 중... (timeout: {timeout}s)")
+        started = time.perf_counter()
+        try:
+            if GEMINI_HEDGE is not None:
+                response = await GEMINI_HEDGE.run_async(
+                    lambda attempt_timeout: self._call_model(prompt, attempt_timeout), timeout
+                )
+            else:
+                response = await self._call_model(prompt, timeout)
+        except Exception as e:
+            GEMINI_LATENCY.observe(time.perf_counter() - started, mode='async', outcome='error')
+            GEMINI_BREAKER.record_failure(e)
+            raise
+        GEMINI_LATENCY.observe(time.perf_counter() - started, mode='async', outcome='success')
+        GEMINI_BREAKER.record_success()
+        return response
+
+    async def _call_model(self, prompt: str, timeout: float = None):
+        return await self.service.model.generate_content_async(
+            prompt,
+            generation_config=self.service._generation_config(),
+            safety_settings=self.service._safety_settings(),
+            request_options={'timeout': timeout} if timeout else None
+        )
+
+    # ------------------------------------------------------------------
+    # 상세 정보 조회
+    # ------------------------------------------------------------------
+    async def _hydrate_spots(self, spots: list, deadline: Deadline = None) -> list:
+        with stage('hydration', spots=len(spots)):
+            spot_ids, items, missing = self.service._resolve_cached_spots(spots)
+            if missing:
+                if deadline is not None and deadline.expired():
+                    logger.warning(f"⏱️ 시간 예산 초과로 Firestore 상세 조회 생략: {len(missing)}개")
+                else:
+                    items.update(await self._fetch_spots(missing, deadline.timeout() if deadline else None))
+            return self.service._assemble_full_spots(spot_ids, items)
+
+    async def _fetch_spots(self, spot_ids: list, timeout: float = None) -> Dict:
+        """contentid 'in' 쿼리 청크를 동시에 실행한 뒤 나머지는 문서 ID get_all로 조회"""
+        db = get_async_firestore()
+        collection_ref = db.collection('tour_list')
+        items = {}
+
+        async def _by_contentid(chunk):
+            try:
+                query = collection_ref.where(filter=FieldFilter('contentid', 'in', chunk))
+                documents = [doc.to_dict() async for doc in query.stream(timeout=timeout)]
+                record_firestore_reads(max(1, len(documents)), 'hydration')
+                return documents
+            except Exception as e:
+                logger.error(f"Error fetching spots by contentid {chunk}: {e}")
+                return []
+
+        chunks = [
+            spot_ids[start:start + FIRESTORE_IN_QUERY_LIMIT]
+            for start in range(0, len(spot_ids), FIRESTORE_IN_QUERY_LIMIT)
+        ]
+        for documents in await asyncio.gather(*(_by_contentid(chunk) for chunk in chunks)):
+            for data in documents:
+                items.setdefault(data.get('contentid'), data)
+
+        remaining = [spot_id for spot_id in spot_ids if spot_id not in items]
+        if remaining:
+            try:
+                refs = [collection_ref.document(spot_id) for spot_id in remaining]
+                async for doc in db.get_all(refs, timeout=timeout):
+                    record_firestore_reads(1, 'hydration')
+                    if doc.exists:
+                        items[doc.id] = doc.to_dict()
+            except Exception as e:
+                logger.error(f"Error fetching spots by document ID {remaining}: {e}")
+        return items
+
+
+def get_async_pipeline() -> AsyncQueryPipeline:
+    """공유 GeminiService를 감싼 비동기 파이프라인"""
+    return AsyncQueryPipeline(get_gemini_service())
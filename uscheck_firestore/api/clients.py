@@ -0,0 +1,184 @@
+"""
+워커 단위 공유 클라이언트 레지스트리
+
+Firestore, Pub/Sub, Cloud Storage 클라이언트와 Gemini 모델을 요청마다 만들지 않고
+워커당 한 번만 (처음 사용할 때) 생성해서 재사용합니다.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """이름별 팩토리로 클라이언트를 지연 생성하고 생성 시간을 기록하는 스레드 안전 레지스트리"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._factories: Dict[str, Callable] = {}
+        self._instances: Dict[str, object] = {}
+        self._name_locks: Dict[str, threading.Lock] = {}
+        self._build_seconds: Dict[str, float] = {}
+        self._built_at: Dict[str, float] = {}
+        self._gets: Dict[str, int] = {}
+        self._errors: Dict[str, str] = {}
+
+    def register(self, name: str, factory: Callable) -> None:
+        """클라이언트 팩토리 등록 (이미 생성된 인스턴스는 유지)"""
+        with self._lock:
+            self._factories[name] = factory
+            self._name_locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str):
+        """클라이언트 조회, 없으면 생성 (동시에 여러 스레드가 요청해도 한 번만 생성)"""
+        with self._lock:
+            self._gets[name] = self._gets.get(name, 0) + 1
+            if name in self._instances:
+                return self._instances[name]
+            if name not in self._factories:
+                raise KeyError(f"Unknown client: {name}")
+            name_lock = self._name_locks[name]
+
+        with name_lock:
+            with self._lock:
+                if name in self._instances:
+                    return self._instances[name]
+                factory = self._factories[name]
+
+            started = time.perf_counter()
+            try:
+                instance = factory()
+            except Exception as e:
+                with self._lock:
+                    self._errors[name] = str(e)
+                raise
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                self._instances[name] = instance
+                self._build_seconds[name] = elapsed
+                self._built_at[name] = time.time()
+                self._errors.pop(name, None)
+            logger.info(f"✅ 클라이언트 생성 완료: {name} ({elapsed * 1000:.1f}ms)")
+            return instance
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """지정한(없으면 등록된 전체) 클라이언트를 미리 생성하고 생성 시간 반환"""
+        if names is None:
+            with self._lock:
+                names = list(self._factories)
+        timings = {}
+        for name in names:
+            try:
+                self.get(name)
+                timings[name] = self._build_seconds.get(name, 0.0)
+            except Exception as e:
+                logger.error(f"❌ 클라이언트 워밍업 실패 ({name}): {e}")
+        return timings
+
+    def warm_up_in_background(self, names: Optional[Iterable[str]] = None) -> None:
+        """워커 시작을 막지 않도록 별도 스레드에서 워밍업"""
+        names = list(names) if names is not None else None
+        threading.Thread(target=self.warm_up, args=(names,), name='client-warm-up', daemon=True).start()
+
+    def reset(self, name: Optional[str] = None) -> None:
+        """생성된 인스턴스 폐기 (다음 get에서 다시 생성)"""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+    def stats(self) -> Dict:
+        """클라이언트별 생성 시간과 재사용 횟수"""
+        with self._lock:
+            return {
+                name: {
+                    'constructed': name in self._instances,
+                    'build_ms': round(self._build_seconds[name] * 1000, 3) if name in self._build_seconds else None,
+                    'built_at': self._built_at.get(name),
+                    'gets': self._gets.get(name, 0),
+                    'last_error': self._errors.get(name),
+                }
+                for name in self._factories
+            }
+
+
+def _firestore_credentials():
+    from google.oauth2 import service_account
+
+    cred_path = os.environ.get("FIRESTORE_CREDENTIALS", "./gen-lang-client-0000121060-ea7b2bef1534.json")
+    return service_account.Credentials.from_service_account_file(cred_path)
+
+
+def _build_firestore_client():
+    from google.cloud import firestore
+    return firestore.Client(credentials=_firestore_credentials())
+
+
+def _build_pubsub_publisher():
+    from django.conf import settings
+    from google.api_core import exceptions, retry
+    from google.cloud import pubsub_v1
+
+    # 짧은 지연으로 여러 요청을 한 번의 Publish RPC로 묶음 (QR 요청은 대화형이라 지연 상한을 작게 유지)
+    batch_settings = pubsub_v1.types.BatchSettings(
+        max_messages=settings.PUBSUB_BATCH_MAX_MESSAGES,
+        max_bytes=settings.PUBSUB_BATCH_MAX_BYTES,
+        max_latency=settings.PUBSUB_BATCH_MAX_LATENCY_SECONDS,
+    )
+    # 기본 재시도 기한(600초) 대신 PUBSUB_PUBLISH_TIMEOUT_SECONDS 안에서만 일시적 오류 재시도
+    publish_retry = retry.Retry(
+        predicate=retry.if_exception_type(
+            exceptions.Aborted,
+            exceptions.DeadlineExceeded,
+            exceptions.InternalServerError,
+            exceptions.ResourceExhausted,
+            exceptions.ServiceUnavailable,
+            exceptions.Unknown,
+        ),
+        initial=0.1,
+        maximum=2.0,
+        multiplier=2.0,
+        timeout=settings.PUBSUB_PUBLISH_TIMEOUT_SECONDS,
+    )
+    publisher_options = pubsub_v1.types.PublisherOptions(
+        retry=publish_retry,
+        timeout=settings.PUBSUB_PUBLISH_TIMEOUT_SECONDS,
+    )
+    return pubsub_v1.PublisherClient(batch_settings=batch_settings, publisher_options=publisher_options)
+
+
+def _build_storage_client():
+    from google.cloud import storage
+    return storage.Client()
+
+
+REGISTRY = ClientRegistry()
+REGISTRY.register('firestore', _build_firestore_client)
+REGISTRY.register('pubsub_publisher', _build_pubsub_publisher)
+REGISTRY.register('storage', _build_storage_client)
+
+# gRPC aio 채널은 생성된 이벤트 루프에 묶이므로 AsyncClient는 루프별로 하나씩 유지
+_async_firestore_clients = weakref.WeakKeyDictionary()
+_async_firestore_lock = threading.Lock()
+
+
+def get_async_firestore():
+    """현재 이벤트 루프 전용 Firestore AsyncClient"""
+    from google.cloud import firestore
+
+    loop = asyncio.get_running_loop()
+    with _async_firestore_lock:
+        client = _async_firestore_clients.get(loop)
+        if client is None:
+            started = time.perf_counter()
+            client = firestore.AsyncClient(credentials=_firestore_credentials())
+            _async_firestore_clients[loop] = client
+            logger.info(f"✅ 클라이언트 생성 완료: firestore_async ({(time.perf_counter() - started) * 1000:.1f}ms)")
+        return client
@@ -0,0 +1,242 @@
+"""
+Gemini 요청 hedging
+
+첫 호출이 최근 지연 시간의 p 백분위수 안에 끝나지 않으면 같은 요청을 한 번 더 보내고 먼저 끝난 응답을 사용합니다.
+hedge 비율 상한(max_ratio)으로 추가 호출 비용을 제한하고, limiter가 있으면 hedge 요청도 자리를 하나 차지하며
+빈 자리가 없으면 hedge하지 않습니다 (과부하일 때 hedge가 부하를 더 키우지 않도록).
+
+동기 generate_content는 실행 중인 호출을 중단할 방법이 없으므로 진 쪽 호출은 결과만 버려지고
+끝날 때까지 스레드 하나를 점유합니다. 비동기 경로(run_async)는 진 쪽 Task를 실제로 취소합니다.
+"""
+import asyncio
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """최근 window개 호출의 지연 시간(초)"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(0, math.ceil(p / 100.0 * len(samples)) - 1)
+        return samples[min(rank, len(samples) - 1)]
+
+
+class HedgePolicy:
+    """p 백분위수 지연 후 두 번째 요청을 보내는 hedging 정책"""
+
+    def __init__(self, percentile: float = 95.0, max_ratio: float = 0.1, min_samples: int = 20,
+                 min_delay: float = 0.05, window: int = 200, max_workers: int = 16,
+                 limiter=None):
+        self.percentile = percentile
+        self.limiter = limiter  # resilience.ConcurrencyLimiter (hedge 요청도 자리 하나를 차지)
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.latencies = LatencyTracker(window)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gemini-hedge')
+        self._lock = threading.Lock()
+        self._recent_hedges = deque(maxlen=window)  # 최근 요청별 hedge 여부 (비율 상한 계산용)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.budget_denied = 0
+        self.slot_denied = 0
+        self.failures = 0
+
+    # ------------------------------------------------------------------
+    # 정책
+    # ------------------------------------------------------------------
+    def hedge_delay(self) -> Optional[float]:
+        """두 번째 요청을 보낼 때까지 기다릴 시간 (표본이 부족하면 None = hedge 안 함)"""
+        if len(self.latencies) < self.min_samples:
+            return None
+        threshold = self.latencies.percentile(self.percentile)
+        return max(self.min_delay, threshold) if threshold is not None else None
+
+    def _begin(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def _try_acquire_hedge(self) -> bool:
+        """hedge 비율 상한과 동시 호출 자리를 모두 얻었을 때만 True (자리는 hedge 호출이 끝나면 _release_slot)"""
+        if self.limiter is not None and not self.limiter.try_acquire():
+            with self._lock:
+                self.slot_denied += 1
+            return False
+        with self._lock:
+            window = len(self._recent_hedges) + 1
+            if (sum(self._recent_hedges) + 1) / window > self.max_ratio:
+                self.budget_denied += 1
+                denied = True
+            else:
+                self.hedged += 1
+                denied = False
+        if denied and self.limiter is not None:
+            self.limiter.release()
+        return not denied
+
+    def _release_slot(self, _done=None) -> None:
+        if self.limiter is not None:
+            self.limiter.release()
+
+    def _finish(self, hedged: bool, winner: Optional[str]) -> None:
+        with self._lock:
+            self._recent_hedges.append(hedged)
+            if winner == 'hedge':
+                self.hedge_wins += 1
+            elif winner == 'primary' and hedged:
+                self.primary_wins += 1
+            elif winner is None:
+                self.failures += 1
+
+    def _timed(self, fn: Callable, timeout: Optional[float]):
+        started = time.monotonic()
+        result = fn(timeout)
+        self.latencies.record(time.monotonic() - started)
+        return result
+
+    # ------------------------------------------------------------------
+    # 실행
+    # ------------------------------------------------------------------
+    def run(self, fn: Callable, timeout: Optional[float] = None):
+        """fn(timeout)을 실행하고 필요하면 hedge 요청을 보내 먼저 성공한 결과 반환"""
+        self._begin()
+        started = time.monotonic()
+        delay = self.hedge_delay()
+        if delay is None or (timeout is not None and delay >= timeout):
+            try:
+                result = self._timed(fn, timeout)
+            except Exception:
+                self._finish(False, None)
+                raise
+            self._finish(False, 'primary')
+            return result
+
+        # 호출 스레드의 context(요청 span, 사용량 집계)를 이어받도록 호출마다 복사본에서 실행
+        primary = self._executor.submit(contextvars.copy_context().run, self._timed, fn, timeout)
+        futures = {primary: 'primary'}
+        done, _ = wait([primary], timeout=delay)
+        if not done and self._try_acquire_hedge():
+            remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - started))
+            logger.info(f"🔀 Gemini 응답이 {delay:.2f}s(p{self.percentile:g}) 안에 오지 않아 hedge 요청 전송")
+            hedge = self._executor.submit(contextvars.copy_context().run, self._timed, fn, remaining)
+            # 진 쪽 호출은 끝날 때까지 실제로 실행 중이므로 그때 자리 반납 (시작 전 취소되면 바로)
+            hedge.add_done_callback(self._release_slot)
+            futures[hedge] = 'hedge'
+
+        last_error = None
+        pending = set(futures)
+        while pending:
+            wait_timeout = None if timeout is None else max(0.0, timeout - (time.monotonic() - started))
+            done, pending = wait(pending, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    # 진 쪽은 아직 시작 전이면 취소되고, 실행 중이면 결과만 버려짐
+                    for other in pending:
+                        other.cancel()
+                    self._finish(len(futures) > 1, futures[future])
+                    return future.result()
+                last_error = future.exception()
+
+        self._finish(len(futures) > 1, None)
+        if last_error is not None:
+            raise last_error
+        raise TimeoutError(f"Gemini call did not finish within {timeout}s")
+
+    async def run_async(self, coro_fn: Callable, timeout: Optional[float] = None):
+        """run의 asyncio 버전 (진 쪽 Task는 취소됨)"""
+        self._begin()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        async def timed(attempt_timeout):
+            attempt_started = loop.time()
+            result = await coro_fn(attempt_timeout)
+            self.latencies.record(loop.time() - attempt_started)
+            return result
+
+        delay = self.hedge_delay()
+        tasks = {asyncio.ensure_future(timed(timeout)): 'primary'}
+        try:
+            if delay is not None and (timeout is None or delay < timeout):
+                done, _ = await asyncio.wait(set(tasks), timeout=delay)
+                if not done and self._try_acquire_hedge():
+                    remaining = None if timeout is None else max(0.0, timeout - (loop.time() - started))
+                    logger.info(f"🔀 Gemini 응답이 {delay:.2f}s(p{self.percentile:g}) 안에 오지 않아 hedge 요청 전송")
+                    hedge = asyncio.ensure_future(timed(remaining))
+                    hedge.add_done_callback(self._release_slot)
+                    tasks[hedge] = 'hedge'
+
+            last_error = None
+            pending = set(tasks)
+            while pending:
+                wait_timeout = None if timeout is None else max(0.0, timeout - (loop.time() - started))
+                done, pending = await asyncio.wait(pending, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        self._finish(len(tasks) > 1, tasks[task])
+                        return task.result()
+                    last_error = task.exception()
+
+            self._finish(len(tasks) > 1, None)
+            if last_error is not None:
+                raise last_error
+            raise asyncio.TimeoutError(f"Gemini call did not finish within {timeout}s")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        delay = self.hedge_delay()
+        with self._lock:
+            recent = len(self._recent_hedges)
+            return {
+                'percentile': self.percentile,
+                'max_ratio': self.max_ratio,
+                'samples': len(self.latencies),
+                'hedge_delay_ms': ms(delay),
+                'latency_p50_ms': ms(self.latencies.percentile(50)),
+                'latency_p95_ms': ms(self.latencies.percentile(95)),
+                'latency_p99_ms': ms(self.latencies.percentile(99)),
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'hedge_rate': round(self.hedged / self.requests, 4) if self.requests else None,
+                'recent_hedge_rate': round(sum(self._recent_hedges) / recent, 4) if recent else None,
+                'hedge_wins': self.hedge_wins,
+                'primary_wins_after_hedge': self.primary_wins,
+                'budget_denied': self.budget_denied,
+                'slot_denied': self.slot_denied,
+                'failures': self.failures,
+            }
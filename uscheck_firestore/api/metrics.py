@@ -0,0 +1,216 @@
+"""
+Prometheus 텍스트 형식 /metrics 용 경량 레지스트리
+
+요청 경로에서는 lock 하나 아래에서 정수/실수 덧셈만 하고, 문자열 렌더링과 캐시 적중률 같은
+파생 값 계산은 스크래핑 시점(collector)에만 하므로 운영 환경에서 켜 두어도 부담이 거의 없습니다.
+"""
+import bisect
+import logging
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# HTTP/Gemini/Pub/Sub 호출 지연 시간용 기본 버킷 (초)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """단조 증가 카운터"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in values]
+
+
+class Histogram(_Metric):
+    """고정 버킷 히스토그램 (버킷별 개수만 저장, 누적 합은 렌더링할 때 계산)"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}  # key -> [버킷별 개수..., +Inf 개수, 합계]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, (('le', _format_value(float(bound))),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """메트릭과 스크래핑 시점 collector 모음"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable] = []
+        self._caches: Dict[str, Callable] = {}
+        self._collectors.append(self._cache_metrics)
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # 모듈 재로드 시 같은 이름은 기존 메트릭 재사용
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable) -> None:
+        """collector()는 (이름, 종류, 설명, [(라벨 dict, 값), ...]) 목록을 반환"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def register_cache(self, name: str, stats: Callable) -> None:
+        """캐시 적중률 수집 대상 등록 (stats()는 hits/misses 키를 가진 dict, 캐시가 없으면 None)"""
+        with self._lock:
+            self._caches[name] = stats
+
+    def _cache_metrics(self):
+        """스크래핑 시점에 등록된 캐시들의 적중/미스 수와 적중률 계산"""
+        with self._lock:
+            caches = list(self._caches.items())
+        samples = []
+        for name, stats_fn in caches:
+            stats = stats_fn()
+            if stats is not None:
+                samples.append((name, stats['hits'], stats['misses']))
+
+        def ratio(hits, misses):
+            return hits / (hits + misses) if hits + misses else None
+
+        return [
+            ('uscheck_cache_hits_total', 'counter', 'Cache lookups served from the cache',
+             [({'cache': name}, hits) for name, hits, _ in samples]),
+            ('uscheck_cache_misses_total', 'counter', 'Cache lookups that missed',
+             [({'cache': name}, misses) for name, _, misses in samples]),
+            ('uscheck_cache_hit_ratio', 'gauge', 'Cache hit ratio since process start',
+             [({'cache': name}, ratio(hits, misses)) for name, hits, misses in samples]),
+        ]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.warning(f"메트릭 collector 실행 실패: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f'{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
+
+HTTP_REQUESTS = METRICS.counter(
+    'uscheck_http_requests_total', 'HTTP requests by route, method and status', ('route', 'method', 'status')
+)
+HTTP_LATENCY = METRICS.histogram(
+    'uscheck_http_request_duration_seconds', 'HTTP request latency by route', ('route', 'method')
+)
+GEMINI_LATENCY = METRICS.histogram(
+    'uscheck_gemini_request_duration_seconds', 'Gemini generate_content latency', ('mode', 'outcome')
+)
+GEMINI_FINISH_REASONS = METRICS.counter(
+    'uscheck_gemini_finish_reasons_total', 'Gemini responses by finish_reason', ('finish_reason',)
+)
+GEMINI_FALLBACKS = METRICS.counter(
+    'uscheck_gemini_fallbacks_total', 'Queries answered by local fallback analysis, by reason', ('reason',)
+)
+PUBSUB_PUBLISH_LATENCY = METRICS.histogram(
+    'uscheck_pubsub_publish_duration_seconds', 'Pub/Sub publish latency until the message id is returned',
+    ('topic', 'outcome')
+)
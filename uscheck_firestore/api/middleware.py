@@ -0,0 +1,53 @@
+"""
+요청 수/지연 시간 수집 미들웨어
+
+라벨은 요청 경로가 아니라 URL 패턴 이름(api:query 등)을 사용해 시계열 수가 라우트 수로 제한됩니다.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import HTTP_LATENCY, HTTP_REQUESTS
+
+UNMATCHED_ROUTE = 'unmatched'
+
+
+def _route(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED_ROUTE
+    return match.view_name or match.route or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """동기/비동기 뷰 모두에서 라우트별 요청 수와 지연 시간 기록"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, started)
+        return response
+
+    def _record(self, request, response, started: float) -> None:
+        # 스트리밍 응답은 첫 바이트까지의 시간
+        elapsed = time.perf_counter() - started
+        route = _route(request)
+        HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+        HTTP_LATENCY.observe(elapsed, route=route, method=request.method)
@@ -0,0 +1,179 @@
+"""
+QR 생성 요청 Pub/Sub 발행
+
+워커 공유 PublisherClient(clients.REGISTRY)로 발행하고, 발행 결과는 future 콜백에서 처리합니다.
+- sync: 발행 완료(message_id)까지 기다린 뒤 응답 (실패는 호출자에게 그대로 전달)
+- async: 바로 request_id/original_data를 돌려주고, 실패하면 백그라운드에서 재시도한 뒤
+  끝내 실패한 메시지는 Firestore dead-letter 컬렉션(qr_publish_failures)에 남김
+"""
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .clients import REGISTRY
+from .metrics import METRICS, PUBSUB_PUBLISH_LATENCY
+
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_COLLECTION = 'qr_publish_failures'
+
+PUBSUB_PUBLISH_RETRIES = METRICS.counter(
+    'uscheck_pubsub_publish_retries_total', 'Background re-publish attempts after a failed publish', ('topic',)
+)
+PUBSUB_DEAD_LETTERS = METRICS.counter(
+    'uscheck_pubsub_dead_letters_total', 'Messages given up on and written to the dead-letter collection',
+    ('topic', 'stored')
+)
+
+
+class QRRequestPublisher:
+    """QR 생성 요청 발행기 (재시도/dead-letter/통계)"""
+
+    def __init__(self, project_id: str, topic: str, max_attempts: int = 3, retry_backoff: float = 1.0,
+                 dead_letter_collection: str = DEAD_LETTER_COLLECTION):
+        self.project_id = project_id
+        self.topic = topic
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.dead_letter_collection = dead_letter_collection
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.published = 0
+        self.failed_attempts = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.dead_letter_errors = 0
+        self.last_error = None
+
+    def _topic_path(self, publisher) -> str:
+        return publisher.topic_path(self.project_id, self.topic)
+
+    def publish_and_wait(self, qr_data: Dict, timeout: float) -> str:
+        """발행 완료까지 기다린 뒤 message_id 반환"""
+        publisher = REGISTRY.get('pubsub_publisher')
+        started = time.perf_counter()
+        try:
+            message_id = publisher.publish(self._topic_path(publisher), _encode(qr_data)).result(timeout=timeout)
+        except Exception as e:
+            PUBSUB_PUBLISH_LATENCY.observe(time.perf_counter() - started, topic=self.topic, outcome='error')
+            with self._lock:
+                self.failed_attempts += 1
+                self.last_error = str(e)
+            raise
+        PUBSUB_PUBLISH_LATENCY.observe(time.perf_counter() - started, topic=self.topic, outcome='success')
+        with self._lock:
+            self.published += 1
+        return message_id
+
+    def publish_in_background(self, qr_data: Dict) -> None:
+        """발행만 시작하고 바로 반환 (결과는 콜백에서 처리)"""
+        with self._lock:
+            self._pending += 1
+        self._attempt(qr_data, 1)
+
+    def _attempt(self, qr_data: Dict, attempt: int) -> None:
+        started = time.perf_counter()
+        try:
+            publisher = REGISTRY.get('pubsub_publisher')
+            future = publisher.publish(self._topic_path(publisher), _encode(qr_data))
+        except Exception as e:
+            # 클라이언트 생성 실패나 publisher 종료 등 발행 자체가 시작되지 않은 경우
+            self._on_failure(qr_data, attempt, started, e)
+            return
+        future.add_done_callback(lambda done: self._on_done(done, qr_data, attempt, started))
+
+    def _on_done(self, future, qr_data: Dict, attempt: int, started: float) -> None:
+        error = future.exception()
+        if error is not None:
+            self._on_failure(qr_data, attempt, started, error)
+            return
+        PUBSUB_PUBLISH_LATENCY.observe(time.perf_counter() - started, topic=self.topic, outcome='success')
+        with self._lock:
+            self.published += 1
+            self._pending -= 1
+        logger.info(f"QR 생성 요청 발행 완료: {future.result()} (request_id: {qr_data.get('request_id')})")
+
+    def _on_failure(self, qr_data: Dict, attempt: int, started: float, error: Exception) -> None:
+        PUBSUB_PUBLISH_LATENCY.observe(time.perf_counter() - started, topic=self.topic, outcome='error')
+        with self._lock:
+            self.failed_attempts += 1
+            self.last_error = str(error)
+
+        if attempt < self.max_attempts:
+            delay = self.retry_backoff * (2 ** (attempt - 1))
+            logger.warning(f"⚠️ QR 생성 요청 발행 실패 ({attempt}/{self.max_attempts}), {delay:.1f}s 후 재시도: {error}")
+            with self._lock:
+                self.retried += 1
+            PUBSUB_PUBLISH_RETRIES.inc(topic=self.topic)
+            timer = threading.Timer(delay, self._attempt, args=(qr_data, attempt + 1))
+            timer.daemon = True
+            timer.start()
+            return
+
+        logger.error(f"❌ QR 생성 요청 발행 최종 실패, dead-letter 기록: {qr_data.get('request_id')} ({error})")
+        stored = self._dead_letter(qr_data, attempt, error)
+        PUBSUB_DEAD_LETTERS.inc(topic=self.topic, stored=str(stored).lower())
+        with self._lock:
+            self._pending -= 1
+            self.dead_lettered += 1
+            if not stored:
+                self.dead_letter_errors += 1
+
+    def _dead_letter(self, qr_data: Dict, attempts: int, error: Exception) -> bool:
+        """재발행/조사용으로 원본 메시지와 오류를 Firestore에 기록"""
+        try:
+            db = REGISTRY.get('firestore')
+            db.collection(self.dead_letter_collection).document(qr_data['request_id']).set({
+                'topic': self.topic,
+                'message': qr_data,
+                'original_data': qr_data.get('original_data'),
+                'attempts': attempts,
+                'error': str(error),
+                'failed_at': timezone.now().isoformat(),
+            })
+            return True
+        except Exception as e:
+            # 여기까지 실패하면 로그가 유일한 기록
+            logger.error(f"❌ dead-letter 기록 실패: {e} / message: {json.dumps(qr_data, ensure_ascii=False)}")
+            return False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'topic': self.topic,
+                'pending': self._pending,
+                'published': self.published,
+                'failed_attempts': self.failed_attempts,
+                'retried': self.retried,
+                'dead_lettered': self.dead_lettered,
+                'dead_letter_errors': self.dead_letter_errors,
+                'max_attempts': self.max_attempts,
+                'last_error': self.last_error,
+            }
+
+
+def _encode(qr_data: Dict) -> bytes:
+    return json.dumps(qr_data, ensure_ascii=False).encode('utf-8')
+
+
+_publisher_lock = threading.Lock()
+_publisher: Optional[QRRequestPublisher] = None
+
+
+def get_qr_publisher(project_id: str, topic: str) -> QRRequestPublisher:
+    """워커 전체에서 공유하는 QR 요청 발행기"""
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = QRRequestPublisher(
+                    project_id, topic,
+                    max_attempts=settings.QR_PUBLISH_MAX_ATTEMPTS,
+                    retry_backoff=settings.QR_PUBLISH_RETRY_BACKOFF_SECONDS,
+                )
+    return _publisher
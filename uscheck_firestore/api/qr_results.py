@@ -0,0 +1,259 @@
+"""
+qr_results 조회 (/api/qr/generate/pubsub/, /api/qr/wait/)
+
+QR 생성 워커(main.py)는 qr_results 문서를 sha256(original_data) 문서 ID로 저장하므로
+조회는 쿼리 없이 문서 get 한 번입니다. 클라이언트는 워커가 끝날 때까지 같은 original_data로
+반복 조회하므로, 결과를 프로세스 캐시에 두고 "아직 없음"도 짧은 TTL로 캐시해
+폴링이 몰려도 Firestore 읽기는 키당 TTL마다 한 번으로 제한합니다.
+
+QRResultHub는 결과가 생길 때까지 요청을 붙잡아 두는 long-poll용으로, 같은 original_data를
+기다리는 요청들이 문서 on_snapshot 리스너 하나를 공유합니다 (대기 중인 QR 하나당 리스너 하나).
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+
+from .analysis_cache import TTLCache
+from .clients import REGISTRY
+from .metrics import METRICS
+from .singleflight import SingleFlight
+from .telemetry import record_firestore_reads
+
+logger = logging.getLogger(__name__)
+
+QR_RESULTS_COLLECTION = 'qr_results'
+
+_NOT_CACHED = object()
+
+
+def qr_result_id(original_data: str) -> str:
+    """qr_results 문서 ID (main.py의 _qr_result_id와 같은 규칙이어야 함)"""
+    return hashlib.sha256(original_data.encode('utf-8')).hexdigest()
+
+
+class QRResultLookup:
+    """original_data -> qr_results 문서 (양성/음성 결과 TTL 캐시 + 동시 조회 합치기)"""
+
+    def __init__(self, client_factory: Callable, collection: str = QR_RESULTS_COLLECTION,
+                 ttl: float = 3600.0, negative_ttl: float = 1.0, max_entries: int = 10000,
+                 timeout: Optional[float] = 5.0):
+        self._client_factory = client_factory
+        self._collection = collection
+        self.negative_ttl = negative_ttl
+        self._timeout = timeout
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.negative_results = 0
+
+    def get(self, original_data: str) -> Optional[Dict]:
+        """문서 데이터, 아직 없으면 None"""
+        doc_id = qr_result_id(original_data)
+        cached = self._cache.get(doc_id, _NOT_CACHED)
+        if cached is not _NOT_CACHED:
+            return cached
+        return self._flights.do(doc_id, lambda: self._load(doc_id))
+
+    def _load(self, doc_id: str) -> Optional[Dict]:
+        snapshot = self._client_factory().collection(self._collection).document(doc_id).get(timeout=self._timeout)
+        record_firestore_reads(1, 'qr_lookup')
+        with self._lock:
+            self.reads += 1
+        if not snapshot.exists:
+            # 워커가 아직 처리 중일 수 있으므로 짧게만 캐시
+            with self._lock:
+                self.negative_results += 1
+            self._cache.set(doc_id, None, ttl=self.negative_ttl)
+            return None
+        data = snapshot.to_dict()
+        self._cache.set(doc_id, data)
+        return data
+
+    def remember(self, original_data: str, data: Dict) -> None:
+        """다른 경로(리스너)로 받은 결과를 캐시에 반영"""
+        self._cache.set(qr_result_id(original_data), data)
+
+    def invalidate(self, original_data: str) -> bool:
+        return self._cache.delete(qr_result_id(original_data))
+
+    def stats(self) -> Dict:
+        stats = self._cache.stats()
+        with self._lock:
+            stats.update({
+                'negative_ttl_seconds': self.negative_ttl,
+                'firestore_reads': self.reads,
+                'negative_results': self.negative_results,
+                'collapsed_lookups': self._flights.stats()['collapsed'],
+            })
+        return stats
+
+
+class _PendingResult:
+    """original_data 하나를 기다리는 요청들이 공유하는 상태"""
+
+    def __init__(self, original_data: str):
+        self.original_data = original_data
+        self.event = threading.Event()
+        self.result = None
+        self.waiters = 0
+        self.watch = None
+        self.futures = []  # (이벤트 루프, asyncio.Future) - 비동기 대기자
+
+
+class QRResultHub:
+    """qr_results 문서가 생기면 대기 중인 요청 전체에 알림 (키당 on_snapshot 리스너 하나)"""
+
+    def __init__(self, client_factory: Callable, lookup: QRResultLookup = None,
+                 collection: str = QR_RESULTS_COLLECTION):
+        self._client_factory = client_factory
+        self._lookup = lookup
+        self._collection = collection
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _PendingResult] = {}
+        # 리스너 해제는 리스너 스레드를 join하므로 콜백 스레드가 아닌 곳에서 실행
+        self._closer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='qr-hub-close')
+        self.listeners_started = 0
+        self.resolved = 0
+        self.timeouts = 0
+        self.max_waiters = 0
+
+    def wait(self, original_data: str, timeout: float) -> Optional[Dict]:
+        """문서가 생길 때까지 최대 timeout초 대기 (스레드를 점유함, 없으면 None)"""
+        doc_id, entry = self._join(original_data)
+        try:
+            if not entry.event.wait(timeout):
+                self._count_timeout()
+            return entry.result
+        finally:
+            self._leave(doc_id, entry)
+
+    async def wait_async(self, original_data: str, timeout: float) -> Optional[Dict]:
+        """wait의 asyncio 버전 (대기 중 워커 스레드를 점유하지 않음)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        # 클라이언트 생성과 on_snapshot 등록(리스너 스레드 시작)은 블로킹이므로 이벤트 루프 밖에서 실행
+        joining = asyncio.ensure_future(asyncio.to_thread(self._join, original_data, waiter))
+        try:
+            doc_id, entry = await asyncio.shield(joining)
+        except asyncio.CancelledError:
+            # 등록은 스레드에서 계속 진행되므로 끝나는 대로 대기자에서 빠짐
+            joining.add_done_callback(
+                lambda done: self._leave(*done.result(), waiter)
+                if not done.cancelled() and done.exception() is None else None
+            )
+            raise
+        try:
+            if entry.event.is_set():
+                return entry.result
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                self._count_timeout()
+                return None
+        finally:
+            self._leave(doc_id, entry, waiter)
+
+    def _join(self, original_data: str, waiter=None):
+        doc_id = qr_result_id(original_data)
+        start_listener = False
+        with self._lock:
+            entry = self._pending.get(doc_id)
+            if entry is None:
+                entry = self._pending[doc_id] = _PendingResult(original_data)
+                start_listener = True
+            entry.waiters += 1
+            self.max_waiters = max(self.max_waiters, entry.waiters)
+            if waiter is not None:
+                entry.futures.append(waiter)
+
+        if start_listener:
+            try:
+                # 첫 스냅샷에 현재 상태가 오므로 등록 직전에 문서가 써졌어도 놓치지 않음
+                doc_ref = self._client_factory().collection(self._collection).document(doc_id)
+                watch = doc_ref.on_snapshot(lambda docs, changes, read_time: self._on_snapshot(doc_id, docs))
+            except Exception as e:
+                logger.error(f"❌ qr_results 리스너 등록 실패 ({doc_id}): {e}")
+                self._leave(doc_id, entry, waiter)
+                raise
+            with self._lock:
+                self.listeners_started += 1
+                if self._pending.get(doc_id) is entry and not entry.event.is_set():
+                    entry.watch = watch
+                    watch = None
+            if watch is not None:
+                # 등록하는 사이에 이미 결과가 왔거나 대기자가 모두 떠남
+                self._closer.submit(watch.unsubscribe)
+        return doc_id, entry
+
+    def _leave(self, doc_id: str, entry: _PendingResult, waiter=None) -> None:
+        watch = None
+        with self._lock:
+            entry.waiters -= 1
+            if waiter is not None and waiter in entry.futures:
+                entry.futures.remove(waiter)
+            if entry.waiters <= 0 and self._pending.get(doc_id) is entry:
+                # 마지막 대기자가 시간 초과로 떠나면 리스너 정리
+                del self._pending[doc_id]
+                watch, entry.watch = entry.watch, None
+        if watch is not None:
+            self._closer.submit(watch.unsubscribe)
+
+    def _on_snapshot(self, doc_id: str, docs) -> None:
+        for doc in docs:
+            if doc.exists:
+                self._resolve(doc_id, doc.to_dict())
+                return
+
+    def _resolve(self, doc_id: str, data: Dict) -> None:
+        with self._lock:
+            entry = self._pending.pop(doc_id, None)
+            if entry is None:
+                return
+            entry.result = data
+            entry.event.set()
+            futures, entry.futures = entry.futures, []
+            watch, entry.watch = entry.watch, None
+            self.resolved += 1
+        if self._lookup is not None:
+            self._lookup.remember(entry.original_data, data)
+        for loop, future in futures:
+            loop.call_soon_threadsafe(_set_result, future, data)
+        if watch is not None:
+            self._closer.submit(watch.unsubscribe)
+
+    def _count_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'pending_keys': len(self._pending),
+                'waiters': sum(entry.waiters for entry in self._pending.values()),
+                'max_waiters_per_key': self.max_waiters,
+                'listeners_started': self.listeners_started,
+                'resolved': self.resolved,
+                'timeouts': self.timeouts,
+            }
+
+
+def _set_result(future: asyncio.Future, data: Dict) -> None:
+    if not future.done():
+        future.set_result(data)
+
+
+QR_RESULTS = QRResultLookup(
+    lambda: REGISTRY.get('firestore'),
+    ttl=settings.QR_LOOKUP_CACHE_TTL_SECONDS,
+    negative_ttl=settings.QR_LOOKUP_NEGATIVE_TTL_SECONDS,
+    max_entries=settings.QR_LOOKUP_CACHE_MAX_ENTRIES,
+)
+METRICS.register_cache('qr_lookup', QR_RESULTS.stats)
+QR_RESULT_HUB = QRResultHub(lambda: REGISTRY.get('firestore'), lookup=QR_RESULTS)
@@ -0,0 +1,76 @@
+"""
+추천 결과 구성 규칙 (서버에서 결정적으로 적용)
+
+예전에는 System Instruction으로 Gemini에게 맡기던 규칙을 검색 이후 선택 단계에서 직접 보장합니다.
+- 응답 개수: 최소 min_results개 (요청한 limit보다 많이 채우지는 않음)
+- 음식점 (contenttypeid 39): 최소 min_restaurants개
+- 숙박시설 (contenttypeid 32): 전부 포함
+"""
+from typing import Dict, List
+
+RESTAURANT_CONTENT_TYPE = '39'
+LODGING_CONTENT_TYPE = '32'
+
+
+def _content_type(spot: dict) -> str:
+    return str(spot.get('contenttypeid', ''))
+
+
+def apply_result_quotas(recommended: List[dict], all_spots: List[dict], limit: int,
+                        scores: Dict[str, float] = None, min_results: int = 15,
+                        min_restaurants: int = 3, include_all_lodgings: bool = True) -> List[dict]:
+    """
+    relevance 순 추천 목록에 구성 규칙을 적용한 최종 목록 반환
+
+    - 빠진 숙박시설/음식점은 BM25 점수(없으면 카탈로그 순) 순으로 추가하고, 자리가 모자라면
+      규칙과 무관한 가장 낮은 순위 항목부터 밀어냄
+    - 최소 개수에 못 미치면 카탈로그 순서로 채움
+    - limit이 규칙보다 작으면 숙박시설 -> 음식점 순으로 limit까지만 보장
+    """
+    scores = scores or {}
+    target = min(limit, max(len(recommended), min_results))
+    selected = list(recommended[:limit])
+    selected_ids = {spot.get('id') for spot in selected}
+
+    def by_relevance(spots):
+        return sorted(spots, key=lambda spot: -scores.get(spot.get('id'), 0.0))
+
+    # 1. 규칙상 반드시 들어가야 하는 항목
+    required = []
+    if include_all_lodgings:
+        required += [spot for spot in selected if _content_type(spot) == LODGING_CONTENT_TYPE]
+        required += by_relevance([
+            spot for spot in all_spots
+            if _content_type(spot) == LODGING_CONTENT_TYPE and spot.get('id') not in selected_ids
+        ])
+    restaurants = [spot for spot in selected if _content_type(spot) == RESTAURANT_CONTENT_TYPE]
+    if len(restaurants) < min_restaurants:
+        extra = by_relevance([
+            spot for spot in all_spots
+            if _content_type(spot) == RESTAURANT_CONTENT_TYPE and spot.get('id') not in selected_ids
+        ])
+        restaurants += extra[:min_restaurants - len(restaurants)]
+    required += restaurants[:min_restaurants]
+    required = required[:limit]
+    required_ids = {spot.get('id') for spot in required}
+
+    # 2. 최소 개수까지 카탈로그 순서로 채움
+    if len(selected) < target:
+        for spot in all_spots:
+            if len(selected) >= target:
+                break
+            if spot.get('id') not in selected_ids:
+                selected.append(spot)
+                selected_ids.add(spot.get('id'))
+
+    # 3. 빠진 필수 항목이 들어갈 자리를 만들고 (낮은 순위의 일반 항목부터 제거) 뒤에 추가
+    missing = [spot for spot in required if spot.get('id') not in selected_ids]
+    capacity = max(target, len(required))
+    overflow = len(selected) + len(missing) - capacity
+    for index in range(len(selected) - 1, -1, -1):
+        if overflow <= 0:
+            break
+        if selected[index].get('id') not in required_ids:
+            del selected[index]
+            overflow -= 1
+    return selected + missing
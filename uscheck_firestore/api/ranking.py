@@ -0,0 +1,81 @@
+"""
+관광지 추천 relevance 랭킹 (BM25F)
+
+역색인에서 키워드를 포함하는 후보만 모은 뒤 필드 가중치(이름 > 카테고리 > 개요)를 적용한
+BM25 점수로 정렬합니다. 전체 정렬 대신 heapq.nlargest로 상위 k개만 선택합니다.
+"""
+import heapq
+import math
+from typing import Dict, Iterable, List, Tuple
+
+from .search_index import NgramIndex
+
+# 필드별 가중치 (제목 일치가 개요 일치보다 훨씬 강한 신호)
+FIELD_BOOSTS = {
+    'name': 3.0,
+    'category': 2.0,
+    'overview': 1.0,
+}
+
+
+class BM25Ranker:
+    """NgramIndex 위에서 동작하는 BM25F 스코어러"""
+
+    def __init__(self, index: NgramIndex, k1: float = 1.2, b: float = 0.75,
+                 field_boosts: Dict[str, float] = None):
+        self.index = index
+        self.k1 = k1
+        self.b = b
+        self.field_boosts = field_boosts or FIELD_BOOSTS
+
+    def score(self, keywords: Iterable[str]) -> Dict[str, float]:
+        """키워드 중 하나라도 매칭된 관광지별 점수 {spot_id: score}"""
+        total = self.index.size()
+        if not total:
+            return {}
+        average_lengths = self.index.average_field_lengths()
+        lengths_cache: Dict[str, Dict[str, int]] = {}
+        scores: Dict[str, float] = {}
+
+        for keyword in dict.fromkeys(k.lower() for k in keywords):
+            frequencies = self.index.term_frequencies(keyword)
+            if not frequencies:
+                continue
+            document_frequency = len(frequencies)
+            idf = math.log(1 + (total - document_frequency + 0.5) / (document_frequency + 0.5))
+
+            for spot_id, field_tfs in frequencies.items():
+                lengths = lengths_cache.get(spot_id)
+                if lengths is None:
+                    lengths = lengths_cache[spot_id] = self.index.field_lengths(spot_id)
+
+                # 필드별 길이 정규화 후 가중합 (BM25F)
+                weighted_tf = 0.0
+                for field, tf in field_tfs.items():
+                    if not tf:
+                        continue
+                    average = average_lengths.get(field) or 1.0
+                    normalizer = 1 - self.b + self.b * lengths.get(field, 0) / average
+                    weighted_tf += self.field_boosts.get(field, 1.0) * tf / normalizer
+
+                keyword_score = idf * weighted_tf / (self.k1 + weighted_tf) if weighted_tf else 0.0
+                scores[spot_id] = scores.get(spot_id, 0.0) + keyword_score
+        return scores
+
+    def rank(self, keywords: Iterable[str], k: int,
+             scores: Dict[str, float] = None) -> Tuple[List[dict], int]:
+        """점수 상위 k개 관광지와 전체 매칭 수 (동점이면 카탈로그 순서, 이미 계산한 scores 재사용 가능)"""
+        if scores is None:
+            scores = self.score(keywords)
+        if not scores or k <= 0:
+            return [], len(scores)
+        best = heapq.nlargest(
+            k, scores,
+            key=lambda spot_id: (scores[spot_id], -self.index.position(spot_id)),
+        )
+        spots = []
+        for spot_id in best:
+            spot = self.index.spot(spot_id)
+            if spot is not None:
+                spots.append(dict(spot, score=round(scores[spot_id], 4)))
+        return spots, len(scores)
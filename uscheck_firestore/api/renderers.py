@@ -0,0 +1,31 @@
+"""
+/api/query/ 스트리밍 응답용 렌더러
+
+DRF content negotiation이 `Accept: application/x-ndjson` / `text/event-stream` 요청을 406으로 거절하지 않도록
+등록합니다. 정상 응답은 뷰가 StreamingHttpResponse로 직접 보내고, 여기서는 오류 응답(400 등)만 직렬화합니다.
+"""
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return f"{json.dumps(data, ensure_ascii=False)}\n".encode(self.charset)
+
+
+class EventStreamRenderer(BaseRenderer):
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return f"event: error\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode(self.charset)
@@ -0,0 +1,276 @@
+"""
+외부 의존성(Gemini) 호출 보호용 유틸리티
+
+- Deadline: 요청 단위 시간 예산. process_query의 각 단계가 남은 시간을 보고 타임아웃/생략을 결정
+- CircuitBreaker: 연속 실패가 쌓이면 일정 시간 호출을 차단하고 바로 로컬 폴백으로 전환
+- ConcurrencyLimiter: 동시 호출 수 제한 + 길이 제한이 있는 대기열 (넘치면 바로 거절해 워커가 쌓이지 않도록 함)
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .hedging import LatencyTracker
+
+
+class DeadlineExceeded(Exception):
+    """요청 시간 예산 초과"""
+
+
+class CircuitOpenError(Exception):
+    """회로 차단기가 열려 있어 호출하지 않음"""
+
+
+class AdmissionRejected(Exception):
+    """동시 실행 한도와 대기열이 가득 찼거나 대기 시간 안에 차례가 오지 않음"""
+
+    def __init__(self, reason: str, message: str = None):
+        super().__init__(message or reason)
+        self.reason = reason  # queue_full | queue_timeout
+
+
+class Deadline:
+    """monotonic 시계 기준 요청 마감 시각"""
+
+    def __init__(self, seconds: Optional[float]):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.expires_at = None if seconds is None else self.started + seconds
+
+    def remaining(self) -> Optional[float]:
+        """남은 시간(초), 예산이 없으면 None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, cap: Optional[float] = None, reserve: float = 0.0) -> Optional[float]:
+        """하위 호출에 넘길 타임아웃 (reserve만큼은 뒤 단계용으로 남기고 cap 이하로 제한)"""
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        budget = max(0.0, remaining - reserve)
+        return budget if cap is None else min(cap, budget)
+
+    def check(self, stage: str) -> None:
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline of {self.seconds}s exceeded before {stage}")
+
+
+class CircuitBreaker:
+    """closed -> (연속 실패 failure_threshold회) -> open -> (reset_timeout 경과) -> half_open -> 성공 시 closed"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+        self.last_error = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """호출해도 되는지 (half_open에서는 시험 호출 하나만 허용)"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            self._consecutive_failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self, error: Exception = None) -> None:
+        with self._lock:
+            self.failures += 1
+            self._consecutive_failures += 1
+            self.last_error = str(error) if error is not None else None
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self._current_state(),
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout_seconds': self.reset_timeout,
+                'successes': self.successes,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'opened': self.opened,
+                'last_error': self.last_error,
+            }
+
+
+class Admission:
+    """reserve로 미리 확보한 자리 하나 (release는 여러 번 불러도 한 번만 반납)"""
+
+    def __init__(self, limiter: 'ConcurrencyLimiter', waited: float):
+        self.limiter = limiter
+        self.waited = waited
+        self._lock = threading.Lock()
+        self._released = False
+
+    @property
+    def released(self) -> bool:
+        return self._released
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.limiter.release()
+
+
+class ConcurrencyLimiter:
+    """프로세스 단위 동시 실행 한도(max_concurrent)와 대기열 길이 한도(max_queue)"""
+
+    def __init__(self, name: str, max_concurrent: int = 8, max_queue: int = 16):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.wait_times = LatencyTracker()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_queue_depth = 0
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """자리가 날 때까지 최대 timeout초 대기, 대기한 시간(초) 반환 (실패 시 AdmissionRejected)"""
+        started = time.monotonic()
+        with self._cond:
+            if self._in_flight < self.max_concurrent and not self._waiting:
+                self._in_flight += 1
+                self.admitted += 1
+                self.wait_times.record(0.0)
+                return 0.0
+            if self._waiting >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise AdmissionRejected('queue_full', f"{self.name}: {self._waiting} requests already waiting")
+
+            self._waiting += 1
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._waiting)
+            try:
+                while self._in_flight >= self.max_concurrent:
+                    remaining = None if timeout is None else timeout - (time.monotonic() - started)
+                    if remaining is not None and remaining <= 0:
+                        self.rejected_timeout += 1
+                        self.wait_times.record(timeout)
+                        raise AdmissionRejected('queue_timeout', f"{self.name}: no slot within {timeout:.2f}s")
+                    self._cond.wait(remaining)
+                self._in_flight += 1
+                self.admitted += 1
+            finally:
+                self._waiting -= 1
+
+        waited = time.monotonic() - started
+        self.wait_times.record(waited)
+        return waited
+
+    def try_acquire(self) -> bool:
+        """기다리지 않고 빈 자리가 있을 때만 확보 (대기 중인 요청을 앞지르지 않음)"""
+        with self._cond:
+            if self._in_flight < self.max_concurrent and not self._waiting:
+                self._in_flight += 1
+                self.admitted += 1
+                return True
+            return False
+
+    def reserve(self, timeout: Optional[float] = None) -> Admission:
+        """acquire와 같지만 나중에 다른 곳에서 반납할 수 있는 Admission으로 반환"""
+        return Admission(self, self.acquire(timeout))
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> float:
+        """이벤트 루프를 막지 않도록 대기는 스레드에서 (취소되면 얻은 자리를 바로 반납)"""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, self.acquire, timeout)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(
+                lambda done: self.release() if not done.cancelled() and done.exception() is None else None
+            )
+            raise
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None):
+        waited = self.acquire(timeout)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def stats(self) -> Dict:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        with self._cond:
+            return {
+                'name': self.name,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'queue_depth': self._waiting,
+                'max_queue_depth': self.max_queue_depth,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected_queue_full': self.rejected_queue_full,
+                'rejected_timeout': self.rejected_timeout,
+                'wait_p50_ms': ms(self.wait_times.percentile(50)),
+                'wait_p95_ms': ms(self.wait_times.percentile(95)),
+                'wait_p99_ms': ms(self.wait_times.percentile(99)),
+            }
@@ -0,0 +1,218 @@
+"""
+관광지 키워드 검색용 문자 n-gram 역색인
+
+한국어는 띄어쓰기/조사 때문에 단어 단위 토큰화로는 부분 문자열 매칭을 재현하기 어려우므로
+문자 unigram/bigram 포스팅 리스트를 교집합해 후보를 좁힌 뒤 후보에 대해서만 부분 문자열을 확인합니다.
+기존 `keyword in spot_text` 의미를 그대로 유지합니다.
+"""
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+
+def spot_search_text(spot: dict) -> str:
+    """기존 선형 검색과 동일한 검색 대상 문자열 (이름 + 개요, 소문자)"""
+    return f"{spot.get('name', '')} {spot.get('overview', '')}".lower()
+
+
+# BM25 점수 계산에 사용하는 필드 (요약 dict 키)
+RANKED_FIELDS = ('name', 'overview', 'category')
+
+
+def spot_fields(spot: dict) -> Dict[str, str]:
+    """필드별 소문자 텍스트"""
+    return {field: str(spot.get(field, '') or '').lower() for field in RANKED_FIELDS}
+
+
+def char_ngrams(text: str, n: int) -> Set[str]:
+    """문자 n-gram 집합"""
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class NgramIndex:
+    """관광지 ID -> 검색 텍스트에 대한 문자 unigram/bigram 역색인"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._texts: Dict[str, str] = {}
+        self._spots: Dict[str, dict] = {}
+        self._order: Dict[str, int] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._fields: Dict[str, Dict[str, str]] = {}
+        self._field_length_sums: Dict[str, int] = defaultdict(int)
+        self._category_ids: Dict[str, Set[str]] = defaultdict(set)
+
+    @classmethod
+    def from_spots(cls, spots: Iterable[dict]) -> 'NgramIndex':
+        index = cls()
+        index.build(spots)
+        return index
+
+    # ------------------------------------------------------------------
+    # 색인 구성
+    # ------------------------------------------------------------------
+    def build(self, spots: Iterable[dict]) -> None:
+        """전체 재색인"""
+        texts = {}
+        by_id = {}
+        order = {}
+        postings = defaultdict(set)
+        fields = {}
+        field_length_sums = defaultdict(int)
+        category_ids = defaultdict(set)
+        for position, spot in enumerate(spots):
+            spot_id = spot.get('id')
+            if not spot_id or spot_id in by_id:
+                continue
+            text = spot_search_text(spot)
+            texts[spot_id] = text
+            by_id[spot_id] = spot
+            order[spot_id] = position
+            for gram in self._grams(text):
+                postings[gram].add(spot_id)
+            fields[spot_id] = spot_fields(spot)
+            for field, value in fields[spot_id].items():
+                field_length_sums[field] += len(value)
+            category_ids[fields[spot_id]['category']].add(spot_id)
+
+        with self._lock:
+            self._texts = texts
+            self._spots = by_id
+            self._order = order
+            self._postings = postings
+            self._fields = fields
+            self._field_length_sums = field_length_sums
+            self._category_ids = category_ids
+
+    def patch(self, spots: List[dict], upserted: Iterable[dict], removed_ids: Iterable[str]) -> None:
+        """변경된 관광지만 재색인 (spots는 변경 후 전체 목록, 순서 갱신용)"""
+        with self._lock:
+            for spot_id in removed_ids:
+                self._remove(spot_id)
+            for spot in upserted:
+                spot_id = spot.get('id')
+                if not spot_id:
+                    continue
+                self._remove(spot_id)
+                text = spot_search_text(spot)
+                self._texts[spot_id] = text
+                self._spots[spot_id] = spot
+                for gram in self._grams(text):
+                    self._postings[gram].add(spot_id)
+                self._fields[spot_id] = spot_fields(spot)
+                for field, value in self._fields[spot_id].items():
+                    self._field_length_sums[field] += len(value)
+                self._category_ids[self._fields[spot_id]['category']].add(spot_id)
+            self._order = {}
+            for position, spot in enumerate(spots):
+                self._order.setdefault(spot.get('id'), position)
+
+    def _remove(self, spot_id: str) -> None:
+        text = self._texts.pop(spot_id, None)
+        self._spots.pop(spot_id, None)
+        fields = self._fields.pop(spot_id, None)
+        if fields is not None:
+            for field, value in fields.items():
+                self._field_length_sums[field] -= len(value)
+            category_ids = self._category_ids.get(fields['category'])
+            if category_ids is not None:
+                category_ids.discard(spot_id)
+                if not category_ids:
+                    del self._category_ids[fields['category']]
+        if text is None:
+            return
+        for gram in self._grams(text):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(spot_id)
+                if not posting:
+                    del self._postings[gram]
+
+    @staticmethod
+    def _grams(text: str) -> Set[str]:
+        return char_ngrams(text, 1) | char_ngrams(text, 2)
+
+    # ------------------------------------------------------------------
+    # 검색
+    # ------------------------------------------------------------------
+    def lookup(self, keyword: str) -> Set[str]:
+        """키워드를 부분 문자열로 포함하는 관광지 ID 집합"""
+        keyword = keyword.lower()
+        with self._lock:
+            if not keyword:
+                return set(self._texts)
+
+            grams = char_ngrams(keyword, 2) if len(keyword) >= 2 else {keyword}
+            postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+            if not postings or not postings[0]:
+                return set()
+
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    return set()
+
+            if len(keyword) <= 2:
+                return candidates
+            # bigram 교집합은 필요조건이므로 후보에 대해서만 실제 포함 여부 확인
+            return {spot_id for spot_id in candidates if keyword in self._texts[spot_id]}
+
+    def search(self, keywords: Iterable[str]) -> List[dict]:
+        """키워드 중 하나라도 포함하는 관광지 목록 (카탈로그 순서 유지)"""
+        matched = set()
+        for keyword in keywords:
+            matched |= self.lookup(keyword)
+        with self._lock:
+            ordered = sorted(matched, key=lambda spot_id: self._order.get(spot_id, 0))
+            return [self._spots[spot_id] for spot_id in ordered if spot_id in self._spots]
+
+    def lookup_category(self, keyword: str) -> Set[str]:
+        """카테고리명에 키워드가 포함된 관광지 ID 집합 (카테고리 종류가 적어 값 단위로 확인)"""
+        keyword = keyword.lower()
+        with self._lock:
+            matched = set()
+            for category, spot_ids in self._category_ids.items():
+                if keyword in category:
+                    matched |= spot_ids
+            return matched
+
+    def term_frequencies(self, keyword: str) -> Dict[str, Dict[str, int]]:
+        """키워드가 등장하는 관광지별 필드 출현 횟수 {spot_id: {field: tf}}"""
+        keyword = keyword.lower()
+        spot_ids = self.lookup(keyword) | self.lookup_category(keyword)
+        with self._lock:
+            return {
+                spot_id: {field: value.count(keyword) if keyword else 0 for field, value in self._fields[spot_id].items()}
+                for spot_id in spot_ids if spot_id in self._fields
+            }
+
+    def field_lengths(self, spot_id: str) -> Dict[str, int]:
+        with self._lock:
+            fields = self._fields.get(spot_id, {})
+            return {field: len(value) for field, value in fields.items()}
+
+    def average_field_lengths(self) -> Dict[str, float]:
+        with self._lock:
+            count = len(self._fields) or 1
+            return {field: self._field_length_sums[field] / count for field in RANKED_FIELDS}
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._spots)
+
+    def spot(self, spot_id: str):
+        with self._lock:
+            return self._spots.get(spot_id)
+
+    def position(self, spot_id: str) -> int:
+        with self._lock:
+            return self._order.get(spot_id, len(self._order))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'documents': len(self._texts),
+                'grams': len(self._postings),
+                'postings': sum(len(posting) for posting in self._postings.values()),
+            }
@@ -1,28 +1,45 @@
+import contextvars
 import logging
 import uuid
-from typing import Dict
+from typing import Dict, Optional, Tuple
 from django.conf import settings
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
-from google.oauth2 import service_account
-import os
+from .analysis_cache import AnalysisCache, SQLiteAnalysisStore, analysis_key, normalize_query
+from .hedging import HedgePolicy
+from .metrics import GEMINI_FALLBACKS, GEMINI_FINISH_REASONS, GEMINI_LATENCY, METRICS
+from .clients import REGISTRY
+from .quotas import apply_result_quotas
+from .ranking import BM25Ranker
+from .resilience import (
+    Admission,
+    AdmissionRejected,
+    CircuitBreaker,
+    CircuitOpenError,
+    ConcurrencyLimiter,
+    Deadline,
+    DeadlineExceeded,
+)
+from .search_index import NgramIndex
+from .singleflight import SingleFlight
+from .stream_parser import IncrementalJSONFieldParser
+from .telemetry import in_own_context, record_firestore_reads, record_gemini_usage, request_scope, stage
+from .tour_cache import TourCatalogCache
+from .vector_index import VectorIndex
+import threading
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
-cred_path = os.environ.get("FIRESTORE_CREDENTIALS", "./gen-lang-client-0000121060-ea7b2bef1534.json")
-credentials = service_account.Credentials.from_service_account_file(cred_path)
-DATABASE = firestore.Client(credentials=credentials)
+# Firestore 'in' 필터에 넣을 수 있는 최대 값 개수
+FIRESTORE_IN_QUERY_LIMIT = 30
 
-class GeminiService:
-    def __init__(self):
-        try:
-            if settings.GEMINI_API_KEY:
-                genai.configure(api_key=settings.GEMINI_API_KEY)
-                
-                # System Instructions 정의
-                system_instruction = """
+# System Instructions 정의
+SYSTEM_INSTRUCTION = """
                 당신은 경상북도 의성군 전문 ai 관광 어시스턴트입니다.
                 
                 핵심 임무:
@@ -48,257 +65,863 @@ class GeminiService:
                 - 전통문화시설 (의성향교, 의성관아)
                 - 체험관광 프로그램 및 시설
                 """
+
+# compact 모드용 System Instruction - 응답 개수/음식점/숙박시설 규칙은 서버(apply_result_quotas)가 보장
+# (compact 모드에서는 RECOMMENDATION_QUOTAS_ENABLED와 무관하게 항상 적용)
+COMPACT_SYSTEM_INSTRUCTION = """
+                당신은 경상북도 의성군 전문 ai 관광 어시스턴트입니다.
+                사용자 관광 쿼리를 분석해 관광지 검색에 쓸 짧은 키워드와 관광지 유형만 JSON으로 응답합니다.
+                설명 문장 없이 스키마에 맞는 값만 간결하게 작성하세요.
                 
-                # System Instructions와 함께 모델 초기화
-                self.model = genai.GenerativeModel(
-                    'gemini-2.5-flash',
-                    system_instruction=system_instruction
-                )
-                logger.info("Gemini AI initialized successfully with system instructions")
-            else:
-                logger.error("GEMINI_API_KEY not found in settings")
-                self.model = None
+                의성군 전문 지식:
+                - 마늘, 양파 특산품과 관련 관광자원
+                - 조문국 역사문화유적 (조문국사적지, 조문국박물관)
+                - 자연관광지 (빙계계곡, 사촌역 은행나무길)
+                - 전통문화시설 (의성향교, 의성관아)
+                - 체험관광 프로그램 및 시설
+                """
+
+# compact 모드 응답 스키마 (application/json으로 이 형태만 생성)
+ANALYSIS_RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'keywords': {'type': 'array', 'items': {'type': 'string'}, 'max_items': 10},
+        'categories': {'type': 'array', 'items': {'type': 'string'}, 'max_items': 6},
+        'intent': {'type': 'string'},
+        'processed_query': {'type': 'string'},
+        'confidence': {'type': 'number'},
+    },
+    'required': ['keywords', 'categories', 'intent', 'processed_query', 'confidence'],
+}
+
+
+# 폴백 분석에서 단어 끝에서 떼어낼 조사 (긴 것부터 확인)
+_PARTICLES = ('에서', '으로', '에게', '까지', '부터', '이랑', '하고', '을', '를', '이', '가', '은', '는', '에', '의', '도', '로', '와', '과')
+
+
+def _strip_particle(token: str) -> str:
+    for particle in _PARTICLES:
+        if token.endswith(particle) and len(token) - len(particle) >= 2:
+            return token[:-len(particle)]
+    return token
+
+
+def _queue_timeout(timeout: float = None) -> float:
+    """Gemini 동시 호출 자리를 기다릴 최대 시간 (호출 타임아웃보다 길게 기다리지 않음)"""
+    queue_timeout = getattr(settings, 'GEMINI_QUEUE_TIMEOUT_SECONDS', None)
+    if timeout is None:
+        return queue_timeout
+    return timeout if queue_timeout is None else min(queue_timeout, timeout)
+
+
+def _after_wait(timeout: float, waited: float) -> float:
+    """대기열에서 보낸 시간을 뺀 호출 타임아웃 (최소 예산보다 작으면 호출하지 않음)"""
+    if timeout is None:
+        return None
+    timeout -= waited
+    if timeout < getattr(settings, 'GEMINI_MIN_BUDGET_SECONDS', 0):
+        raise DeadlineExceeded(f"Only {timeout:.2f}s left for Gemini after waiting {waited:.2f}s in queue")
+    return timeout
+
+
+def _call_once(callback):
+    """여러 스레드에서 불려도 callback은 한 번만 실행"""
+    if callback is None:
+        return None
+    lock = threading.Lock()
+    called = []
+
+    def wrapper(*args, **kwargs):
+        with lock:
+            if called:
+                return None
+            called.append(True)
+        return callback(*args, **kwargs)
+    return wrapper
+
+
+def _compact_analysis() -> bool:
+    return getattr(settings, 'GEMINI_ANALYSIS_MODE', 'legacy') == 'compact'
+
+
+def _quotas_enabled() -> bool:
+    # compact 프롬프트에는 개수/음식점/숙박시설 규칙이 없으므로 설정과 무관하게 서버에서 적용
+    return _compact_analysis() or getattr(settings, 'RECOMMENDATION_QUOTAS_ENABLED', False)
+
+
+def _build_gemini_model():
+    """System Instructions와 함께 Gemini 모델 초기화 (워커당 한 번)"""
+    if not settings.GEMINI_API_KEY:
+        logger.error("GEMINI_API_KEY not found in settings")
+        return None
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    model = genai.GenerativeModel(
+        'gemini-2.5-flash',
+        system_instruction=COMPACT_SYSTEM_INSTRUCTION if _compact_analysis() else SYSTEM_INSTRUCTION
+    )
+    logger.info("Gemini AI initialized successfully with system instructions")
+    return model
+
+
+REGISTRY.register('gemini_model', _build_gemini_model)
+
+# 프로세스 단위 tour_list 스냅샷 (리스너/폴링으로 증분 갱신)
+TOUR_CACHE = TourCatalogCache(
+    lambda: REGISTRY.get('firestore'),
+    mode=getattr(settings, 'TOUR_CACHE_MODE', 'listener'),
+    poll_interval=getattr(settings, 'TOUR_CACHE_POLL_INTERVAL', 300.0),
+)
+
+# tour_list 키워드 역색인 (캐시 변경 시 재색인/부분 갱신)
+TOUR_INDEX = NgramIndex()
+
+
+def _sync_tour_index(spots, upserted, removed_ids, full):
+    if full:
+        TOUR_INDEX.build(spots)
+    else:
+        TOUR_INDEX.patch(spots, upserted, removed_ids)
+
+
+TOUR_CACHE.add_listener(_sync_tour_index)
+
+# 키워드가 놓치는 paraphrase 보충용 로컬 벡터 인덱스 (디스크에 저장해 워커 간 재사용)
+VECTOR_INDEX = VectorIndex(
+    str(settings.VECTOR_INDEX_DIR),
+    dim=settings.VECTOR_INDEX_DIM,
+    keep_versions=settings.VECTOR_INDEX_KEEP_VERSIONS,
+    min_score=settings.VECTOR_SEARCH_MIN_SCORE,
+) if getattr(settings, 'SEMANTIC_SEARCH_ENABLED', False) else None
+
+
+def _sync_vector_index(spots, upserted, removed_ids, full):
+    if full:
+        # 전체 재적재: 카탈로그가 같으면 디스크에서 로드, 아니면 재구성 후 저장
+        VECTOR_INDEX.load_or_build(spots)
+        return
+    # 리스너 스레드에서는 바뀐 행만 반영하고, IDF 재계산/저장은 변경이 잠잠해진 뒤 한 번만
+    VECTOR_INDEX.patch(upserted, removed_ids)
+    VECTOR_INDEX.schedule_rebuild(spots, settings.VECTOR_INDEX_REBUILD_DELAY_SECONDS)
+
+
+if VECTOR_INDEX is not None:
+    TOUR_CACHE.add_listener(_sync_vector_index)
+
+# Gemini 쿼리 분석 결과 캐시 (메모리 LRU + 선택적 SQLite)
+MIN_CACHEABLE_CONFIDENCE = 0.5
+ANALYSIS_CACHE = AnalysisCache(
+    max_entries=settings.ANALYSIS_CACHE_MAX_ENTRIES,
+    ttl=settings.ANALYSIS_CACHE_TTL,
+    store=SQLiteAnalysisStore(settings.ANALYSIS_CACHE_SQLITE_PATH) if settings.ANALYSIS_CACHE_SQLITE_PATH else None,
+    namespace=settings.GEMINI_ANALYSIS_MODE,
+) if getattr(settings, 'ANALYSIS_CACHE_ENABLED', False) else None
+
+# 동시에 들어온 동일 질의의 Gemini 분석을 하나로 합침
+ANALYSIS_FLIGHTS = SingleFlight()
+
+# 연속 실패 시 Gemini 호출을 잠시 차단하고 로컬 폴백 분석으로 전환
+GEMINI_BREAKER = CircuitBreaker(
+    'gemini',
+    failure_threshold=getattr(settings, 'GEMINI_BREAKER_FAILURE_THRESHOLD', 5),
+    reset_timeout=getattr(settings, 'GEMINI_BREAKER_RESET_SECONDS', 30.0),
+)
+
+# 프로세스 전체 Gemini 동시 호출 한도와 대기열 (버스트 때 워커 스레드가 전부 Gemini에 묶이지 않도록)
+GEMINI_LIMITER = ConcurrencyLimiter(
+    'gemini',
+    max_concurrent=getattr(settings, 'GEMINI_MAX_CONCURRENCY', 8),
+    max_queue=getattr(settings, 'GEMINI_MAX_QUEUE', 16),
+)
+
+# 느린 Gemini 응답에 두 번째 요청을 보내는 hedging 정책 (GEMINI_HEDGE_ENABLED일 때만)
+GEMINI_HEDGE = HedgePolicy(
+    percentile=settings.GEMINI_HEDGE_PERCENTILE,
+    max_ratio=settings.GEMINI_HEDGE_MAX_RATIO,
+    min_samples=settings.GEMINI_HEDGE_MIN_SAMPLES,
+    limiter=GEMINI_LIMITER,
+) if getattr(settings, 'GEMINI_HEDGE_ENABLED', False) else None
+
+# /metrics 라벨용 finish_reason 이름 (_extract_response_text의 분기와 같은 값)
+FINISH_REASON_LABELS = {0: 'unspecified', 1: 'stop', 2: 'max_tokens', 3: 'safety', 4: 'recitation'}
+
+# 의성군 관련 키워드 (Gemini 응답 파싱 실패/폴백 분석에서 사용)
+UISEONG_KEYWORDS = ['마늘', '양파', '조문국', '빙계계곡', '사촌역', '은행나무', '향교', '관광', '맛집', '숙박']
+
+# 폴백 분석용 카테고리 판별 단어
+FALLBACK_CATEGORY_HINTS = {
+    '음식/맛집': ['맛집', '음식', '식당', '먹', '카페', '식사'],
+    '숙박시설': ['숙박', '숙소', '호텔', '펜션', '모텔', '민박', '잠'],
+    '자연관광지': ['계곡', '자연', '공원', '숲', '산', '강', '꽃'],
+    '문화재/유적지': ['유적', '문화재', '향교', '고분', '박물관', '조문국', '역사', '사찰', '절'],
+    '체험관광지': ['체험', '축제', '농장', '마을'],
+    '레저/스포츠': ['레저', '스포츠', '캠핑', '자전거', '낚시'],
+}
+
+# 폴백 분석에서 키워드로 쓰지 않는 말
+FALLBACK_STOPWORDS = {'추천', '추천해줘', '알려줘', '알려주세요', '해줘', '좋은', '어디', '곳', '있는', '가볼만한', '의성', '의성군'}
+
+# 스트리밍 분석 중 keywords/categories가 먼저 완성되면 나머지 생성과 병행해서 후보 검색을 실행
+EARLY_RETRIEVAL_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='early-retrieval')
+
+
+def _single_flight_cache_stats() -> Dict:
+    # 동일 질의 합치기도 Gemini 호출을 아끼는 캐시로 취급 (합쳐진 요청 = 적중)
+    stats = ANALYSIS_FLIGHTS.stats()
+    return {'hits': stats['collapsed'], 'misses': stats['executions']}
+
+
+# /metrics 캐시 적중률
+METRICS.register_cache('tour_cache', TOUR_CACHE.stats)
+METRICS.register_cache('analysis_cache', lambda: ANALYSIS_CACHE.stats()['memory'] if ANALYSIS_CACHE is not None else None)
+METRICS.register_cache(
+    'analysis_cache_persistent',
+    lambda: ANALYSIS_CACHE.stats().get('persistent') if ANALYSIS_CACHE is not None else None,
+)
+METRICS.register_cache('analysis_single_flight', _single_flight_cache_stats)
+
+_service_lock = threading.Lock()
+_service = None
+
+
+def get_gemini_service() -> 'GeminiService':
+    """워커 전체에서 공유하는 GeminiService 인스턴스"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = GeminiService()
+    return _service
+
+
+class GeminiService:
+    def __init__(self):
+        try:
+            self.model = REGISTRY.get('gemini_model')
         except Exception as e:
             logger.error(f"Failed to initialize Gemini AI: {e}")
             self.model = None
             
-    def process_query(self, user_query):
+    def process_query(self, user_query, top_k: int = None, deadline: Deadline = None):
+        # 요청 전체 시간 예산 (분석 -> 선택 -> 상세 조회 단계가 남은 시간을 나눠 씀)
+        deadline = deadline or Deadline(getattr(settings, 'QUERY_DEADLINE_SECONDS', None))
+        with request_scope('query.process', **{'query.length': len(user_query), 'query.top_k': top_k or 0}):
+            try:
+                db = REGISTRY.get('firestore')
+                # 요청마다 tour_list 전체를 읽지 않고 프로세스 스냅샷 사용
+                with stage('catalogue_load'):
+                    all_spots = TOUR_CACHE.spots()
+                
+                recommendation_result = self.recommend_tourism_spots(
+                    user_query, all_spots, index=TOUR_INDEX, top_k=top_k, vector_index=VECTOR_INDEX,
+                    deadline=deadline
+                )
+
+                full_spots = self._hydrate_spots(db, recommendation_result.get('recommended_spots', []), deadline)
+                recommendation_result['recommended_spots'] = full_spots
+                
+                response_data = {
+                        'success': True,
+                        'query': user_query,
+                        'analysis': recommendation_result.get('analysis', {}),
+                        'recommended_spots': recommendation_result.get('recommended_spots', []),
+                        'gemini_used': recommendation_result.get('gemini_used', False),
+                }
+                if recommendation_result.get('fallback_reason'):
+                    response_data['fallback_reason'] = recommendation_result['fallback_reason']
+                return response_data
+            except AdmissionRejected:
+                # 과부하 거절은 뷰에서 503으로 응답
+                raise
+            except Exception as e:
+                logger.error(f"Error processing query: {e}")
+                return {'success': False, 'message': str(e)}
+
+    def reserve_gemini_slot(self, user_query: str) -> Tuple[Optional[Admission], Optional[Dict]]:
+        """응답을 시작하기 전에 Gemini 동시 호출 자리를 미리 확보 -> (자리, 캐시된 분석 결과)
+
+        캐시에 있으면 (None, 분석 결과)를 돌려주므로 stream_query에 cached_analysis로 넘겨 다시 조회하지 않습니다.
+        GEMINI_OVERLOAD_ACTION이 reject면 자리가 없을 때 AdmissionRejected, fallback이면 (None, None)을 반환하고
+        분석 단계에서 평소처럼 폴백 분석으로 전환합니다.
+        """
+        if self.model is None:
+            return None, None
+        cached = ANALYSIS_CACHE.get(user_query) if ANALYSIS_CACHE is not None else None
+        if cached is not None:
+            return None, cached
         try:
-            db = DATABASE
-            collections = db.collection('tour_list').get()
-            all_spots = [
-                {
-                    'id': collection.to_dict().get('contentid', collection.id),  # contentid 사용, 없으면 문서 ID 사용
-                    'name': collection.to_dict().get('title', ''),  # title을 name으로 사용
-                    'overview': collection.to_dict().get('overview', ''),
-                    'category': collection.to_dict().get('category', ''),
-                } for collection in collections if collection.to_dict().get('contentid') or collection.id
-            ]
-            
-            recommendation_result = self.recommend_tourism_spots(user_query, all_spots)
+            return GEMINI_LIMITER.reserve(_queue_timeout(settings.GEMINI_TIMEOUT_SECONDS)), None
+        except AdmissionRejected:
+            if settings.GEMINI_OVERLOAD_ACTION == 'reject':
+                raise
+            return None, None
+
+    def stream_query(self, user_query, top_k: int = None, batch_size: int = None, deadline: Deadline = None,
+                     admission: Admission = None, cached_analysis: Dict = None):
+        """process_query의 스트리밍 버전 - 분석 결과를 먼저 내보내고 관광지는 batch_size개씩 조회되는 대로 전달
+
+        admission: reserve_gemini_slot으로 미리 확보한 자리 (Gemini 호출에 사용하고, 쓰지 않았으면 분석 후 반납)
+        cached_analysis: reserve_gemini_slot이 캐시에서 찾은 분석 결과 (분석 캐시를 다시 조회하지 않음)
+        """
+        batch_size = max(1, batch_size or settings.QUERY_STREAM_BATCH_SIZE)
+        deadline = deadline or Deadline(getattr(settings, 'QUERY_DEADLINE_SECONDS', None))
+        return in_own_context(
+            self._stream_query_events(user_query, top_k, batch_size, deadline, admission, cached_analysis)
+        )
 
-            full_spots = []
-            for spot in recommendation_result.get('recommended_spots', []):
+    def _stream_query_events(self, user_query, top_k, batch_size, deadline, admission, cached_analysis):
+        with request_scope('query.stream', **{'query.length': len(user_query), 'query.top_k': top_k or 0}):
+            try:
+                db = REGISTRY.get('firestore')
+                with stage('catalogue_load'):
+                    all_spots = TOUR_CACHE.spots()
                 try:
-                    spot_id = spot.get('id', '')
-                    if not spot_id:
-                        logger.warning(f"Spot ID is empty, skipping: {spot}")
-                        continue
-                        
-                    # contentid로 문서 찾기 (새로운 filter 방식 사용)
-                    docs = db.collection('tour_list').where(filter=FieldFilter('contentid', '==', spot_id)).get()
-                    
-                    if docs:
-                        # contentid로 찾은 경우
-                        item = docs[0].to_dict()
-                    else:
-                        # 문서 ID로 직접 찾기
-                        doc = db.collection('tour_list').document(spot_id).get()
-                        if doc.exists:
-                            item = doc.to_dict()
-                        else:
-                            logger.warning(f"Document not found for ID: {spot_id}")
-                            continue
-                    
-                    full_spots.append({
-                        'addr1': item.get('addr1', ''),
-                        'addr2': item.get('addr2', ''),
-                        'areacode': item.get('areacode', ''),
-                        'cat1': item.get('cat1', ''),
-                        'cat2': item.get('cat2', ''),
-                        'cat3': item.get('cat3', ''),
-                        'contentid': item.get('contentid', ''),
-                        'contenttypeid': item.get('contenttypeid', ''),
-                        'createdtime': item.get('createdtime', ''),
-                        'firstimage': item.get('firstimage', ''),
-                        'firstimage2': item.get('firstimage2', ''),
-                        'mapx': item.get('mapx', ''),
-                        'mapy': item.get('mapy', ''),
-                        'tel': item.get('tel', ''),
-                        'title': item.get('title', ''),
-                        'zipcode': item.get('zipcode', ''),
-                        'overview': item.get('overview', ''),
-                        'price': item.get('price', ''),
-                    })
-                except Exception as e:
-                    logger.error(f"Error fetching full spot details for {spot.get('id', 'unknown')}: {e}")
-                    continue
-                
-            recommendation_result['recommended_spots'] = full_spots
-            
-            response_data = {
+                    recommendation_result = self.recommend_tourism_spots(
+                        user_query, all_spots, index=TOUR_INDEX, top_k=top_k, vector_index=VECTOR_INDEX,
+                        deadline=deadline, admission=admission, cached_analysis=cached_analysis
+                    )
+                finally:
+                    if admission is not None:
+                        admission.release()
+                spots = recommendation_result.get('recommended_spots', [])
+
+                analysis_event = {
+                    'event': 'analysis',
                     'success': True,
                     'query': user_query,
                     'analysis': recommendation_result.get('analysis', {}),
-                    'recommended_spots': recommendation_result.get('recommended_spots', []),
-            }
-            return response_data
-        except Exception as e:
-            logger.error(f"Error processing query: {e}")
-            return {'success': False, 'message': str(e)}
+                    'total': len(spots),
+                    'gemini_used': recommendation_result.get('gemini_used', False),
+                }
+                if recommendation_result.get('fallback_reason'):
+                    analysis_event['fallback_reason'] = recommendation_result['fallback_reason']
+                yield analysis_event
+
+                sent = 0
+                for start in range(0, len(spots), batch_size):
+                    full_spots = self._hydrate_spots(db, spots[start:start + batch_size], deadline)
+                    if full_spots:
+                        yield {'event': 'spots', 'offset': sent, 'recommended_spots': full_spots}
+                        sent += len(full_spots)
+
+                yield {'event': 'done', 'success': True, 'count': sent}
+            except AdmissionRejected as e:
+                yield {'event': 'error', 'success': False, 'overloaded': True, 'message': str(e)}
+            except Exception as e:
+                logger.error(f"Error streaming query: {e}")
+                yield {'event': 'error', 'success': False, 'message': str(e)}
+
+    def _hydrate_spots(self, db, spots: list, deadline: Deadline = None) -> list:
+        """추천 관광지 목록을 전체 문서로 일괄 변환 (추천 순서 유지, 찾지 못한 항목은 건너뜀)"""
+        with stage('hydration', spots=len(spots)):
+            spot_ids, items, missing = self._resolve_cached_spots(spots)
+
+            # 2. 스냅샷에 없는 항목만 Firestore에서 일괄 조회 (시간 예산이 남아 있을 때만)
+            if missing:
+                if deadline is not None and deadline.expired():
+                    logger.warning(f"⏱️ 시간 예산 초과로 Firestore 상세 조회 생략: {len(missing)}개")
+                else:
+                    items.update(self._fetch_spots(db, missing, deadline.timeout() if deadline else None))
+
+            return self._assemble_full_spots(spot_ids, items)
+
+    def _resolve_cached_spots(self, spots: list):
+        """추천 ID 목록을 메모리 스냅샷에서 조회 -> (ID 목록, 찾은 문서, 못 찾은 ID)"""
+        spot_ids = []
+        for spot in spots:
+            spot_id = spot.get('id', '')
+            if not spot_id:
+                logger.warning(f"Spot ID is empty, skipping: {spot}")
+                continue
+            spot_ids.append(spot_id)
+
+        # 1. 메모리 스냅샷에서 조회 (contentid 우선, 없으면 문서 ID)
+        items = {}
+        missing = []
+        for spot_id in spot_ids:
+            item = TOUR_CACHE.get_by_contentid(spot_id) or TOUR_CACHE.get(spot_id)
+            if item is not None:
+                items[spot_id] = item
+            else:
+                missing.append(spot_id)
+        return spot_ids, items, missing
+
+    def _assemble_full_spots(self, spot_ids: list, items: Dict) -> list:
+        """추천 순서대로 응답용 상세 정보 구성 (찾지 못한 항목은 건너뜀)"""
+        full_spots = []
+        for spot_id in spot_ids:
+            item = items.get(spot_id)
+            if item is None:
+                logger.warning(f"Document not found for ID: {spot_id}")
+                continue
+            try:
+                full_spots.append(self._to_full_spot(item))
+            except Exception as e:
+                logger.error(f"Error fetching full spot details for {spot_id}: {e}")
+                continue
+        return full_spots
+
+    def _fetch_spots(self, db, spot_ids: list, timeout: float = None) -> Dict:
+        """contentid 'in' 쿼리(청크 단위)와 문서 ID get_all로 누락 항목 일괄 조회"""
+        collection_ref = db.collection('tour_list')
+        items = {}
+
+        # contentid로 문서 찾기 (in 필터는 한 번에 최대 30개)
+        for start in range(0, len(spot_ids), FIRESTORE_IN_QUERY_LIMIT):
+            chunk = spot_ids[start:start + FIRESTORE_IN_QUERY_LIMIT]
+            try:
+                documents = collection_ref.where(filter=FieldFilter('contentid', 'in', chunk)).get(timeout=timeout)
+                # 결과가 없는 쿼리도 읽기 1회로 과금됨
+                record_firestore_reads(max(1, len(documents)), 'hydration')
+                for doc in documents:
+                    data = doc.to_dict()
+                    items.setdefault(data.get('contentid'), data)
+            except Exception as e:
+                logger.error(f"Error fetching spots by contentid {chunk}: {e}")
 
-    def recommend_tourism_spots(self, user_query: str, all_spots: list, max_results: int = 30) -> Dict:
+        # 문서 ID로 직접 찾기
+        remaining = [spot_id for spot_id in spot_ids if spot_id not in items]
+        if remaining:
+            try:
+                refs = [collection_ref.document(spot_id) for spot_id in remaining]
+                for doc in db.get_all(refs, timeout=timeout):
+                    record_firestore_reads(1, 'hydration')
+                    if doc.exists:
+                        items[doc.id] = doc.to_dict()
+            except Exception as e:
+                logger.error(f"Error fetching spots by document ID {remaining}: {e}")
+        return items
+
+    def _to_full_spot(self, item: dict) -> Dict:
+        """응답용 관광지 상세 정보 구성"""
+        return {
+            'addr1': item.get('addr1', ''),
+            'addr2': item.get('addr2', ''),
+            'areacode': item.get('areacode', ''),
+            'cat1': item.get('cat1', ''),
+            'cat2': item.get('cat2', ''),
+            'cat3': item.get('cat3', ''),
+            'contentid': item.get('contentid', ''),
+            'contenttypeid': item.get('contenttypeid', ''),
+            'createdtime': item.get('createdtime', ''),
+            'firstimage': item.get('firstimage', ''),
+            'firstimage2': item.get('firstimage2', ''),
+            'mapx': item.get('mapx', ''),
+            'mapy': item.get('mapy', ''),
+            'tel': item.get('tel', ''),
+            'title': item.get('title', ''),
+            'zipcode': item.get('zipcode', ''),
+            'overview': item.get('overview', ''),
+            'price': item.get('price', ''),
+        }
+
+    def recommend_tourism_spots(self, user_query: str, all_spots: list, max_results: int = 30,
+                                index: NgramIndex = None, top_k: int = None,
+                                vector_index: VectorIndex = None, deadline: Deadline = None,
+                                admission: Admission = None, cached_analysis: Dict = None) -> Dict:
         """사용자 쿼리를 기반으로 관광지 추천"""
         try:
-            # 1. 쿼리 분석
-            analysis_result = self.analyze_user_query(user_query)
+            # 1. 쿼리 분석 (스트리밍 모드면 keywords/categories가 완성되는 즉시 후보 검색 시작)
+            early = {}
+
+            def start_early_retrieval(fields):
+                early['analysis'] = fields
+                # 요청 span/사용량 집계가 이어지도록 현재 context를 복사해 실행
+                early['future'] = EARLY_RETRIEVAL_EXECUTOR.submit(
+                    contextvars.copy_context().run, self.select_spots, user_query, fields, all_spots, max_results, index, top_k, vector_index
+                )
+
+            analysis_result = self.analyze_user_query(
+                user_query, on_partial=start_early_retrieval, deadline=deadline, admission=admission,
+                cached_analysis=cached_analysis
+            )
             
             if not analysis_result['success']:
                 return analysis_result
             
             analysis = analysis_result['analysis']
+            recommendation_result = None
+            if 'future' in early and early['analysis'].get('keywords') == analysis.get('keywords'):
+                recommendation_result = early['future'].result()
+                if recommendation_result.get('success'):
+                    recommendation_result['analysis'] = analysis
+                else:
+                    recommendation_result = None
+            if recommendation_result is None:
+                recommendation_result = self.select_spots(
+                    user_query, analysis, all_spots, max_results, index, top_k, vector_index
+                )
+            recommendation_result['gemini_used'] = analysis_result.get('gemini_used', False)
+            if analysis_result.get('fallback_reason'):
+                recommendation_result['fallback_reason'] = analysis_result['fallback_reason']
+            return recommendation_result
             
-            # 2. 간단한 키워드 매칭으로 관광지 추천
-            recommended_spots = []
-            keywords = analysis.get('keywords', [])
-            
-            for spot in all_spots:
-                # 키워드가 이름이나 개요에 포함되어 있는지 확인
-                spot_text = f"{spot.get('name', '')} {spot.get('overview', '')}".lower()
-                for keyword in keywords:
-                    if keyword.lower() in spot_text:
-                        recommended_spots.append(spot)
-                        break
-            
-            # 키워드 매칭이 없으면 전체 목록에서 일부만 반환
-            if not recommended_spots:
-                recommended_spots = all_spots[:max_results]
-            
-            # 결과 수 제한
-            recommended_spots = recommended_spots[:max_results]
-            
-            return {
-                'success': True,
-                'query': user_query,
-                'analysis': analysis,
-                'recommended_spots': recommended_spots,
-                'total_found': len(recommended_spots),
-                'returned_count': len(recommended_spots)
-            }
-            
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.error(f"Error recommending tourism spots: {e}")
+            return {'success': False, 'message': str(e)}
+
+    def select_spots(self, user_query: str, analysis: Dict, all_spots: list, max_results: int = 30,
+                     index: NgramIndex = None, top_k: int = None,
+                     vector_index: VectorIndex = None) -> Dict:
+        """분석 결과로 카탈로그에서 추천 관광지 선택"""
+        try:
+            with stage('keyword_match'):
+                # 2. 역색인 후보에 대한 BM25 relevance 상위 k개 추천
+                keywords = analysis.get('keywords', [])
+                if index is None:
+                    index = NgramIndex.from_spots(all_spots)
+                max_results = top_k or max_results
+                ranker = BM25Ranker(index)
+                scores = ranker.score(keywords)
+                recommended_spots, total_found = ranker.rank(keywords, max_results, scores=scores)
+
+                # 3. 키워드가 놓친 paraphrase는 벡터 유사도로 남은 자리를 채움
+                if vector_index is not None and vector_index.is_ready() and len(recommended_spots) < max_results:
+                    query_text = ' '.join([user_query, analysis.get('processed_query', '')] + list(keywords))
+                    seen = {spot['id'] for spot in recommended_spots}
+                    for spot in vector_index.search(query_text, max_results + len(seen)):
+                        if len(recommended_spots) >= max_results:
+                            break
+                        if spot['id'] not in seen:
+                            seen.add(spot['id'])
+                            recommended_spots.append(spot)
+                
+                # 키워드 매칭이 없으면 전체 목록에서 일부만 반환
+                if not recommended_spots:
+                    recommended_spots = all_spots[:max_results]
+                
+                # 4. 응답 개수/음식점/숙박시설 구성 규칙을 서버에서 보장
+                if _quotas_enabled():
+                    recommended_spots = apply_result_quotas(
+                        recommended_spots, all_spots, max_results, scores=scores,
+                        min_results=settings.RECOMMENDATION_MIN_RESULTS,
+                        min_restaurants=settings.RECOMMENDATION_MIN_RESTAURANTS,
+                    )
+                
+                return {
+                    'success': True,
+                    'query': user_query,
+                    'analysis': analysis,
+                    'recommended_spots': recommended_spots,
+                    'total_found': total_found,
+                    'returned_count': len(recommended_spots)
+                }
+                
         except Exception as e:
             logger.error(f"Error recommending tourism spots: {e}")
             return {'success': False, 'message': str(e)}
     
-    def analyze_user_query(self, user_query: str) -> Dict:
-        """사용자 쿼리를 분석하여 관광지 검색 조건 추출"""
+    def analyze_user_query(self, user_query: str, on_partial=None, deadline: Deadline = None,
+                           admission: Admission = None, cached_analysis: Dict = None) -> Dict:
+        """사용자 쿼리를 분석하여 관광지 검색 조건 추출
+        
+        on_partial: 스트리밍 분석에서 keywords/categories가 완성되면 {'keywords', 'categories'}로 한 번 호출
+        (캐시 적중이나 다른 요청의 동일 질의 결과를 공유받는 경우에는 호출되지 않음)
+        deadline: 남은 시간이 부족하거나 Gemini 회로가 열려 있으면 로컬 폴백 분석 사용 (gemini_used: False)
+        admission: 미리 확보한 Gemini 동시 호출 자리 (있으면 대기열을 다시 거치지 않음)
+        cached_analysis: reserve_gemini_slot이 이미 찾은 캐시 결과
+        (reserve_gemini_slot은 캐시에 없을 때만 자리를 주므로 admission이 있으면 캐시를 다시 조회하지 않음)
+        """
         try:
-            # Gemini AI 상태 상세 로깅
-            logger.info(f"=== Gemini AI 상태 확인 ===")
-            logger.info(f"self.model 존재: {self.model is not None}")
-            logger.info(f"GEMINI_API_KEY 설정: {bool(getattr(settings, 'GEMINI_API_KEY', None))}")
-            
-            # if not self.model:
-            #     logger.warning("⚠️ Gemini AI not available, using fallback analysis")
-            #     logger.warning("Gemini AI를 사용할 수 없어 폴백 분석을 사용합니다")
-            #     return self._fallback_analysis(user_query)
-            
-            logger.info("✅ Gemini AI 사용 가능 - 실제 AI 분석 시작")
-            
-            # 의성군 관광지 정보를 기반으로 한 프롬프트 생성
-            prompt = self._create_analysis_prompt(user_query)
-            logger.info(f"Generated prompt length: {len(prompt)}")
-            
-            # Generation config 설정 (더 정확하고 일관된 응답을 위해)
-            generation_config = genai.types.GenerationConfig(
-                temperature=0.8,  #일관성 있는 응답 정도 (높을수록 자유도)
-                top_p=0.8,
-                top_k=40,
-                max_output_tokens=10000,  # 토큰 수 줄임
-                response_mime_type="text/plain"
-            )
-            
-            # 안전성 설정 (필터링 완화)
-            safety_settings = [
-                {
-                    "category": "HARM_CATEGORY_HARASSMENT",
-                    "threshold": "BLOCK_ONLY_HIGH"
-                },
-                {
-                    "category": "HARM_CATEGORY_HATE_SPEECH",
-                    "threshold": "BLOCK_ONLY_HIGH"
-                },
-                {
-                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    "threshold": "BLOCK_ONLY_HIGH"
-                },
-                {
-                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                    "threshold": "BLOCK_ONLY_HIGH"
+            # 정규화된 질의가 캐시에 있으면 Gemini 호출 생략
+            cached = cached_analysis
+            if cached is None and admission is None and ANALYSIS_CACHE is not None:
+                cached = ANALYSIS_CACHE.get(user_query)
+            if cached is not None:
+                logger.info(f"⚡ 쿼리 분석 캐시 적중: {user_query}")
+                return {
+                    'success': True,
+                    'original_query': user_query,
+                    'analysis': cached,
+                    'processed_query': cached.get('processed_query', user_query),
+                    'gemini_used': True,
+                    'cached': True
                 }
-            ]
-            
-            logger.info("🤖 Gemini AI 호출 중...")
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
             
-            # 응답 상태 확인
-            if not response.candidates:
-                logger.error("❌ Gemini AI 응답에 후보가 없습니다")
-                raise Exception("Gemini AI returned no candidates")
+            if self.model is None:
+                return self._fallback_result(user_query, 'gemini_unavailable')
             
-            candidate = response.candidates[0]
-            finish_reason = candidate.finish_reason
+            # 뒤 단계(상세 조회)용 시간을 남기고 Gemini 타임아웃 결정
+            timeout = settings.GEMINI_TIMEOUT_SECONDS
+            if deadline is not None:
+                timeout = deadline.timeout(cap=timeout, reserve=settings.QUERY_HYDRATION_RESERVE_SECONDS)
+                if timeout < settings.GEMINI_MIN_BUDGET_SECONDS:
+                    return self._fallback_result(user_query, 'deadline')
             
-            # finish_reason 확인 (0: FINISH_REASON_UNSPECIFIED, 1: FINISH_REASON_STOP, 2: FINISH_REASON_MAX_TOKENS, 3: FINISH_REASON_SAFETY, 4: FINISH_REASON_RECITATION)
-            if finish_reason == 1:  # FINISH_REASON_STOP - 정상 완료
-                logger.info(f"✅ Gemini AI 응답 받음: {response.text[:100]}...")
-                response_text = response.text
-            elif finish_reason == 2:  # FINISH_REASON_MAX_TOKENS
-                logger.warning("⚠️ Gemini AI 응답이 최대 토큰 수에 도달했습니다")
-                if candidate.content and candidate.content.parts:
-                    response_text = candidate.content.parts[0].text
-                else:
-                    raise Exception("Response truncated due to max tokens but no content available")
-            elif finish_reason == 3:  # FINISH_REASON_SAFETY
-                logger.error("❌ Gemini AI 응답이 안전성 필터에 의해 차단되었습니다")
-                raise Exception("Content blocked by safety filters")
-            elif finish_reason == 4:  # FINISH_REASON_RECITATION
-                logger.error("❌ Gemini AI 응답이 저작권 문제로 차단되었습니다")
-                raise Exception("Content blocked due to recitation")
-            else:
-                logger.error(f"❌ 알 수 없는 finish_reason: {finish_reason}")
-                raise Exception(f"Unknown finish reason: {finish_reason}")
-                
-            # 응답 파싱
-            analysis_result = self._parse_analysis_response(response_text)
-            
-            logger.info(f"Query analysis completed for: {user_query}")
-            logger.info(f"Analysis result: {analysis_result}")
+            # 같은 질의가 동시에 들어오면 한 번만 Gemini를 호출하고 결과 공유
+            analysis_result = ANALYSIS_FLIGHTS.do(
+                analysis_key(user_query, settings.GEMINI_ANALYSIS_MODE),
+                lambda: self._generate_and_cache_analysis(user_query, on_partial, timeout, admission),
+                timeout=timeout,
+            )
             
             return {
                 'success': True,
                 'original_query': user_query,
                 'analysis': analysis_result,
                 'processed_query': analysis_result.get('processed_query', user_query),
-                'gemini_used': True  # Gemini가 실제로 사용되었음을 표시
+                'gemini_used': True,  # Gemini가 실제로 사용되었음을 표시
+                'cached': False
             }
             
+        except AdmissionRejected as e:
+            # 과부하: 설정에 따라 바로 503으로 거절하거나 로컬 폴백 분석
+            logger.warning(f"🚦 Gemini 동시 호출 한도 초과 ({e.reason}): {e}")
+            if settings.GEMINI_OVERLOAD_ACTION == 'reject':
+                raise
+            return self._fallback_result(user_query, 'overloaded', str(e))
+        except CircuitOpenError as e:
+            return self._fallback_result(user_query, 'circuit_open', str(e))
+        except (DeadlineExceeded, TimeoutError, google_exceptions.DeadlineExceeded) as e:
+            logger.error(f"⏱️ Gemini 응답 시간 초과: {e}")
+            return self._fallback_result(user_query, 'timeout', str(e))
         except Exception as e:
             logger.error(f"❌ Error analyzing user query with Gemini: {e}")
             import traceback
             logger.error(f"Gemini 오류 상세: {traceback.format_exc()}")
-            return {
-                'success': False,
-                'message': str(e),
-                'original_query': user_query,
-                'analysis': {
-                    'keywords': [],
-                    'categories': [],
-                    'preferences': [],
-                    'intent': 'general_search',
-                    'processed_query': user_query,
-                    'confidence': 0.5
-                },
-                'gemini_used': False  # Gemini가 사용되지 않았음을 표시
+            return self._fallback_result(user_query, 'gemini_error', str(e))
+        
+    def _fallback_result(self, user_query: str, reason: str, message: str = None) -> Dict:
+        """로컬 폴백 분석 결과를 analyze_user_query 응답 형태로 반환"""
+        logger.warning(f"⚠️ Gemini AI를 사용할 수 없어 폴백 분석을 사용합니다 ({reason})")
+        GEMINI_FALLBACKS.inc(reason=reason)
+        analysis = self._fallback_analysis(user_query)
+        result = {
+            'success': True,
+            'original_query': user_query,
+            'analysis': analysis,
+            'processed_query': analysis['processed_query'],
+            'gemini_used': False,  # Gemini가 사용되지 않았음을 표시
+            'cached': False,
+            'fallback_reason': reason
+        }
+        if message:
+            result['message'] = message
+        return result
+
+    def _fallback_analysis(self, user_query: str) -> Dict:
+        """Gemini 없이 질의 텍스트만으로 만드는 로컬 키워드 분석"""
+        normalized = normalize_query(user_query)
+        
+        # 의성군 대표 키워드 + 조사를 떼어낸 질의 단어
+        keywords = [keyword for keyword in UISEONG_KEYWORDS if keyword in normalized]
+        for token in normalized.split():
+            token = _strip_particle(token)
+            if len(token) >= 2 and token not in FALLBACK_STOPWORDS and token not in keywords:
+                keywords.append(token)
+        
+        categories = [
+            category for category, hints in FALLBACK_CATEGORY_HINTS.items()
+            if any(hint in normalized for hint in hints)
+        ]
+        
+        return {
+            'keywords': keywords if keywords else ['관광', '의성'],
+            'categories': categories,
+            'preferences': [],
+            'intent': 'general_search',
+            'processed_query': normalized or user_query,
+            'confidence': 0.3  # MIN_CACHEABLE_CONFIDENCE 미만이라 캐시되지 않음
+        }
+        
+    def _generate_and_cache_analysis(self, user_query: str, on_partial=None, timeout: float = None,
+                                     admission: Admission = None) -> Dict:
+        analysis_result = self._generate_analysis(user_query, on_partial, timeout, admission)
+        
+        # JSON 파싱에 실패한 폴백 결과(confidence 0.4)는 캐시하지 않음
+        if ANALYSIS_CACHE is not None and analysis_result.get('confidence', 0) >= MIN_CACHEABLE_CONFIDENCE:
+            ANALYSIS_CACHE.set(user_query, analysis_result)
+        return analysis_result
+
+    def _generate_analysis(self, user_query: str, on_partial=None, timeout: float = None,
+                           admission: Admission = None) -> Dict:
+        """Gemini 호출 후 응답을 파싱한 분석 결과 (실패 시 예외)"""
+        # Gemini AI 상태 상세 로깅
+        logger.info(f"=== Gemini AI 상태 확인 ===")
+        logger.info(f"self.model 존재: {self.model is not None}")
+        logger.info(f"GEMINI_API_KEY 설정: {bool(getattr(settings, 'GEMINI_API_KEY', None))}")
+        
+        # 의성군 관광지 정보를 기반으로 한 프롬프트 생성
+        with stage('prompt_build'):
+            prompt = self._create_analysis_prompt(user_query)
+        logger.info(f"Generated prompt length: {len(prompt)}")
+        
+        # 동시 호출 한도 안에서만 호출 (가득 찼거나 차례가 오지 않으면 AdmissionRejected)
+        with stage('gemini_call', prompt_chars=len(prompt)):
+            if admission is not None and not admission.released:
+                waited = 0.0  # 요청 시작 전에 이미 대기열을 거침
+            else:
+                admission = GEMINI_LIMITER.reserve(_queue_timeout(timeout))
+                waited = admission.waited
+            try:
+                response = self._call_with_breaker(prompt, on_partial, _after_wait(timeout, waited))
+            finally:
+                admission.release()
+            record_gemini_usage(response)
+            
+        # 응답 파싱
+        with stage('parse'):
+            response_text = self._extract_response_text(response)
+            analysis_result = self._parse_generated_text(response_text)
+        
+        logger.info(f"Query analysis completed for: {user_query}")
+        logger.info(f"Analysis result: {analysis_result}")
+        
+        return analysis_result
+
+    def _call_with_breaker(self, prompt: str, on_partial=None, timeout: float = None):
+        # 회로가 열려 있으면 호출하지 않음 (analyze_user_query가 폴백 분석으로 전환)
+        if not GEMINI_BREAKER.allow():
+            raise CircuitOpenError("Gemini circuit breaker is open")
+        
+        logger.info("✅ Gemini AI 사용 가능 - 실제 AI 분석 시작")
+        logger.info(f"🤖 Gemini AI 호출 중... (timeout: {timeout}s)")
+        started = time.perf_counter()
+        try:
+            if GEMINI_HEDGE is not None:
+                # hedge 요청이 나가도 조기 후보 검색은 한 번만 시작
+                on_partial = _call_once(on_partial)
+                response = GEMINI_HEDGE.run(
+                    lambda attempt_timeout: self._call_model(prompt, on_partial, attempt_timeout), timeout
+                )
+            else:
+                response = self._call_model(prompt, on_partial, timeout)
+        except Exception as e:
+            GEMINI_LATENCY.observe(time.perf_counter() - started, mode='sync', outcome='error')
+            GEMINI_BREAKER.record_failure(e)
+            raise
+        GEMINI_LATENCY.observe(time.perf_counter() - started, mode='sync', outcome='success')
+        GEMINI_BREAKER.record_success()
+        return response
+
+    def _call_model(self, prompt: str, on_partial=None, timeout: float = None):
+        """Gemini 호출 1회 (스트리밍 모드면 응답을 끝까지 읽은 뒤 반환)"""
+        request_options = {'timeout': timeout} if timeout else None
+        if settings.GEMINI_STREAM_ANALYSIS:
+            return self._stream_generation(prompt, on_partial, request_options)
+        return self.model.generate_content(
+            prompt,
+            generation_config=self._generation_config(),
+            safety_settings=self._safety_settings(),
+            request_options=request_options
+        )
+
+    def _stream_generation(self, prompt: str, on_partial=None, request_options: dict = None):
+        """청크 단위로 응답을 받으며 JSON 필드를 점진적으로 파싱 (반복이 끝난 응답 객체 반환)"""
+        response = self.model.generate_content(
+            prompt,
+            generation_config=self._generation_config(),
+            safety_settings=self._safety_settings(),
+            stream=True,
+            request_options=request_options
+        )
+        parser = IncrementalJSONFieldParser()
+        notified = False
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # 텍스트 파트가 없는 청크 (finish_reason만 있는 마지막 청크 등)
+                continue
+            parser.feed(text)
+            if not notified and on_partial is not None and parser.has('keywords', 'categories'):
+                notified = True
+                logger.info(f"⚡ keywords/categories 수신 완료, 생성 완료 전에 후보 검색 시작: {parser.fields['keywords']}")
+                try:
+                    on_partial({
+                        'keywords': parser.fields['keywords'] or ['관광', '의성'],
+                        'categories': parser.fields['categories'],
+                    })
+                except Exception as e:
+                    logger.warning(f"조기 후보 검색 시작 실패: {e}")
+        return response
+
+    def _generation_config(self):
+        if _compact_analysis():
+            # 스키마로 제한된 짧은 JSON만 생성 (출력 토큰 예산을 작게 잡아 생성 지연 감소)
+            return genai.types.GenerationConfig(
+                temperature=0.2,
+                top_p=0.8,
+                top_k=40,
+                max_output_tokens=settings.GEMINI_COMPACT_MAX_OUTPUT_TOKENS,
+                response_mime_type="application/json",
+                response_schema=ANALYSIS_RESPONSE_SCHEMA
+            )
+        # Generation config 설정 (더 정확하고 일관된 응답을 위해)
+        return genai.types.GenerationConfig(
+            temperature=0.8,  #일관성 있는 응답 정도 (높을수록 자유도)
+            top_p=0.8,
+            top_k=40,
+            max_output_tokens=10000,  # 토큰 수 줄임
+            response_mime_type="text/plain"
+        )
+
+    def _safety_settings(self) -> list:
+        # 안전성 설정 (필터링 완화)
+        return [
+            {
+                "category": "HARM_CATEGORY_HARASSMENT",
+                "threshold": "BLOCK_ONLY_HIGH"
+            },
+            {
+                "category": "HARM_CATEGORY_HATE_SPEECH",
+                "threshold": "BLOCK_ONLY_HIGH"
+            },
+            {
+                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                "threshold": "BLOCK_ONLY_HIGH"
+            },
+            {
+                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+                "threshold": "BLOCK_ONLY_HIGH"
             }
+        ]
+
+    def _extract_response_text(self, response) -> str:
+        """finish_reason을 확인하고 응답 텍스트 추출 (차단/오류 시 예외)"""
+        # 응답 상태 확인
+        if not response.candidates:
+            logger.error("❌ Gemini AI 응답에 후보가 없습니다")
+            GEMINI_FINISH_REASONS.inc(finish_reason='no_candidates')
+            raise Exception("Gemini AI returned no candidates")
         
+        candidate = response.candidates[0]
+        finish_reason = candidate.finish_reason
+        GEMINI_FINISH_REASONS.inc(finish_reason=FINISH_REASON_LABELS.get(finish_reason, 'unknown'))
         
+        # finish_reason 확인 (0: FINISH_REASON_UNSPECIFIED, 1: FINISH_REASON_STOP, 2: FINISH_REASON_MAX_TOKENS, 3: FINISH_REASON_SAFETY, 4: FINISH_REASON_RECITATION)
+        if finish_reason == 1:  # FINISH_REASON_STOP - 정상 완료
+            logger.info(f"✅ Gemini AI 응답 받음: {response.text[:100]}...")
+            response_text = response.text
+        elif finish_reason == 2:  # FINISH_REASON_MAX_TOKENS
+            logger.warning("⚠️ Gemini AI 응답이 최대 토큰 수에 도달했습니다")
+            if candidate.content and candidate.content.parts:
+                response_text = candidate.content.parts[0].text
+            else:
+                raise Exception("Response truncated due to max tokens but no content available")
+        elif finish_reason == 3:  # FINISH_REASON_SAFETY
+            logger.error("❌ Gemini AI 응답이 안전성 필터에 의해 차단되었습니다")
+            raise Exception("Content blocked by safety filters")
+        elif finish_reason == 4:  # FINISH_REASON_RECITATION
+            logger.error("❌ Gemini AI 응답이 저작권 문제로 차단되었습니다")
+            raise Exception("Content blocked due to recitation")
+        else:
+            logger.error(f"❌ 알 수 없는 finish_reason: {finish_reason}")
+            raise Exception(f"Unknown finish reason: {finish_reason}")
+        return response_text
+
     def _create_analysis_prompt(self, user_query: str) -> str:
         """사용자 쿼리 분석을 위한 프롬프트 생성"""
+        if _compact_analysis():
+            # 응답 형식은 response_schema가 정하므로 질의와 카테고리만 전달
+            return f"""
+사용자 관광 쿼리 분석: "{user_query}"
+
+categories는 다음 중에서 선택: 문화재/유적지, 자연관광지, 체험관광지, 음식/맛집, 숙박시설, 레저/스포츠
+keywords는 관광지 이름/소개에 나올 만한 짧은 단어 (최대 10개)
+            """
+        
         # 간단하고 안전한 프롬프트
         prompt = f"""
 사용자 관광 쿼리 분석:
@@ -328,6 +951,37 @@ class GeminiService:
         
         return prompt
     
+    def _parse_generated_text(self, response_text: str) -> Dict:
+        """분석 모드에 맞게 응답 텍스트 파싱 (compact 모드는 JSON 그대로, 실패하면 기존 추출 방식)"""
+        if _compact_analysis():
+            try:
+                parsed_data = json.loads(response_text)
+                if isinstance(parsed_data, dict):
+                    return self._normalize_analysis(parsed_data, response_text)
+            except ValueError as e:
+                logger.warning(f"compact 분석 응답 JSON 파싱 실패, 기존 추출 방식 사용: {e}")
+        return self._parse_analysis_response(response_text)
+
+    def _normalize_analysis(self, parsed_data: dict, response_text: str) -> Dict:
+        """파싱된 JSON에 기본값 적용"""
+        # 기본 필드 검증 및 기본값 설정
+        result = {
+            'keywords': parsed_data.get('keywords', []),
+            'categories': parsed_data.get('categories', []),
+            'preferences': parsed_data.get('preferences', []),
+            'intent': parsed_data.get('intent', 'general_search'),
+            'processed_query': parsed_data.get('processed_query', ''),
+            'confidence': float(parsed_data.get('confidence', 0.7))
+        }
+        
+        # 데이터 품질 검증
+        if not result['keywords']:
+            result['keywords'] = ['관광', '의성']
+        if not result['processed_query']:
+            result['processed_query'] = response_text.strip()
+            
+        return result
+
     def _parse_analysis_response(self, response_text: str) -> Dict:
         """AI 응답을 파싱하여 구조화된 데이터로 변환"""
         try:
@@ -347,24 +1001,7 @@ class GeminiService:
             
             if json_str and json_str.startswith('{'):
                 parsed_data = json.loads(json_str)
-                
-                # 기본 필드 검증 및 기본값 설정
-                result = {
-                    'keywords': parsed_data.get('keywords', []),
-                    'categories': parsed_data.get('categories', []),
-                    'preferences': parsed_data.get('preferences', []),
-                    'intent': parsed_data.get('intent', 'general_search'),
-                    'processed_query': parsed_data.get('processed_query', ''),
-                    'confidence': float(parsed_data.get('confidence', 0.7))
-                }
-                
-                # 데이터 품질 검증
-                if not result['keywords']:
-                    result['keywords'] = ['관광', '의성']
-                if not result['processed_query']:
-                    result['processed_query'] = response_text.strip()
-                    
-                return result
+                return self._normalize_analysis(parsed_data, response_text)
             else:
                 raise json.JSONDecodeError("No valid JSON found", response_text, 0)
                 
@@ -377,8 +1014,7 @@ class GeminiService:
             text_lower = response_text.lower()
             
             # 의성군 관련 키워드 추출
-            uiseong_keywords = ['마늘', '양파', '조문국', '빙계계곡', '사촌역', '은행나무', '향교', '관광', '맛집', '숙박']
-            for keyword in uiseong_keywords:
+            for keyword in UISEONG_KEYWORDS:
                 if keyword in text_lower:
                     keywords.append(keyword)
             
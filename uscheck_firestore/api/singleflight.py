@@ -0,0 +1,138 @@
+"""
+동일 키 동시 호출 합치기 (single-flight)
+
+같은 (정규화된) 질의가 동시에 여러 스레드에서 들어오면 첫 요청만 실제로 Gemini를 호출하고
+나머지는 그 결과(또는 예외)를 공유합니다. 기다리는 요청은 자기 남은 시간(timeout)만큼만 기다리고
+넘기면 TimeoutError를 받아 호출 쪽의 시간 초과 폴백으로 넘어갑니다.
+"""
+import asyncio
+import copy
+import threading
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """키별로 진행 중인 호출을 하나로 합치는 스레드 안전 그룹"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.collapsed = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.max_waiters = 0
+
+    def do(self, key: Hashable, fn: Callable, timeout: Optional[float] = None):
+        """key로 진행 중인 호출이 있으면 결과를 기다려 공유, 없으면 fn 실행
+
+        timeout: 다른 요청의 호출을 기다릴 최대 시간 (None이면 끝날 때까지). 넘기면 TimeoutError
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.collapsed += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                with self._lock:
+                    self.errors += 1
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+        elif not call.done.wait(timeout):
+            # 리더의 Gemini 호출은 계속 진행되고 결과는 다른 대기자/캐시에 남음
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f"Shared call did not finish within {timeout}s")
+
+        if call.error is not None:
+            raise call.error
+        # 호출자마다 결과를 수정해도 서로 영향이 없도록 복사본 반환
+        return copy.deepcopy(call.result)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.executions + self.collapsed
+            return {
+                'in_flight': len(self._calls),
+                'executions': self.executions,
+                'collapsed': self.collapsed,
+                'collapse_rate': round(self.collapsed / total, 4) if total else None,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+                'max_waiters': self.max_waiters,
+            }
+
+
+class AsyncSingleFlight:
+    """asyncio 버전 - 같은 이벤트 루프 안의 동일 키 코루틴을 하나의 Task로 합침"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.collapsed = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    async def do(self, key: Hashable, coro_fn: Callable[[], Awaitable], timeout: Optional[float] = None):
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            task = self._tasks.get(flight_key)
+            if task is None:
+                task = loop.create_task(coro_fn())
+                self._tasks[flight_key] = task
+                self.executions += 1
+                task.add_done_callback(lambda done: self._finish(flight_key, done))
+            else:
+                self.collapsed += 1
+
+        # 기다리던 요청 하나가 취소되거나 시간을 넘겨도 공유 Task는 계속 진행
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            if task.done():
+                raise  # 공유 Task 자체가 시간 초과로 끝난 경우
+            with self._lock:
+                self.timeouts += 1
+            raise
+        return copy.deepcopy(result)
+
+    def _finish(self, flight_key, task: asyncio.Task) -> None:
+        with self._lock:
+            self._tasks.pop(flight_key, None)
+            if not task.cancelled() and task.exception() is not None:
+                self.errors += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.executions + self.collapsed
+            return {
+                'in_flight': len(self._tasks),
+                'executions': self.executions,
+                'collapsed': self.collapsed,
+                'collapse_rate': round(self.collapsed / total, 4) if total else None,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+            }
@@ -0,0 +1,123 @@
+"""
+스트리밍 Gemini 응답용 점진적 JSON 파서
+
+`generate_content(stream=True)` 청크를 받는 대로 넣으면 최상위 JSON 객체의 필드 값이 완성되는 즉시
+`fields`에 채워집니다. 응답 전체를 기다리지 않고 `keywords`/`categories`만으로 후보 검색을 먼저 시작하는 데 사용합니다.
+(```json 코드 블록이나 앞뒤 설명 문장은 첫 '{' 이전/최상위 객체 이후라서 무시됩니다.)
+"""
+import json
+from typing import Dict
+
+
+class IncrementalJSONFieldParser:
+    """문자를 한 번씩만 훑어서 최상위 객체의 key/value 경계를 추적하는 파서"""
+
+    def __init__(self):
+        self.fields: Dict = {}
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._finished = False
+        self._expect = 'key'  # key -> colon -> value -> comma
+        self._key = None
+        self._token_start = None
+
+    @property
+    def finished(self) -> bool:
+        """최상위 객체가 닫혔는지"""
+        return self._finished
+
+    def has(self, *names) -> bool:
+        return all(name in self.fields for name in names)
+
+    def feed(self, text: str) -> Dict:
+        """청크 추가 후 지금까지 완성된 필드 반환"""
+        if self._finished or not text:
+            return self.fields
+        self._buffer += text
+        buffer = self._buffer
+
+        while self._pos < len(buffer):
+            i = self._pos
+            char = buffer[i]
+            self._pos += 1
+
+            if not self._started:
+                if char == '{':
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._close_string(i)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect in ('key', 'value') and self._token_start is None:
+                    self._token_start = i
+            elif char in '[{':
+                if self._depth == 1 and self._expect == 'value' and self._token_start is None:
+                    self._token_start = i
+                self._depth += 1
+            elif char in ']}':
+                self._depth -= 1
+                if self._depth == 1 and self._expect == 'value' and self._token_start is not None:
+                    # 배열/객체 값이 닫히는 순간 바로 확정
+                    self._complete_value(buffer[self._token_start:i + 1])
+                elif self._depth == 0:
+                    if self._expect == 'value' and self._token_start is not None:
+                        self._complete_value(buffer[self._token_start:i])
+                    self._finished = True
+                    break
+            elif self._depth == 1:
+                if char == ':' and self._expect == 'colon':
+                    self._expect = 'value'
+                elif char == ',':
+                    if self._expect == 'value' and self._token_start is not None:
+                        self._complete_value(buffer[self._token_start:i])
+                    self._expect = 'key'
+                    self._token_start = None
+                elif not char.isspace() and self._expect == 'value' and self._token_start is None:
+                    # 숫자/true/false/null - ',' 또는 '}'에서 확정
+                    self._token_start = i
+        return self.fields
+
+    def _close_string(self, end: int) -> None:
+        if self._token_start is None:
+            return
+        token = self._buffer[self._token_start:end + 1]
+        if self._expect == 'key':
+            self._key = self._loads(token)
+            self._expect = 'colon'
+            self._token_start = None
+        elif self._expect == 'value':
+            self._complete_value(token)
+
+    def _complete_value(self, token: str) -> None:
+        value = self._loads(token.strip())
+        if self._key is not None and value is not _INVALID:
+            self.fields[self._key] = value
+        self._key = None
+        self._token_start = None
+        self._expect = 'comma'
+
+    @staticmethod
+    def _loads(token: str):
+        try:
+            return json.loads(token)
+        except ValueError:
+            return _INVALID
+
+
+_INVALID = object()
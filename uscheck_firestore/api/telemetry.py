@@ -0,0 +1,175 @@
+"""
+쿼리 파이프라인 OpenTelemetry 계측
+
+- 단계별 span + 지연 시간 히스토그램 (catalogue_load, prompt_build, gemini_call, parse, keyword_match, hydration)
+- 요청 단위 Firestore 문서 읽기 수, Gemini 입력/출력 토큰 수 (root span 속성 + 카운터)
+
+OTEL_EXPORTER 설정이 none이면 OpenTelemetry API의 no-op 구현만 사용하므로 비용이 거의 없습니다.
+console은 표준 출력, otlp는 OTLP/HTTP (OTEL_EXPORTER_OTLP_ENDPOINT 환경 변수)로 내보냅니다.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from opentelemetry import metrics, trace
+
+logger = logging.getLogger(__name__)
+
+_tracer = trace.get_tracer('uscheck.api')
+_meter = metrics.get_meter('uscheck.api')
+
+STAGE_DURATION = _meter.create_histogram(
+    'uscheck.query.stage.duration', unit='ms', description='쿼리 파이프라인 단계별 소요 시간'
+)
+FIRESTORE_READS = _meter.create_counter(
+    'uscheck.firestore.documents_read', unit='{document}', description='Firestore 문서 읽기 수 (과금 기준)'
+)
+GEMINI_TOKENS = _meter.create_counter(
+    'uscheck.gemini.tokens', unit='{token}', description='Gemini 입력/출력 토큰 수'
+)
+
+_configure_lock = threading.Lock()
+_configured = False
+
+
+class RequestUsage:
+    """요청 하나가 사용한 Firestore 읽기/Gemini 토큰/단계별 시간"""
+
+    def __init__(self):
+        self.firestore_reads = 0
+        self.gemini_input_tokens = 0
+        self.gemini_output_tokens = 0
+        self.stage_ms: Dict[str, float] = {}
+
+    def as_dict(self) -> Dict:
+        return {
+            'firestore_reads': self.firestore_reads,
+            'gemini_input_tokens': self.gemini_input_tokens,
+            'gemini_output_tokens': self.gemini_output_tokens,
+            'stage_ms': {name: round(ms, 2) for name, ms in self.stage_ms.items()},
+        }
+
+
+_current_usage: contextvars.ContextVar = contextvars.ContextVar('uscheck_request_usage', default=None)
+
+
+def current_usage() -> Optional[RequestUsage]:
+    return _current_usage.get()
+
+
+def configure_telemetry(exporter: str = 'none', service_name: str = 'uscheck-api') -> bool:
+    """TracerProvider/MeterProvider 설정 (프로세스당 한 번, exporter: none | console | otlp)"""
+    global _configured
+    if exporter == 'none':
+        return False
+    with _configure_lock:
+        if _configured:
+            return True
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter, PeriodicExportingMetricReader
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+        if exporter == 'otlp':
+            from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            span_exporter, metric_exporter = OTLPSpanExporter(), OTLPMetricExporter()
+        elif exporter == 'console':
+            span_exporter, metric_exporter = ConsoleSpanExporter(), ConsoleMetricExporter()
+        else:
+            raise ValueError(f"Unknown OTEL_EXPORTER: {exporter}")
+
+        resource = Resource.create({'service.name': service_name})
+        tracer_provider = TracerProvider(resource=resource)
+        tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+        trace.set_tracer_provider(tracer_provider)
+        metrics.set_meter_provider(MeterProvider(
+            resource=resource,
+            metric_readers=[PeriodicExportingMetricReader(metric_exporter)],
+        ))
+        _configured = True
+    logger.info(f"✅ OpenTelemetry 설정 완료 (exporter: {exporter})")
+    return True
+
+
+@contextmanager
+def request_scope(name: str, **attributes):
+    """요청 root span과 요청 단위 사용량 집계 범위 (끝나면 사용량을 span 속성으로 기록)"""
+    usage = RequestUsage()
+    token = _current_usage.set(usage)
+    try:
+        with _tracer.start_as_current_span(name, attributes=attributes) as span:
+            try:
+                yield usage
+            finally:
+                span.set_attribute('firestore.documents_read', usage.firestore_reads)
+                span.set_attribute('gemini.tokens.input', usage.gemini_input_tokens)
+                span.set_attribute('gemini.tokens.output', usage.gemini_output_tokens)
+    finally:
+        _current_usage.reset(token)
+        logger.debug(f"📊 {name} usage: {usage.as_dict()}")
+
+
+def in_own_context(events: Iterator) -> Iterator:
+    """제너레이터를 매번 같은 복사본 context에서 재개
+
+    스트리밍 응답은 뷰가 반환된 뒤 서버가 조금씩 꺼내 가므로, 안에서 연 request_scope의 span/사용량이
+    호출자 context로 새거나 재개할 때마다 다른 context에서 닫히지 않도록 합니다.
+    """
+    context = contextvars.copy_context()
+    try:
+        while True:
+            try:
+                event = context.run(next, events)
+            except StopIteration:
+                return
+            yield event
+    finally:
+        context.run(events.close)
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """파이프라인 단계 span + 소요 시간 히스토그램"""
+    started = time.perf_counter()
+    with _tracer.start_as_current_span(f'query.{name}', attributes=attributes) as span:
+        try:
+            yield span
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            STAGE_DURATION.record(elapsed_ms, {'stage': name})
+            usage = _current_usage.get()
+            if usage is not None:
+                usage.stage_ms[name] = usage.stage_ms.get(name, 0.0) + elapsed_ms
+
+
+def record_firestore_reads(count: int, source: str) -> None:
+    """Firestore 문서 읽기 수 기록 (현재 요청 범위 안이면 요청 사용량에도 합산)"""
+    if count <= 0:
+        return
+    FIRESTORE_READS.add(count, {'source': source})
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.firestore_reads += count
+
+
+def record_gemini_usage(response) -> None:
+    """응답의 usage_metadata에서 입력/출력 토큰 수 기록"""
+    usage_metadata = getattr(response, 'usage_metadata', None)
+    if usage_metadata is None:
+        return
+    input_tokens = getattr(usage_metadata, 'prompt_token_count', 0) or 0
+    output_tokens = getattr(usage_metadata, 'candidates_token_count', 0) or 0
+    GEMINI_TOKENS.add(input_tokens, {'direction': 'input'})
+    GEMINI_TOKENS.add(output_tokens, {'direction': 'output'})
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.gemini_input_tokens += input_tokens
+        usage.gemini_output_tokens += output_tokens
+    span = trace.get_current_span()
+    span.set_attribute('gemini.tokens.input', input_tokens)
+    span.set_attribute('gemini.tokens.output', output_tokens)
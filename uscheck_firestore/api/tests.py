@@ -1,3 +1,976 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from tour_ingest import bulk_ingest, content_hash, plan_sync, sync_collection
+from tour_pipeline import iter_tour_items
+
+from .analysis_cache import AnalysisCache, SQLiteAnalysisStore, analysis_key
+from .apps import start_server_preload
+from .async_services import AsyncQueryPipeline
+from .hedging import HedgePolicy
+from .qr_results import QRResultHub
+from .quotas import apply_result_quotas
+from .ranking import BM25Ranker
+from .resilience import AdmissionRejected, CircuitBreaker, ConcurrencyLimiter
+from .services import GeminiService
+from .search_index import NgramIndex, spot_search_text
+from .singleflight import AsyncSingleFlight, SingleFlight
+from .stream_parser import IncrementalJSONFieldParser
+from .telemetry import current_usage, record_firestore_reads
+from .tour_cache import TourCatalogCache
+from .vector_index import VectorIndex
+
+SAMPLE_SPOTS = [
+    {'id': '1', 'name': '의성 산수유마을', 'overview': '봄이면 산수유 꽃이 피는 마을', 'category': '관광지', 'contenttypeid': '12'},
+    {'id': '2', 'name': '의성 마늘 식당', 'overview': '의성 마늘을 넣은 한식 맛집', 'category': '음식점', 'contenttypeid': '39'},
+    {'id': '3', 'name': '고운사', 'overview': '천년 고찰과 숲길', 'category': '관광지', 'contenttypeid': '12'},
+    {'id': '4', 'name': '빙계계곡 펜션', 'overview': '계곡 옆 숙소', 'category': '숙박', 'contenttypeid': '32'},
+    {'id': '5', 'name': '마늘 칼국수', 'overview': '칼국수 맛집', 'category': '음식점', 'contenttypeid': '39'},
+    {'id': '6', 'name': '조문국 박물관', 'overview': '조문국 유물 전시', 'category': '관광지', 'contenttypeid': '14'},
+    {'id': '7', 'name': '의성 한옥 스테이', 'overview': '한옥 숙박 체험', 'category': '숙박', 'contenttypeid': '32'},
+    {'id': '8', 'name': 'Cafe Garlic', 'overview': 'Garlic latte and bread', 'category': '음식점', 'contenttypeid': '39'},
+]
+
+
+def linear_search(spots, keywords):
+    """NgramIndex 도입 전의 부분 문자열 선형 검색"""
+    return [spot for spot in spots if any(keyword.lower() in spot_search_text(spot) for keyword in keywords)]
+
+
+class RuntimeStatsPermissionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_anonymous_is_rejected(self):
+        response = self.client.get('/api/stats/')
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_non_admin_is_rejected(self):
+        user = User.objects.create_user(username='tester', password='pw')
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get('/api/stats/').status_code, 403)
+
+    def test_admin_can_read_stats(self):
+        admin = User.objects.create_user(username='admin', password='pw', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('tour_cache', response.data)
+
+
+class ServerStartupTests(TestCase):
+    @override_settings(CLIENT_WARM_UP=['firestore', 'gemini_model'], TOUR_CACHE_PRELOAD=False)
+    def test_clients_warm_up_only_from_server_entrypoint(self):
+        with mock.patch('api.services.REGISTRY') as registry:
+            apps.get_app_config('api').ready()
+            registry.warm_up_in_background.assert_not_called()
+            start_server_preload()
+            registry.warm_up_in_background.assert_called_once_with(['firestore', 'gemini_model'])
+
+    @override_settings(TOUR_CACHE_PRELOAD=True, CLIENT_WARM_UP=[])
+    def test_tour_cache_preloads_only_from_server_entrypoint(self):
+        with mock.patch('api.services.TOUR_CACHE') as tour_cache:
+            apps.get_app_config('api').ready()
+            tour_cache.start_in_background.assert_not_called()
+            start_server_preload()
+            tour_cache.start_in_background.assert_called_once()
+
+
+class TourCatalogCacheStatsTests(TestCase):
+    def test_hit_rate_counts_catalogue_reads_not_document_lookups(self):
+        cache = TourCatalogCache(mock.Mock(), mode='poll')
+        doc = mock.Mock(id='1', update_time=1)
+        doc.to_dict.return_value = {'contentid': '1', 'title': '고운사'}
+        cache._client_factory.return_value.collection.return_value.get.return_value = [doc]
+        with mock.patch.object(cache, '_start_polling'):
+            cache.spots()  # 첫 요청: 동기 적재
+            for _ in range(3):
+                cache.spots()
+                for _ in range(10):
+                    cache.get_by_contentid('1')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (3, 1))
+        self.assertEqual(stats['hit_rate'], 0.75)
+
+
+class AnalysisCacheKeyTests(TestCase):
+    def test_key_is_normalized_and_namespaced(self):
+        self.assertEqual(analysis_key('의성  맛집 추천!', 'compact'), analysis_key('의성 맛집 추천', 'compact'))
+        self.assertNotEqual(analysis_key('의성 맛집', 'compact'), analysis_key('의성 맛집', 'legacy'))
+
+    def test_modes_do_not_share_entries(self):
+        compact = AnalysisCache(namespace='compact')
+        legacy = AnalysisCache(namespace='legacy')
+        legacy.memory = compact.memory  # 같은 저장소를 공유해도 키가 분리되어야 함
+        compact.set('의성 맛집', {'keywords': ['맛집']})
+        self.assertIsNone(legacy.get('의성 맛집'))
+        self.assertEqual(compact.get('의성 맛집!'), {'keywords': ['맛집']})
+
+    def test_sqlite_store_survives_a_new_cache_instance(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'analysis_cache.sqlite3')
+        AnalysisCache(store=SQLiteAnalysisStore(path), namespace='compact').set('고운사', {'keywords': ['고운사']})
+        restarted = AnalysisCache(store=SQLiteAnalysisStore(path), namespace='compact')
+        self.assertEqual(restarted.get('고운사'), {'keywords': ['고운사']})
+        self.assertEqual(restarted.stats()['persistent']['hits'], 1)
+
+    def test_async_pipeline_reads_and_writes_cache_off_the_event_loop(self):
+        threads = []
+        cache = mock.Mock()
+        cache.get.side_effect = lambda query: threads.append(threading.current_thread()) or None
+        cache.set.side_effect = lambda query, value: threads.append(threading.current_thread())
+        pipeline = AsyncQueryPipeline(mock.Mock())
+
+        async def scenario():
+            with mock.patch('api.async_services.ANALYSIS_CACHE', cache), \
+                    mock.patch.object(pipeline, '_generate_analysis',
+                                      mock.AsyncMock(return_value={'keywords': ['고운사'], 'confidence': 0.9})):
+                await pipeline.analyze_user_query('고운사')
+            return threading.current_thread()
+
+        loop_thread = asyncio.run(scenario())
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(thread is not loop_thread for thread in threads))
+
+
+class NgramIndexTests(TestCase):
+    def setUp(self):
+        self.index = NgramIndex.from_spots(SAMPLE_SPOTS)
+
+    def assertMatchesLinear(self, spots, keywords):
+        expected = [spot['id'] for spot in linear_search(spots, keywords)]
+        self.assertEqual([spot['id'] for spot in self.index.search(keywords)], expected, keywords)
+
+    def test_search_equals_substring_matching(self):
+        keyword_sets = [
+            ['의성'], ['마늘'], ['맛집', '숙소'], ['산수유 꽃'], ['의'], ['garlic'], ['GARLIC LATTE'],
+            ['없는키워드'], ['계곡 옆 숙'], ['', '마늘'], ['식당', '고찰'],
+        ]
+        for keywords in keyword_sets:
+            self.assertMatchesLinear(SAMPLE_SPOTS, keywords)
+
+    def test_random_substrings_match_linear_search(self):
+        rng = random.Random(7)
+        texts = [spot_search_text(spot) for spot in SAMPLE_SPOTS]
+        for _ in range(200):
+            text = rng.choice(texts)
+            start = rng.randrange(len(text))
+            keyword = text[start:start + rng.randint(1, 6)]
+            self.assertMatchesLinear(SAMPLE_SPOTS, [keyword])
+
+    def test_patch_matches_rebuild(self):
+        changed = dict(SAMPLE_SPOTS[1], name='의성 흑마늘 식당', overview='흑마늘 정식')
+        added = {'id': '9', 'name': '의성 오일장', 'overview': '전통 시장', 'category': '관광지', 'contenttypeid': '12'}
+        spots = [spot for spot in SAMPLE_SPOTS if spot['id'] != '3']
+        spots[1] = changed
+        spots.append(added)
+
+        self.index.patch(spots, upserted=[changed, added], removed_ids=['3'])
+        rebuilt = NgramIndex.from_spots(spots)
+        for keywords in (['흑마늘'], ['마늘'], ['고찰'], ['시장'], ['의성'], ['식당']):
+            self.assertMatchesLinear(spots, keywords)
+            self.assertEqual(
+                [spot['id'] for spot in self.index.search(keywords)],
+                [spot['id'] for spot in rebuilt.search(keywords)],
+            )
+        self.assertEqual(self.index.stats(), rebuilt.stats())
+        self.assertEqual(self.index.average_field_lengths(), rebuilt.average_field_lengths())
+        self.assertEqual(self.index.lookup_category('숙박'), {'4', '7'})
+
+
+class VectorIndexTests(TestCase):
+    def setUp(self):
+        self.index = VectorIndex(dim=2048)
+        self.index.build(SAMPLE_SPOTS)
+
+    def test_unrelated_query_returns_nothing_at_default_threshold(self):
+        self.assertTrue(self.index.search('zzzz qqq xylophone', 5, min_score=0.0))
+        self.assertEqual(self.index.search('zzzz qqq xylophone', 5), [])
+
+    def test_related_query_passes_default_threshold(self):
+        result = self.index.search('조문국 유물 박물관', 5)
+        self.assertEqual(result[0]['id'], '6')
+        self.assertTrue(all(spot['similarity'] >= self.index.min_score for spot in result))
+
+    def test_threshold_is_validated(self):
+        for min_score in (-0.1, 1.5):
+            with self.assertRaises(ValueError):
+                VectorIndex(min_score=min_score)
+
+
+class BM25RankerTests(TestCase):
+    def setUp(self):
+        self.ranker = BM25Ranker(NgramIndex.from_spots(SAMPLE_SPOTS))
+
+    def test_scores_only_matching_spots(self):
+        scores = self.ranker.score(['마늘'])
+        self.assertEqual(set(scores), {'2', '5'})
+        self.assertTrue(all(score > 0 for score in scores.values()))
+        self.assertEqual(self.ranker.score(['없는키워드']), {})
+
+    def test_name_match_outranks_overview_match(self):
+        spots = [
+            {'id': 'a', 'name': '한옥 카페', 'overview': '조용한 휴식', 'category': '음식점'},
+            {'id': 'b', 'name': '휴식 공간', 'overview': '한옥 느낌의 카페', 'category': '음식점'},
+        ]
+        ranked, total = BM25Ranker(NgramIndex.from_spots(spots)).rank(['한옥'], k=2)
+        self.assertEqual([spot['id'] for spot in ranked], ['a', 'b'])
+        self.assertEqual(total, 2)
+
+    def test_rarer_keyword_weighs_more(self):
+        scores = self.ranker.score(['의성', '박물관'])
+        self.assertGreater(self.ranker.score(['박물관'])['6'], self.ranker.score(['의성'])['1'])
+        self.assertIn('6', scores)
+
+    def test_rank_returns_true_top_k_with_catalogue_tiebreak(self):
+        scores = self.ranker.score(['맛집', '숙박', '의성'])
+        ranked, total = self.ranker.rank([], k=3, scores=scores)
+        self.assertEqual(total, len(scores))
+        expected = sorted(scores, key=lambda spot_id: (-scores[spot_id], int(spot_id)))[:3]
+        self.assertEqual([spot['id'] for spot in ranked], expected)
+        self.assertEqual(ranked[0]['score'], round(scores[expected[0]], 4))
+
+        tied = [dict(SAMPLE_SPOTS[2], id=spot_id) for spot_id in ('x', 'y', 'z')]
+        ranked, _ = BM25Ranker(NgramIndex.from_spots(tied)).rank(['고찰'], k=2)
+        self.assertEqual([spot['id'] for spot in ranked], ['x', 'y'])
+
+    def test_rank_with_non_positive_k(self):
+        self.assertEqual(self.ranker.rank(['마늘'], k=0), ([], 2))
+
+
+class ResultQuotaTests(TestCase):
+    def ids(self, spots):
+        return [spot['id'] for spot in spots]
+
+    def test_adds_all_lodgings_and_minimum_restaurants(self):
+        recommended = [SAMPLE_SPOTS[0], SAMPLE_SPOTS[2]]  # 관광지 2개
+        result = apply_result_quotas(recommended, SAMPLE_SPOTS, limit=10, min_results=5, min_restaurants=2)
+        types = [spot['contenttypeid'] for spot in result]
+        self.assertEqual(result[0]['id'], '1')
+        self.assertEqual(types.count('32'), 2)
+        self.assertGreaterEqual(types.count('39'), 2)
+        self.assertGreaterEqual(len(result), 5)
+        self.assertEqual(len(set(self.ids(result))), len(result))
+
+    def test_missing_restaurants_follow_scores(self):
+        scores = {'5': 2.0, '8': 1.0, '2': 0.5}
+        result = apply_result_quotas([SAMPLE_SPOTS[0]], SAMPLE_SPOTS, limit=10, scores=scores,
+                                     min_results=2, min_restaurants=1, include_all_lodgings=False)
+        self.assertEqual(self.ids(result), ['1', '5'])
+
+    def test_fills_to_minimum_in_catalogue_order(self):
+        result = apply_result_quotas([SAMPLE_SPOTS[5]], SAMPLE_SPOTS, limit=10, min_results=4,
+                                     min_restaurants=0, include_all_lodgings=False)
+        self.assertEqual(self.ids(result), ['6', '1', '2', '3'])
+
+    def test_never_exceeds_limit_and_evicts_lowest_ranked(self):
+        recommended = [SAMPLE_SPOTS[0], SAMPLE_SPOTS[2], SAMPLE_SPOTS[5]]
+        result = apply_result_quotas(recommended, SAMPLE_SPOTS, limit=3, min_results=3, min_restaurants=1)
+        self.assertEqual(len(result), 3)
+        # 숙박 2개 + 음식점 1개가 우선, 일반 항목은 낮은 순위부터 밀려남
+        self.assertEqual(sorted(spot['contenttypeid'] for spot in result), ['32', '32', '39'])
+
+        result = apply_result_quotas(recommended, SAMPLE_SPOTS, limit=4, min_results=4, min_restaurants=1)
+        self.assertEqual(self.ids(result)[0], '1')
+        self.assertEqual(len(result), 4)
+
+    def test_already_satisfied_list_is_unchanged(self):
+        recommended = [SAMPLE_SPOTS[1], SAMPLE_SPOTS[3], SAMPLE_SPOTS[6], SAMPLE_SPOTS[0]]
+        result = apply_result_quotas(recommended, SAMPLE_SPOTS, limit=4, min_results=4, min_restaurants=1)
+        self.assertEqual(result, recommended)
+
+    @override_settings(RECOMMENDATION_QUOTAS_ENABLED=False, RECOMMENDATION_MIN_RESULTS=5,
+                       RECOMMENDATION_MIN_RESTAURANTS=2)
+    def test_compact_mode_always_applies_quotas(self):
+        service = GeminiService.__new__(GeminiService)
+        analysis = {'keywords': ['고운사']}
+        with override_settings(GEMINI_ANALYSIS_MODE='legacy'):
+            result = service.select_spots('고운사', analysis, SAMPLE_SPOTS, max_results=10)
+        self.assertEqual(self.ids(result['recommended_spots']), ['3'])
+
+        with override_settings(GEMINI_ANALYSIS_MODE='compact'):
+            result = service.select_spots('고운사', analysis, SAMPLE_SPOTS, max_results=10)
+        types = [spot['contenttypeid'] for spot in result['recommended_spots']]
+        self.assertEqual(result['recommended_spots'][0]['id'], '3')
+        self.assertEqual(types.count('32'), 2)
+        self.assertGreaterEqual(types.count('39'), 2)
+        self.assertGreaterEqual(len(types), 5)
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def run_followers(self, flight, fn, count):
+        """리더가 fn 안에서 대기하는 동안 count개의 follower를 합류시킨 뒤 모두의 결과를 반환"""
+        results = [None] * (count + 1)
+
+        def call(slot):
+            try:
+                results[slot] = flight.do('key', fn)
+            except Exception as e:
+                results[slot] = e
+
+        threads = [threading.Thread(target=call, args=(slot,)) for slot in range(count + 1)]
+        threads[0].start()
+        self.assertTrue(self.started.wait(5))
+        for thread in threads[1:]:
+            thread.start()
+        # follower가 모두 합류한 뒤 리더를 풀어줌
+        for _ in range(500):
+            if flight.stats()['collapsed'] == count:
+                break
+            time.sleep(0.01)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_followers_share_one_execution(self):
+        calls = []
+
+        def fn():
+            calls.append(1)
+            self.started.set()
+            self.release.wait(5)
+            return {'keywords': ['맛집']}
+
+        flight = SingleFlight()
+        results = self.run_followers(flight, fn, 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'keywords': ['맛집']}] * 5)
+        # 호출자별 복사본이라 한쪽 수정이 다른 쪽에 보이지 않음
+        results[1]['keywords'].append('카페')
+        self.assertEqual(results[2], {'keywords': ['맛집']})
+        stats = flight.stats()
+        self.assertEqual((stats['executions'], stats['collapsed'], stats['in_flight']), (1, 4, 0))
+        self.assertEqual(stats['max_waiters'], 4)
+
+    def test_followers_receive_leader_error(self):
+        def fn():
+            self.started.set()
+            self.release.wait(5)
+            raise ValueError('gemini down')
+
+        flight = SingleFlight()
+        results = self.run_followers(flight, fn, 2)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(flight.stats()['errors'], 1)
+        # 실패한 호출은 남지 않고 다음 호출은 새로 실행
+        self.assertEqual(flight.do('key', lambda: 'ok'), 'ok')
+        self.assertEqual(flight.stats()['executions'], 2)
+
+    def test_follower_wait_is_bounded_by_its_own_budget(self):
+        def fn():
+            self.started.set()
+            self.release.wait(5)
+            return 'slow'
+
+        flight = SingleFlight()
+        leader = threading.Thread(target=lambda: self.assertEqual(flight.do('key', fn), 'slow'))
+        leader.start()
+        self.assertTrue(self.started.wait(5))
+        started = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            flight.do('key', fn, timeout=0.05)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.release.set()
+        leader.join(5)
+        self.assertEqual(flight.stats()['timeouts'], 1)
+        self.assertEqual(flight.stats()['executions'], 1)
+
+    def test_async_follower_times_out_without_cancelling_shared_task(self):
+        flight = AsyncSingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.1)
+            return 'slow'
+
+        async def scenario():
+            leader = asyncio.ensure_future(flight.do('key', fn))
+            await asyncio.sleep(0)
+            with self.assertRaises(asyncio.TimeoutError):
+                await flight.do('key', fn, timeout=0.01)
+            return await leader
+
+        self.assertEqual(asyncio.run(scenario()), 'slow')
+        self.assertEqual(flight.stats()['timeouts'], 1)
+
+    def test_async_followers_share_task_and_survive_cancellation(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {'keywords': ['온천']}
+
+        async def scenario():
+            leader = asyncio.ensure_future(flight.do('key', fn))
+            await asyncio.sleep(0)
+            cancelled = asyncio.ensure_future(flight.do('key', fn))
+            follower = asyncio.ensure_future(flight.do('key', fn))
+            await asyncio.sleep(0.01)
+            cancelled.cancel()
+            return await asyncio.gather(leader, follower)
+
+        results = asyncio.run(scenario())
+        self.assertEqual(results, [{'keywords': ['온천']}] * 2)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()['collapsed'], 2)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+
+GEMINI_ANALYSIS_JSON = json.dumps({
+    'keywords': ['의성', '마늘 "흑" 요리', 'a\\b'],
+    'categories': ['음식점'],
+    'intent': '맛집 {추천}, 가족 여행',
+    'confidence': 0.85,
+    'nested': {'level': [1, {'deep': ']}'}], 'ok': True},
+    'empty': None,
+}, ensure_ascii=False, indent=1)
+
+
+class IncrementalJSONFieldParserTests(TestCase):
+    def feed_chunks(self, text, size):
+        parser = IncrementalJSONFieldParser()
+        for start in range(0, len(text), size):
+            parser.feed(text[start:start + size])
+        return parser
+
+    def test_every_two_chunk_split_matches_json_loads(self):
+        expected = json.loads(GEMINI_ANALYSIS_JSON)
+        for split in range(len(GEMINI_ANALYSIS_JSON) + 1):
+            parser = IncrementalJSONFieldParser()
+            parser.feed(GEMINI_ANALYSIS_JSON[:split])
+            parser.feed(GEMINI_ANALYSIS_JSON[split:])
+            self.assertEqual(parser.fields, expected, split)
+            self.assertTrue(parser.finished)
+
+    def test_small_chunks_with_code_fence(self):
+        text = f"분석 결과입니다.\n```json\n{GEMINI_ANALYSIS_JSON}\n```\n끝 {{\"ignored\": 1}}"
+        for size in (1, 2, 3, 7, 64):
+            self.assertEqual(self.feed_chunks(text, size).fields, json.loads(GEMINI_ANALYSIS_JSON), size)
+
+    def test_fields_complete_before_object_closes(self):
+        parser = IncrementalJSONFieldParser()
+        head = '{"keywords": ["의성", "온천"], "categories": ["관광'
+        parser.feed(head)
+        self.assertEqual(parser.fields, {'keywords': ['의성', '온천']})
+        self.assertFalse(parser.has('keywords', 'categories'))
+        parser.feed('지"], "confidence": 0.9')
+        self.assertTrue(parser.has('keywords', 'categories'))
+        # 숫자는 뒤에 ',' 또는 '}'가 와야 확정
+        self.assertNotIn('confidence', parser.fields)
+        parser.feed('}')
+        self.assertEqual(parser.fields['confidence'], 0.9)
+        self.assertTrue(parser.finished)
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('api.resilience.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('gemini', failure_threshold=3, reset_timeout=30)
+
+    def trip(self):
+        for _ in range(3):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure(RuntimeError('boom'))
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()  # 연속 실패가 아니면 초기화
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.stats()['rejected'], 1)
+
+    def test_half_open_allows_a_single_probe(self):
+        self.trip()
+        self.now += 29.9
+        self.assertFalse(self.breaker.allow())
+        self.now += 0.1
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())  # 시험 호출이 끝날 때까지 나머지는 차단
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens_for_a_full_timeout(self):
+        self.trip()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure(RuntimeError('still down'))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.now += 1
+        self.assertTrue(self.breaker.allow())
+        stats = self.breaker.stats()
+        self.assertEqual(stats['opened'], 2)
+        self.assertEqual(stats['last_error'], 'still down')
+
+
+class ConcurrencyLimiterTests(TestCase):
+    def test_admits_up_to_limit_then_rejects_when_queue_is_full(self):
+        limiter = ConcurrencyLimiter('test', max_concurrent=2, max_queue=0)
+        self.assertEqual(limiter.acquire(), 0.0)
+        self.assertEqual(limiter.acquire(), 0.0)
+        with self.assertRaises(AdmissionRejected) as raised:
+            limiter.acquire(timeout=1)
+        self.assertEqual(raised.exception.reason, 'queue_full')
+        limiter.release()
+        self.assertEqual(limiter.acquire(), 0.0)
+        stats = limiter.stats()
+        self.assertEqual((stats['in_flight'], stats['admitted'], stats['rejected_queue_full']), (2, 3, 1))
+
+    def test_queued_request_times_out(self):
+        limiter = ConcurrencyLimiter('test', max_concurrent=1, max_queue=1)
+        limiter.acquire()
+        with self.assertRaises(AdmissionRejected) as raised:
+            limiter.acquire(timeout=0.05)
+        self.assertEqual(raised.exception.reason, 'queue_timeout')
+        self.assertEqual(limiter.stats()['queue_depth'], 0)
+
+    def test_queued_request_gets_released_slot(self):
+        limiter = ConcurrencyLimiter('test', max_concurrent=1, max_queue=1)
+        limiter.acquire()
+        waited = []
+        thread = threading.Thread(target=lambda: waited.append(limiter.acquire(timeout=5)))
+        thread.start()
+        while limiter.stats()['queue_depth'] == 0:
+            time.sleep(0.005)
+        limiter.release()
+        thread.join(5)
+        self.assertEqual(len(waited), 1)
+        self.assertGreater(waited[0], 0)
+        self.assertEqual(limiter.stats()['in_flight'], 1)
+
+    def test_reserved_admission_releases_once(self):
+        limiter = ConcurrencyLimiter('test', max_concurrent=1, max_queue=0)
+        admission = limiter.reserve()
+        admission.release()
+        admission.release()
+        self.assertTrue(admission.released)
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+
+
+@override_settings(GEMINI_OVERLOAD_ACTION='reject', GEMINI_QUEUE_TIMEOUT_SECONDS=0.05)
+class StreamingAdmissionTests(TestCase):
+    def setUp(self):
+        self.limiter = ConcurrencyLimiter('gemini', max_concurrent=1, max_queue=0)
+        service = GeminiService.__new__(GeminiService)
+        service.model = mock.Mock()
+        self.service = service
+        for target, value in (('api.services.GEMINI_LIMITER', self.limiter),
+                              ('api.services.ANALYSIS_CACHE', None),
+                              ('api.views.get_gemini_service', lambda: service)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def post_stream(self):
+        return self.client.post('/api/query/', {'query': '의성 맛집', 'stream': 'ndjson'}, format='json')
+
+    def test_overloaded_stream_is_rejected_before_streaming(self):
+        self.limiter.acquire()
+        response = self.post_stream()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertFalse(response.streaming)
+
+    def test_reserved_slot_is_released_when_stream_closes(self):
+        def stream_query(user_query, top_k=None, admission=None, cached_analysis=None):
+            self.assertIsNotNone(admission)
+            self.assertEqual(self.limiter.stats()['in_flight'], 1)
+            yield {'event': 'done', 'success': True, 'count': 0}
+
+        self.service.stream_query = stream_query
+        response = self.post_stream()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([json.loads(line) for line in b''.join(response.streaming_content).splitlines()],
+                         [{'event': 'done', 'success': True, 'count': 0}])
+        response.close()
+        self.assertEqual(self.limiter.stats()['in_flight'], 0)
+
+        # 본문을 읽기 전에 연결이 끊겨도 자리를 반납
+        response = self.post_stream()
+        response.close()
+        self.assertEqual(self.limiter.stats()['in_flight'], 0)
+
+    def test_streamed_request_reads_the_analysis_cache_once(self):
+        cache = AnalysisCache()
+        analysis = {'keywords': ['마늘'], 'processed_query': '의성 맛집', 'confidence': 0.9}
+        cache.set('의성 맛집', analysis)
+        self.service._hydrate_spots = lambda db, spots, deadline=None: spots
+        with mock.patch('api.services.ANALYSIS_CACHE', cache), \
+                mock.patch('api.services.TOUR_CACHE.spots', return_value=SAMPLE_SPOTS), \
+                mock.patch('api.services.REGISTRY.get', return_value=None):
+            events = [json.loads(line) for line in b''.join(self.post_stream().streaming_content).splitlines()]
+        self.assertEqual(events[0]['event'], 'analysis')
+        self.assertTrue(events[-1]['success'])
+        self.assertEqual(self.limiter.stats()['in_flight'], 0)
+        self.assertEqual(cache.stats()['memory']['hits'], 1)
+        self.assertEqual(cache.stats()['memory']['misses'], 0)
+
+    def test_reserved_miss_is_not_looked_up_again(self):
+        cache = AnalysisCache()
+        with mock.patch('api.services.ANALYSIS_CACHE', cache):
+            admission, cached = self.service.reserve_gemini_slot('의성 맛집')
+            self.assertIsNone(cached)
+            with mock.patch.object(self.service, '_generate_and_cache_analysis',
+                                   return_value={'keywords': ['맛집']}) as generate:
+                result = self.service.analyze_user_query('의성 맛집', admission=admission)
+        admission.release()
+        generate.assert_called_once()
+        self.assertFalse(result['cached'])
+        self.assertEqual((cache.stats()['memory']['hits'], cache.stats()['memory']['misses']), (0, 1))
+
+
+class HedgePolicyTests(TestCase):
+    def make_policy(self, **options):
+        options.setdefault('min_samples', 1)
+        options.setdefault('min_delay', 0.02)
+        options.setdefault('max_ratio', 1.0)
+        policy = HedgePolicy(percentile=50, **options)
+        policy.latencies.record(0.01)
+        return policy
+
+    def slow_then_fast(self, first_delay=0.5):
+        """첫 호출만 느리고 이후 호출은 바로 끝나는 fn"""
+        calls = []
+        lock = threading.Lock()
+
+        def fn(timeout):
+            with lock:
+                attempt = len(calls)
+                calls.append(timeout)
+            if attempt == 0:
+                time.sleep(first_delay)
+                return 'primary'
+            return 'hedge'
+        return fn, calls
+
+    def test_no_hedge_without_enough_samples(self):
+        policy = HedgePolicy(min_samples=5)
+        self.assertIsNone(policy.hedge_delay())
+        self.assertEqual(policy.run(lambda timeout: 'ok', 1.0), 'ok')
+        self.assertEqual(policy.stats()['hedged'], 0)
+
+    def test_slow_primary_is_hedged_and_hedge_wins(self):
+        policy = self.make_policy()
+        fn, calls = self.slow_then_fast()
+        self.assertEqual(policy.run(fn, 2.0), 'hedge')
+        self.assertEqual(len(calls), 2)
+        self.assertLess(calls[1], 2.0)  # hedge에는 남은 시간만 전달
+        stats = policy.stats()
+        self.assertEqual((stats['hedged'], stats['hedge_wins']), (1, 1))
+
+    def test_fast_primary_is_not_hedged(self):
+        policy = self.make_policy(min_delay=0.5)
+        fn, calls = self.slow_then_fast(first_delay=0.0)
+        self.assertEqual(policy.run(fn, 2.0), 'primary')
+        self.assertEqual(len(calls), 1)
+
+    def test_hedge_ratio_budget(self):
+        # 이번 요청까지 포함한 최근 hedge 비율이 max_ratio를 넘으면 hedge하지 않음
+        policy = self.make_policy(max_ratio=0.5)
+        results = [policy.run(self.slow_then_fast(first_delay=0.1)[0], 2.0) for _ in range(3)]
+        self.assertEqual(results, ['primary', 'hedge', 'primary'])
+        stats = policy.stats()
+        self.assertEqual((stats['hedged'], stats['budget_denied']), (1, 2))
+
+    def test_hedge_takes_a_limiter_slot_or_is_skipped(self):
+        limiter = ConcurrencyLimiter('gemini', max_concurrent=2, max_queue=0)
+        policy = self.make_policy(limiter=limiter)
+        limiter.acquire()  # 1차 호출이 차지한 자리
+        fn, calls = self.slow_then_fast(first_delay=0.2)
+
+        def fn_with_slot_check(timeout):
+            if calls:
+                self.assertEqual(limiter.stats()['in_flight'], 2)
+            return fn(timeout)
+
+        self.assertEqual(policy.run(fn_with_slot_check, 2.0), 'hedge')
+        time.sleep(0.3)  # 진 쪽(1차) 호출이 끝날 때까지
+        self.assertEqual(limiter.stats()['in_flight'], 1)
+
+        limiter.acquire()  # 빈 자리가 없으면 hedge하지 않음
+        fn, calls = self.slow_then_fast(first_delay=0.1)
+        self.assertEqual(policy.run(fn, 2.0), 'primary')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(policy.stats()['slot_denied'], 1)
+        self.assertEqual(limiter.stats()['in_flight'], 2)
+
+    def test_async_hedge_cancels_loser_and_releases_slot(self):
+        limiter = ConcurrencyLimiter('gemini', max_concurrent=2, max_queue=0)
+        policy = self.make_policy(limiter=limiter)
+        cancelled = []
+
+        async def coro_fn(timeout):
+            if not cancelled:
+                cancelled.append(False)
+                try:
+                    await asyncio.sleep(1)
+                except asyncio.CancelledError:
+                    cancelled[0] = True
+                    raise
+                return 'primary'
+            return 'hedge'
+
+        async def scenario():
+            result = await policy.run_async(coro_fn, 2.0)
+            await asyncio.sleep(0)
+            return result
+
+        self.assertEqual(asyncio.run(scenario()), 'hedge')
+        self.assertEqual(cancelled, [True])
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+
+
+class StreamQueryTelemetryTests(TestCase):
+    def test_stream_events_share_one_request_scope(self):
+        service = GeminiService.__new__(GeminiService)
+        service.model = None
+        seen = []
+
+        def recommend(user_query, all_spots, **kwargs):
+            seen.append(current_usage())
+            return {'recommended_spots': SAMPLE_SPOTS[:3], 'analysis': {}, 'gemini_used': False}
+
+        def hydrate(db, spots, deadline=None):
+            seen.append(current_usage())
+            record_firestore_reads(len(spots), 'hydration')
+            return spots
+
+        service.recommend_tourism_spots = recommend
+        service._hydrate_spots = hydrate
+        with mock.patch('api.services.REGISTRY.get', return_value=None), \
+                mock.patch('api.services.TOUR_CACHE.spots', return_value=SAMPLE_SPOTS):
+            events = []
+            for event in service.stream_query('의성', top_k=3, batch_size=2):
+                # 이벤트 사이에 요청 범위가 호출자 context로 새지 않음
+                self.assertIsNone(current_usage())
+                events.append(event['event'])
+
+        self.assertEqual(events, ['analysis', 'spots', 'spots', 'done'])
+        self.assertIsNotNone(seen[0])
+        self.assertTrue(all(usage is seen[0] for usage in seen))
+        self.assertEqual(seen[0].firestore_reads, 3)
+
+
+class QRResultHubTests(TestCase):
+    def make_hub(self):
+        """on_snapshot 등록 스레드를 기록하고 콜백을 보관하는 가짜 Firestore 클라이언트"""
+        self.registered = []
+        self.watches = []
+
+        def on_snapshot(callback):
+            self.registered.append((threading.current_thread(), callback))
+            watch = mock.Mock()
+            self.watches.append(watch)
+            return watch
+
+        client = mock.Mock()
+        client.collection.return_value.document.return_value.on_snapshot.side_effect = on_snapshot
+        return QRResultHub(lambda: client)
+
+    def snapshot(self, data):
+        doc = mock.Mock(exists=True)
+        doc.to_dict.return_value = data
+        return [doc], [], None
+
+    def test_async_wait_registers_listener_off_the_event_loop(self):
+        hub = self.make_hub()
+
+        async def scenario():
+            loop_thread = threading.current_thread()
+            waiters = [asyncio.ensure_future(hub.wait_async('가게1', 2)) for _ in range(3)]
+            while not self.registered:
+                await asyncio.sleep(0.005)
+            self.assertIsNot(self.registered[0][0], loop_thread)
+            await asyncio.sleep(0.02)
+            # 리스너 스레드에서 문서가 생겼다고 알림
+            threading.Thread(target=self.registered[0][1], args=self.snapshot({'qr_url': 'u'})).start()
+            return await asyncio.gather(*waiters)
+
+        self.assertEqual(asyncio.run(scenario()), [{'qr_url': 'u'}] * 3)
+        self.assertEqual(len(self.registered), 1)
+        self.assertEqual(hub.stats()['pending_keys'], 0)
+
+    def test_async_wait_times_out_and_unsubscribes(self):
+        hub = self.make_hub()
+        self.assertIsNone(asyncio.run(hub.wait_async('가게2', 0.05)))
+        hub._closer.submit(lambda: None).result(5)
+        self.watches[0].unsubscribe.assert_called_once()
+        self.assertEqual(hub.stats()['timeouts'], 1)
+        self.assertEqual(hub.stats()['pending_keys'], 0)
+
+
+def remote_state(documents):
+    """fetch_sync_state와 같은 모양의 컬렉션 상태 (문서 ID -> (content_hash, modifiedtime))"""
+    return {doc_id: (content_hash(data), data.get('modifiedtime', '')) for doc_id, data in documents}
+
+
+class SyncPlanTests(TestCase):
+    def setUp(self):
+        self.remote_docs = [
+            (spot['id'], {'title': spot['name'], 'overview': spot['overview'], 'modifiedtime': '20250101000000'})
+            for spot in SAMPLE_SPOTS
+        ]
+
+    def test_classifies_source_against_remote(self):
+        source = dict(self.remote_docs)
+        source['1'] = {**source['1'], 'overview': '설명 수정', 'modifiedtime': '20250301000000'}
+        source['2'] = {**source['2'], 'overview': '같은 시각에 설명만 수정'}
+        source['3'] = {**source['3'], 'overview': '오래된 원본', 'modifiedtime': '20240101000000'}
+        source['9'] = {'title': '새 관광지', 'modifiedtime': '20250301000000'}
+        del source['8']
+        remote = remote_state(self.remote_docs)
+        remote['4'] = (None, '20250101000000')  # content_hash 도입 전에 쓴 문서
+
+        plan = plan_sync(source.items(), remote)
+
+        self.assertEqual([doc_id for doc_id, _ in plan.added], ['9'])
+        self.assertEqual({doc_id: reason for doc_id, _, reason in plan.changed}, {
+            '1': 'modifiedtime 20250101000000 -> 20250301000000',
+            '2': 'content_hash',
+            '4': 'no_content_hash',
+        })
+        self.assertEqual(plan.stale, ['3'])
+        self.assertEqual(plan.unchanged, 3)
+        self.assertEqual(plan.deleted, [])
+        self.assertTrue(all(data['content_hash'] == content_hash(data) for _, data in plan.documents()))
+
+    def test_deletes_only_with_delete_missing(self):
+        source = self.remote_docs[:6]
+        remote = remote_state(self.remote_docs)
+        self.assertEqual(plan_sync(source, remote).deleted, [])
+        plan = plan_sync(source, remote, delete_missing=True)
+        self.assertEqual(plan.deleted, ['7', '8'])
+        self.assertEqual(plan.writes, 2)
+
+    def test_content_hash_ignores_field_order_and_volatile_fields(self):
+        data = {'title': '고운사', 'overview': '천년 고찰'}
+        reordered = {'overview': '천년 고찰', 'title': '고운사', 'loaded_at': '2025-01-01', 'content_hash': 'x'}
+        self.assertEqual(content_hash(data), content_hash(reordered))
+        plan = plan_sync([('3', reordered)], {'3': (content_hash(data), '')})
+        self.assertEqual((plan.unchanged, plan.writes), (1, 0))
+
+    def test_chunked_sync_matches_single_plan(self):
+        source = [(doc_id, {**data, 'overview': data['overview'] + ' (수정)'}) if doc_id in ('2', '5') else (doc_id, data)
+                  for doc_id, data in self.remote_docs[1:]]
+        source += [('9', {'title': '새 관광지'}), ('3', {'title': '중복'})]
+        remote = remote_state(self.remote_docs)
+        db = mock.Mock()
+        snapshots = []
+        for doc_id, (remote_hash, modified) in remote.items():
+            snapshot = mock.Mock(id=doc_id)
+            snapshot.to_dict.return_value = {'content_hash': remote_hash, 'modifiedtime': modified}
+            snapshots.append(snapshot)
+        db.collection.return_value.select.return_value.stream.return_value = snapshots
+
+        expected = plan_sync(source, remote, delete_missing=True).report(limit=None)
+        with mock.patch('builtins.print'):
+            plan, report = sync_collection(db, iter(source), delete_missing=True, dry_run=True, chunk_size=3)
+
+        self.assertIsNone(report)
+        self.assertEqual(plan.report(limit=None), expected)
+        self.assertEqual(plan.deleted, ['1'])
+
+
+class BulkIngestStreamingTests(TestCase):
+    def test_batches_are_committed_while_documents_are_still_being_read(self):
+        produced = [0]
+        committed_at = []
+
+        def documents():
+            for i in range(5000):
+                produced[0] += 1
+                yield str(i), {'n': i}
+            yield '0', {'n': -1}  # 같은 ID는 처음 값만 씀
+
+        def make_batch():
+            batch = mock.Mock()
+            batch.commit.side_effect = lambda: committed_at.append(produced[0])
+            return batch
+
+        db = mock.Mock()
+        db.batch.side_effect = make_batch
+        db.collection.return_value.document.side_effect = lambda doc_id: mock.Mock(id=doc_id)
+        with mock.patch('builtins.print'):
+            report = bulk_ingest(db, documents(), mode='batch', workers=1, progress_every=0)
+
+        self.assertEqual((report.submitted, report.written, report.failed), (5000, 5000, 0))
+        self.assertEqual(len(committed_at), 10)
+        # commit 중인 배치는 workers * 2개까지이므로 첫 commit 때 읽은 문서는 배치 3개분을 넘지 않음
+        self.assertLessEqual(committed_at[0], 1500)
+
+
+class TourItemStreamTests(TestCase):
+    def write_response(self, body_items, **json_options):
+        handle, path = tempfile.mkstemp(suffix='.json')
+        self.addCleanup(os.remove, path)
+        response = {'response': {'header': {'resultCode': '0000', 'resultMsg': 'OK'},
+                                 'body': {'numOfRows': 3, 'items': {'item': body_items}, 'totalCount': 3}}}
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            json.dump(response, f, **json_options)
+        return path
+
+    def json_load_items(self, path):
+        with open(path, encoding='utf-8') as f:
+            items = json.load(f)['response']['body']['items']['item']
+        return items if isinstance(items, list) else [items] if isinstance(items, dict) else []
+
+    def test_matches_json_load_across_chunk_boundaries(self):
+        items = [
+            {'contentid': str(100 + i), 'title': f'의성 관광지 {i}', 'overview': '따옴표 \" 와 {괄호} [대괄호], 쉼표',
+             'price': i * 1000, 'tags': ['마늘', {'nested': [1, 2.5, None, True]}], 'addr2': ''}
+            for i in range(20)
+        ]
+        for json_options in ({}, {'ensure_ascii': False}, {'indent': 2}):
+            path = self.write_response(items, **json_options)
+            for chunk_size in (1, 7, 64, 64 * 1024):
+                self.assertEqual(list(iter_tour_items(path, chunk_size=chunk_size)), self.json_load_items(path))
+
+    def test_single_object_and_empty_item_values(self):
+        for body_items in ({'contentid': '1', 'title': '고운사'}, [], ''):
+            path = self.write_response(body_items)
+            self.assertEqual(list(iter_tour_items(path, chunk_size=5)), self.json_load_items(path))
+
+        # 결과가 없는 TourAPI 응답은 item이 아니라 items 자체가 빈 문자열
+        handle, path = tempfile.mkstemp(suffix='.json')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            json.dump({'response': {'header': {'resultCode': '0000'},
+                                    'body': {'numOfRows': 0, 'items': '', 'totalCount': 0}}}, f)
+        for chunk_size in (1, 5, 64 * 1024):
+            self.assertEqual(list(iter_tour_items(path, chunk_size=chunk_size)), [])
+
+    def test_matches_json_load_on_bundled_tour_data(self):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'us_tourdata_final.txt')
+        if not os.path.exists(path):
+            self.skipTest('us_tourdata_final.txt 없음')
+        self.assertEqual(list(iter_tour_items(path, chunk_size=4096)), self.json_load_items(path))
 
-# Create your tests here.
@@ -0,0 +1,323 @@
+"""
+tour_list 컬렉션의 프로세스 단위 스냅샷 캐시
+
+요청마다 tour_list 전체를 Firestore에서 읽지 않도록, 워커 시작 시 한 번 적재한 뒤
+Firestore on_snapshot 리스너(또는 주기적 폴링 diff)로 변경분만 반영합니다.
+요청 경로는 메모리 스냅샷만 읽습니다.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from .telemetry import record_firestore_reads
+
+logger = logging.getLogger(__name__)
+
+TOUR_COLLECTION = 'tour_list'
+
+
+def to_spot_summary(doc_id: str, data: dict) -> dict:
+    """추천 엔진에서 사용하는 요약 형태로 변환"""
+    return {
+        'id': data.get('contentid', doc_id),  # contentid 사용, 없으면 문서 ID 사용
+        'name': data.get('title', ''),  # title을 name으로 사용
+        'overview': data.get('overview', ''),
+        'category': data.get('category', ''),
+        'contenttypeid': str(data.get('contenttypeid', '')),  # 음식점(39)/숙박(32) 구성 규칙 적용용
+    }
+
+
+class TourCatalogCache:
+    """tour_list 스냅샷을 메모리에 유지하고 리스너/폴링으로 증분 갱신"""
+
+    def __init__(self, client_factory: Callable, collection: str = TOUR_COLLECTION,
+                 mode: str = 'listener', poll_interval: float = 300.0, initial_timeout: float = 30.0):
+        self._client_factory = client_factory
+        self._collection = collection
+        self._mode = mode
+        self._poll_interval = poll_interval
+        self._initial_timeout = initial_timeout
+
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._started = False
+        self._watch = None
+        self._poll_thread = None
+        self._listeners: List[Callable] = []
+
+        # 읽기 전용 스냅샷 (변경 시 통째로 교체)
+        self._docs: Dict[str, dict] = {}
+        self._update_times: Dict[str, object] = {}
+        self._spots: List[dict] = []
+        self._contentid_index: Dict[str, str] = {}
+        self._version = 0
+
+        # 통계 (hits/misses는 요청마다 한 번인 spots() 호출 기준, 문서 단건 조회는 세지 않음)
+        self._loaded_at = None
+        self._synced_at = None
+        self._hits = 0
+        self._misses = 0
+        self._full_loads = 0
+        self._change_batches = 0
+        self._changed_docs = 0
+        self._last_error = None
+
+    # ------------------------------------------------------------------
+    # 수명 주기
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        """스냅샷을 적재하고 갱신 경로(리스너 또는 폴링)를 시작 (중복 호출 무시)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        try:
+            if self._mode == 'listener':
+                self._start_listener()
+            else:
+                self._load_full()
+                self._start_polling()
+        except Exception as e:
+            logger.error(f"❌ tour_list 캐시 시작 실패: {e}")
+            with self._lock:
+                self._started = False
+                self._last_error = str(e)
+            raise
+
+    def start_in_background(self) -> None:
+        """워커 시작을 막지 않도록 별도 스레드에서 적재"""
+        def _run():
+            try:
+                self.start()
+            except Exception:
+                pass  # start()에서 이미 로깅됨, 첫 요청에서 다시 시도
+        threading.Thread(target=_run, name='tour-cache-preload', daemon=True).start()
+
+    def stop(self) -> None:
+        """리스너/폴링 중지"""
+        self._stop.set()
+        with self._lock:
+            if self._watch is not None:
+                try:
+                    self._watch.unsubscribe()
+                except Exception as e:
+                    logger.warning(f"tour_list 리스너 해제 실패: {e}")
+                self._watch = None
+            self._started = False
+
+    def add_listener(self, callback: Callable) -> None:
+        """스냅샷 변경 알림 등록
+
+        callback(spots, upserted, removed_ids, full) 형태로 호출됩니다.
+        full=True면 전체 재적재, 아니면 변경된 요약(upserted)과 삭제된 관광지 ID(removed_ids)만 전달합니다.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+            ready = self._ready.is_set()
+            spots = self._spots
+        if ready:
+            callback(spots, spots, [], True)
+
+    def _notify(self, spots: List[dict], upserted: List[dict], removed_ids: List[str], full: bool) -> None:
+        for callback in list(self._listeners):
+            try:
+                callback(spots, upserted, removed_ids, full)
+            except Exception as e:
+                logger.error(f"❌ tour_list 변경 알림 처리 실패: {e}")
+
+    # ------------------------------------------------------------------
+    # 읽기 경로
+    # ------------------------------------------------------------------
+    def is_ready(self) -> bool:
+        """스냅샷 적재 완료 여부 (대기 없이 확인)"""
+        return self._ready.is_set()
+
+    def spots(self) -> List[dict]:
+        """추천용 관광지 요약 목록 (메모리 스냅샷)"""
+        self._ensure_ready(count=True)
+        return self._spots
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        """문서 ID로 전체 문서 데이터 조회"""
+        self._ensure_ready()
+        return self._docs.get(doc_id)
+
+    def get_by_contentid(self, content_id: str) -> Optional[dict]:
+        """contentid 필드로 전체 문서 데이터 조회"""
+        self._ensure_ready()
+        doc_id = self._contentid_index.get(content_id)
+        return self._docs.get(doc_id) if doc_id is not None else None
+
+    def _ensure_ready(self, count: bool = False) -> None:
+        # count=True(카탈로그 읽기)만 적중/실패로 집계 - 요청 하나가 get()을 여러 번 부르므로
+        # 단건 조회까지 세면 적중률이 항상 1에 가까워짐
+        if self._ready.is_set():
+            if count:
+                with self._lock:
+                    self._hits += 1
+            return
+
+        if count:
+            with self._lock:
+                self._misses += 1
+        logger.info("tour_list 캐시가 비어 있어 동기 적재를 시작합니다")
+        self.start()
+        if not self._ready.wait(self._initial_timeout):
+            # 리스너 첫 스냅샷이 늦으면 직접 읽어서라도 응답
+            logger.warning("⚠️ tour_list 리스너 초기 스냅샷 지연 - 직접 조회로 대체")
+            self._load_full()
+
+    # ------------------------------------------------------------------
+    # 갱신 경로
+    # ------------------------------------------------------------------
+    def _start_listener(self) -> None:
+        collection_ref = self._client_factory().collection(self._collection)
+        self._watch = collection_ref.on_snapshot(self._on_snapshot)
+        logger.info(f"✅ tour_list on_snapshot 리스너 등록 완료")
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        """Firestore 리스너 콜백 - 변경분만 스냅샷에 반영"""
+        try:
+            if not self._ready.is_set():
+                # 첫 콜백은 전체 문서를 ADDED로 전달하므로 그대로 초기 적재로 사용
+                record_firestore_reads(len(docs), 'tour_cache')
+                self._replace_all({doc.id: doc for doc in docs})
+                return
+
+            # 리스너는 변경된 문서만 읽기로 과금됨
+            record_firestore_reads(len(changes), 'tour_cache')
+            upserts = {}
+            removed = []
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    removed.append(change.document.id)
+                else:
+                    upserts[change.document.id] = change.document
+            self._apply_changes(upserts, removed)
+        except Exception as e:
+            logger.error(f"❌ tour_list 스냅샷 반영 실패: {e}")
+            with self._lock:
+                self._last_error = str(e)
+
+    def _start_polling(self) -> None:
+        def _loop():
+            while not self._stop.wait(self._poll_interval):
+                try:
+                    self._poll_once()
+                except Exception as e:
+                    logger.error(f"❌ tour_list 폴링 실패: {e}")
+                    with self._lock:
+                        self._last_error = str(e)
+
+        self._poll_thread = threading.Thread(target=_loop, name='tour-cache-poll', daemon=True)
+        self._poll_thread.start()
+        logger.info(f"✅ tour_list 폴링 시작 (주기: {self._poll_interval}s)")
+
+    def _poll_once(self) -> None:
+        """전체 목록을 읽어 update_time 기준으로 diff 계산"""
+        snapshots = {doc.id: doc for doc in self._client_factory().collection(self._collection).get()}
+        record_firestore_reads(len(snapshots), 'tour_cache')
+        upserts = {
+            doc_id: doc for doc_id, doc in snapshots.items()
+            if self._update_times.get(doc_id) != doc.update_time
+        }
+        removed = [doc_id for doc_id in self._docs if doc_id not in snapshots]
+        self._apply_changes(upserts, removed)
+
+    def _load_full(self) -> None:
+        snapshots = self._client_factory().collection(self._collection).get()
+        record_firestore_reads(len(snapshots), 'tour_cache')
+        self._replace_all({doc.id: doc for doc in snapshots})
+
+    def _replace_all(self, snapshots: dict) -> None:
+        docs = {}
+        update_times = {}
+        for doc_id, doc in snapshots.items():
+            docs[doc_id] = doc.to_dict() or {}
+            update_times[doc_id] = doc.update_time
+
+        with self._lock:
+            self._docs = docs
+            self._update_times = update_times
+            self._publish()
+            self._full_loads += 1
+            self._loaded_at = self._synced_at
+            spots = self._spots
+        self._notify(spots, spots, [], True)
+        self._ready.set()
+        logger.info(f"✅ tour_list 스냅샷 적재 완료: {len(docs)}개 문서")
+
+    def _apply_changes(self, upserts: dict, removed: list) -> None:
+        with self._lock:
+            self._synced_at = time.time()
+            if not upserts and not removed:
+                return
+
+            docs = dict(self._docs)
+            update_times = dict(self._update_times)
+            removed_ids = []
+            upserted = []
+            for doc_id, doc in upserts.items():
+                data = doc.to_dict() or {}
+                summary = to_spot_summary(doc_id, data)
+                if doc_id in docs:
+                    previous_id = to_spot_summary(doc_id, docs[doc_id])['id']
+                    if previous_id != summary['id']:
+                        removed_ids.append(previous_id)
+                docs[doc_id] = data
+                update_times[doc_id] = doc.update_time
+                upserted.append(summary)
+            for doc_id in removed:
+                if doc_id in docs:
+                    removed_ids.append(to_spot_summary(doc_id, docs[doc_id])['id'])
+                docs.pop(doc_id, None)
+                update_times.pop(doc_id, None)
+
+            self._docs = docs
+            self._update_times = update_times
+            self._publish()
+            self._change_batches += 1
+            self._changed_docs += len(upserts) + len(removed)
+            spots = self._spots
+        self._notify(spots, upserted, removed_ids, False)
+        logger.info(f"🔄 tour_list 증분 갱신: 변경 {len(upserts)}개, 삭제 {len(removed)}개")
+
+    def _publish(self) -> None:
+        """현재 문서 집합으로 읽기 전용 요약 목록을 재구성 (lock 보유 상태에서 호출)"""
+        self._spots = [
+            to_spot_summary(doc_id, self._docs[doc_id])
+            for doc_id in sorted(self._docs)
+            if self._docs[doc_id].get('contentid') or doc_id
+        ]
+        self._contentid_index = {
+            data['contentid']: doc_id for doc_id, data in self._docs.items() if data.get('contentid')
+        }
+        self._version += 1
+        self._synced_at = time.time()
+
+    # ------------------------------------------------------------------
+    # 통계
+    # ------------------------------------------------------------------
+    def stats(self) -> dict:
+        """캐시 상태 (신선도, 카탈로그 읽기 적중률, 스냅샷 크기)"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'mode': self._mode,
+                'ready': self._ready.is_set(),
+                'version': self._version,
+                'size': len(self._docs),
+                'loaded_at': self._loaded_at,
+                'synced_at': self._synced_at,
+                'staleness_seconds': round(time.time() - self._synced_at, 3) if self._synced_at else None,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else None,
+                'full_loads': self._full_loads,
+                'change_batches': self._change_batches,
+                'changed_docs': self._changed_docs,
+                'last_error': self._last_error,
+            }
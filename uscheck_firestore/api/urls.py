@@ -5,7 +5,11 @@ app_name = 'api'
 
 urlpatterns = [
     path('query/', views.process_query, name='query'),
+    path('query/async/', views.process_query_async, name='query_async'),
     path('business/', views.view_business, name='business'),
     path('qr/generate/', views.qr_generate_request, name='qr_generate_request'),
     path('qr/generate/pubsub/', views.qr_get_url, name='generate_qr_pubsub'),
+    path('qr/wait/', views.qr_wait, name='qr_wait'),
+    path('stats/', views.runtime_stats, name='runtime_stats'),
+    path('cache/analysis/purge/', views.purge_analysis_cache, name='purge_analysis_cache'),
 ]
@@ -0,0 +1,315 @@
+"""
+관광지 의미 검색용 로컬 벡터 인덱스
+
+tour_list 문서를 해시된 문자 n-gram TF-IDF 벡터로 변환해 L2 정규화된 NumPy 행렬 하나로 보관합니다.
+질의는 행렬-벡터 곱 한 번과 argpartition으로 상위 k개를 고릅니다.
+행렬은 .npy로 저장해 워커가 재계산 없이 memory-map으로 불러오며, 저장 후에는 최근 keep_versions개를 뺀
+이전 카탈로그 버전 디렉터리를 지웁니다.
+리스너의 부분 변경은 patch로 해당 행만 바꾸고, IDF 재계산과 디스크 저장은 schedule_rebuild로
+변경이 잠잠해진 뒤 별도 스레드에서 한 번만 합니다.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_FINGERPRINT_DIR = re.compile(r'^[0-9a-f]{40}$')
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(' ', str(text or '').lower()).strip()
+
+
+def spot_vector_text(spot: dict) -> str:
+    """벡터화 대상 텍스트 (이름은 두 번 넣어 가중치 부여)"""
+    name = spot.get('name', '')
+    return normalize_text(f"{name} {name} {spot.get('category', '')} {spot.get('overview', '')}")
+
+
+class HashedNgramVectorizer:
+    """문자 n-gram을 고정 차원으로 해싱하는 벡터화기 (프로세스 간 동일하도록 crc32 사용)"""
+
+    def __init__(self, dim: int = 2048, min_n: int = 1, max_n: int = 3):
+        self.dim = dim
+        self.min_n = min_n
+        self.max_n = max_n
+
+    def term_counts(self, text: str) -> Counter:
+        counts = Counter()
+        for n in range(self.min_n, self.max_n + 1):
+            for i in range(len(text) - n + 1):
+                gram = text[i:i + n]
+                if gram.strip():
+                    counts[zlib.crc32(gram.encode('utf-8')) % self.dim] += 1
+        return counts
+
+    def transform(self, text: str, idf: np.ndarray) -> np.ndarray:
+        """sublinear TF * IDF, L2 정규화된 벡터"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for bucket, count in self.term_counts(normalize_text(text)).items():
+            vector[bucket] = (1.0 + math.log(count)) * idf[bucket]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class VectorIndex:
+    """정규화된 문서 행렬 + 메타데이터, 디스크 영속화 지원"""
+
+    MATRIX_FILE = 'matrix.npy'
+    IDF_FILE = 'idf.npy'
+    META_FILE = 'meta.json'
+
+    def __init__(self, directory: Optional[str] = None, dim: int = 2048, keep_versions: int = 2,
+                 min_score: float = 0.2):
+        # 해싱된 1~3-gram은 공통 음절만으로도 0.05~0.1 정도가 나오므로 무관한 관광지로 결과를 채우지 않도록 높게 둠
+        if not 0.0 <= min_score <= 1.0:
+            raise ValueError(f"min_score must be between 0 and 1 (got {min_score})")
+        self.directory = directory
+        self.vectorizer = HashedNgramVectorizer(dim=dim)
+        self.keep_versions = max(1, keep_versions)
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        # patch 계산과 build 결과 반영을 직렬화 (patch가 오래된 행렬 위에 덮어쓰지 않도록)
+        self._update_lock = threading.Lock()
+        self._rebuild_timer: Optional[threading.Timer] = None
+        self._pending_spots: Optional[List[dict]] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._idf: Optional[np.ndarray] = None
+        self._spots: List[dict] = []
+        self._fingerprint = None
+        self._loaded_from_disk = False
+        self._builds = 0
+        self._patches = 0
+        self._pruned = 0
+        self._queries = 0
+
+    # ------------------------------------------------------------------
+    # 구성 / 영속화
+    # ------------------------------------------------------------------
+    @staticmethod
+    def fingerprint(spots: List[dict], dim: int) -> str:
+        """카탈로그 내용이 바뀌면 달라지는 식별값 (디스크 인덱스 재사용 여부 판단)"""
+        digest = hashlib.sha1(str(dim).encode('utf-8'))
+        for spot in spots:
+            digest.update(str(spot.get('id', '')).encode('utf-8'))
+            digest.update(b'\0')
+            digest.update(spot_vector_text(spot).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def load_or_build(self, spots: List[dict]) -> None:
+        """디스크 인덱스가 현재 카탈로그와 같으면 mmap으로 불러오고, 아니면 새로 만들어 저장"""
+        fingerprint = self.fingerprint(spots, self.vectorizer.dim)
+        if self._fingerprint == fingerprint:
+            return
+        if self.directory and self._load(fingerprint, spots):
+            return
+        self.build(spots, fingerprint)
+        if self.directory:
+            self._save()
+
+    def build(self, spots: List[dict], fingerprint: Optional[str] = None) -> None:
+        """문서 행렬과 IDF 계산"""
+        dim = self.vectorizer.dim
+        counts = [self.vectorizer.term_counts(spot_vector_text(spot)) for spot in spots]
+
+        document_frequency = np.zeros(dim, dtype=np.float32)
+        for term_counts in counts:
+            document_frequency[list(term_counts)] += 1
+        idf = (np.log((1 + len(spots)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        matrix = np.zeros((len(spots), dim), dtype=np.float32)
+        for row, term_counts in enumerate(counts):
+            for bucket, count in term_counts.items():
+                matrix[row, bucket] = (1.0 + math.log(count)) * idf[bucket]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+
+        fingerprint = fingerprint or self.fingerprint(spots, dim)
+        with self._update_lock, self._lock:
+            self._matrix = matrix
+            self._idf = idf
+            self._spots = list(spots)
+            self._fingerprint = fingerprint
+            self._loaded_from_disk = False
+            self._builds += 1
+        logger.info(f"✅ 벡터 인덱스 구성 완료: {matrix.shape[0]}개 문서 x {dim}차원")
+
+    def patch(self, upserted: Iterable[dict], removed_ids: Iterable[str]) -> None:
+        """변경된 관광지 행만 교체/추가/삭제 (IDF는 기존 값 유지, 정확한 재계산은 schedule_rebuild)"""
+        upserted = [spot for spot in upserted if spot.get('id')]
+        changed_ids = set(removed_ids) | {spot['id'] for spot in upserted}
+        if not changed_ids:
+            return
+        with self._update_lock:
+            with self._lock:
+                matrix, idf, spots = self._matrix, self._idf, self._spots
+            if matrix is None:
+                return
+            keep = [row for row, spot in enumerate(spots) if spot.get('id') not in changed_ids]
+            rows = [matrix[keep]]  # mmap 행렬이어도 여기서 메모리 복사본이 됨
+            if upserted:
+                rows.append(np.stack([self.vectorizer.transform(spot_vector_text(spot), idf) for spot in upserted]))
+            patched = np.concatenate(rows).astype(np.float32, copy=False)
+            with self._lock:
+                self._matrix = patched
+                self._spots = [spots[row] for row in keep] + upserted
+                # 디스크의 어떤 버전과도 같지 않으므로 다음 load_or_build에서 다시 확인
+                self._fingerprint = None
+                self._loaded_from_disk = False
+                self._patches += 1
+
+    def schedule_rebuild(self, spots: List[dict], delay: float) -> None:
+        """delay초 동안 추가 변경이 없으면 최신 spots로 재구성/저장 (여러 번 불러도 한 번만 실행)"""
+        with self._lock:
+            self._pending_spots = spots
+            if self._rebuild_timer is not None:
+                return
+            self._rebuild_timer = threading.Timer(delay, self._run_scheduled_rebuild)
+            self._rebuild_timer.daemon = True
+            self._rebuild_timer.start()
+
+    def _run_scheduled_rebuild(self) -> None:
+        with self._lock:
+            spots, self._pending_spots = self._pending_spots, None
+            self._rebuild_timer = None
+        if spots is None:
+            return
+        try:
+            self.load_or_build(spots)
+        except Exception as e:
+            logger.error(f"❌ 벡터 인덱스 재구성 실패: {e}")
+
+    def _path(self, fingerprint: str, name: str) -> str:
+        # 카탈로그 버전별 디렉터리에 저장해 다른 워커가 교체 중인 파일을 섞어 읽지 않도록 함
+        return os.path.join(self.directory, fingerprint, name)
+
+    def _save(self) -> None:
+        """임시 파일에 쓴 뒤 교체, meta.json은 마지막에 써서 완성 표시로 사용"""
+        try:
+            with self._lock:
+                matrix, idf, spots, fingerprint = self._matrix, self._idf, self._spots, self._fingerprint
+            os.makedirs(os.path.join(self.directory, fingerprint), exist_ok=True)
+            for name, array in ((self.MATRIX_FILE, matrix), (self.IDF_FILE, idf)):
+                tmp_path = f'{self._path(fingerprint, name)}.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, array)
+                os.replace(tmp_path, self._path(fingerprint, name))
+
+            meta = {
+                'fingerprint': fingerprint,
+                'dim': self.vectorizer.dim,
+                'documents': len(spots),
+            }
+            tmp_path = f'{self._path(fingerprint, self.META_FILE)}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(fingerprint, self.META_FILE))
+            logger.info(f"💾 벡터 인덱스 저장 완료: {os.path.join(self.directory, fingerprint)}")
+        except Exception as e:
+            logger.error(f"❌ 벡터 인덱스 저장 실패: {e}")
+            return
+        self._prune(fingerprint)
+
+    def _prune(self, current: str) -> None:
+        """현재 버전과 최근 keep_versions-1개를 뺀 카탈로그 버전 디렉터리 삭제
+
+        다른 워커가 mmap 중인 파일이 지워져도 매핑은 유지되고, 로드 도중 사라지면 재구성으로 넘어갑니다.
+        """
+        try:
+            versions = [
+                entry for entry in os.scandir(self.directory)
+                if entry.is_dir() and _FINGERPRINT_DIR.match(entry.name) and entry.name != current
+            ]
+        except OSError as e:
+            logger.warning(f"⚠️ 벡터 인덱스 디렉터리 조회 실패: {e}")
+            return
+        versions.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in versions[self.keep_versions - 1:]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            with self._lock:
+                self._pruned += 1
+            logger.info(f"🧹 이전 벡터 인덱스 삭제: {entry.path}")
+
+    def _load(self, fingerprint: str, spots: List[dict]) -> bool:
+        meta_path = self._path(fingerprint, self.META_FILE)
+        if not os.path.exists(meta_path):
+            return False
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('dim') != self.vectorizer.dim:
+                return False
+            matrix = np.load(self._path(fingerprint, self.MATRIX_FILE), mmap_mode='r')
+            idf = np.load(self._path(fingerprint, self.IDF_FILE))
+            if matrix.shape != (len(spots), self.vectorizer.dim):
+                return False
+        except Exception as e:
+            logger.warning(f"⚠️ 벡터 인덱스 로드 실패, 재구성합니다: {e}")
+            return False
+
+        with self._update_lock, self._lock:
+            self._matrix = matrix
+            self._idf = idf
+            self._spots = list(spots)
+            self._fingerprint = fingerprint
+            self._loaded_from_disk = True
+        logger.info(f"✅ 벡터 인덱스 memory-map 로드: {meta_path}")
+        return True
+
+    # ------------------------------------------------------------------
+    # 검색
+    # ------------------------------------------------------------------
+    def is_ready(self) -> bool:
+        return self._matrix is not None
+
+    def search(self, text: str, k: int, min_score: Optional[float] = None) -> List[dict]:
+        """질의 텍스트와 코사인 유사도가 min_score(기본 self.min_score) 이상인 상위 k개 관광지"""
+        if min_score is None:
+            min_score = self.min_score
+        with self._lock:
+            matrix, idf, spots = self._matrix, self._idf, self._spots
+            self._queries += 1
+        if matrix is None or not len(spots) or k <= 0:
+            return []
+
+        query = self.vectorizer.transform(text, idf)
+        if not query.any():
+            return []
+        scores = matrix @ query
+        k = min(k, len(spots))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            dict(spots[i], similarity=round(float(scores[i]), 4))
+            for i in top if scores[i] >= min_score
+        ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'ready': self._matrix is not None,
+                'documents': len(self._spots),
+                'dim': self.vectorizer.dim,
+                'min_score': self.min_score,
+                'loaded_from_disk': self._loaded_from_disk,
+                'builds': self._builds,
+                'patches': self._patches,
+                'pending_rebuild': self._rebuild_timer is not None,
+                'pruned_versions': self._pruned,
+                'queries': self._queries,
+                'fingerprint': self._fingerprint,
+            }
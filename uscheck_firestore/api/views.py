@@ -1,26 +1,95 @@
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework import status
 from django.views.decorators.csrf import csrf_exempt
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.conf import settings
 import logging
 import uuid
-from google.cloud import firestore
-from .services import GeminiService
+from .clients import REGISTRY
+from .services import get_gemini_service, ANALYSIS_CACHE, ANALYSIS_FLIGHTS, GEMINI_BREAKER, GEMINI_HEDGE, GEMINI_LIMITER, TOUR_CACHE, TOUR_INDEX, VECTOR_INDEX
+from .async_services import get_async_pipeline, ASYNC_ANALYSIS_FLIGHTS
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, METRICS
+from .qr_publisher import get_qr_publisher
+from .qr_results import QR_RESULT_HUB, QR_RESULTS
+from .renderers import EventStreamRenderer, NDJSONRenderer
+from .resilience import AdmissionRejected
+import asyncio
 import json
 import os
 from google.cloud import pubsub_v1
 
 PUBSUB_TOPIC = "qr-gen"  # 실제 생성한 Pub/Sub 
 PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT", "gen-lang-client-0000121060")
+MAX_RECOMMENDATIONS = 100  # 한 번에 요청할 수 있는 최대 추천 개수
+OVERLOAD_RETRY_AFTER_SECONDS = 2  # Gemini 과부하로 거절할 때 Retry-After
 
 logger = logging.getLogger(__name__)
 
+
+def _parse_limit(value):
+    """클라이언트가 실제로 필요한 추천 개수 (기본 30개, 1~MAX_RECOMMENDATIONS), 숫자가 아니면 None"""
+    try:
+        top_k = int(value or 30)
+    except (TypeError, ValueError):
+        return None
+    return max(1, min(top_k, MAX_RECOMMENDATIONS))
+
+
+STREAM_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'sse': 'text/event-stream; charset=utf-8',
+}
+
+
+def _stream_format(request, data):
+    """스트리밍 응답 형식 결정 (body의 stream 값 우선, 없으면 Accept 헤더), 버퍼링 응답이면 None"""
+    requested = str(data.get('stream') or request.GET.get('stream') or '').lower()
+    if requested in STREAM_CONTENT_TYPES:
+        return requested
+    accept = request.headers.get('Accept', '')
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    if 'text/event-stream' in accept:
+        return 'sse'
+    return None
+
+
+class _AdmittedStream:
+    """스트림이 끝나거나 시작 전에 닫혀도 미리 확보한 Gemini 자리를 반납하는 응답 본문"""
+
+    def __init__(self, content, admission):
+        self._content = content
+        self._admission = admission
+
+    def __iter__(self):
+        return iter(self._content)
+
+    def close(self):
+        try:
+            self._content.close()
+        finally:
+            if self._admission is not None:
+                self._admission.release()
+
+
+def _encode_stream_events(events, stream_format):
+    """stream_query 이벤트를 NDJSON 줄 또는 SSE 프레임으로 직렬화"""
+    for event in events:
+        payload = json.dumps(event, ensure_ascii=False)
+        if stream_format == 'sse':
+            yield f"event: {event['event']}\ndata: {payload}\n\n".encode('utf-8')
+        else:
+            yield f"{payload}\n".encode('utf-8')
+
+
 @api_view(['POST', 'GET'])
 @permission_classes([AllowAny])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, NDJSONRenderer, EventStreamRenderer])
 @csrf_exempt
 def process_query(request):
     if request.method == 'POST':
@@ -31,14 +100,80 @@ def process_query(request):
         if not user_query:
             return Response({"error": "쿼리가 비어 있습니다."}, status=status.HTTP_400_BAD_REQUEST)
         
+        top_k = _parse_limit(data.get('limit'))
+        if top_k is None:
+            return Response({"error": "limit은 숫자여야 합니다."}, status=status.HTTP_400_BAD_REQUEST)
+        
         try:
-            service = GeminiService()
-            result = service.process_query(user_query)
+            service = get_gemini_service()
+            
+            # 스트리밍 모드: 분석 결과를 먼저 보내고 관광지는 조회되는 대로 묶어서 전송
+            stream_format = _stream_format(request, data)
+            if stream_format:
+                # 200으로 스트림을 시작한 뒤에는 503을 보낼 수 없으므로 Gemini 자리를 먼저 확보
+                # 캐시 조회도 여기서 한 번만 하고 결과를 넘김
+                admission, cached_analysis = service.reserve_gemini_slot(user_query)
+                events = service.stream_query(user_query, top_k=top_k, admission=admission,
+                                              cached_analysis=cached_analysis)
+                response = StreamingHttpResponse(
+                    _AdmittedStream(_encode_stream_events(events, stream_format), admission),
+                    content_type=STREAM_CONTENT_TYPES[stream_format],
+                )
+                response['Cache-Control'] = 'no-cache'
+                response['X-Accel-Buffering'] = 'no'
+                return response
+            
+            result = service.process_query(user_query, top_k=top_k)
             return Response(result, status=status.HTTP_200_OK)
+        except AdmissionRejected as e:
+            return Response(
+                {"error": "요청이 많아 잠시 후 다시 시도해 주세요.", "reason": e.reason},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(OVERLOAD_RETRY_AFTER_SECONDS)},
+            )
         except Exception as e:
             logger.error(f"모델 초기화 실패: {e}")
             return Response({"error": "모델 초기화 실패"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)       
 
+
+@csrf_exempt
+async def process_query_async(request):
+    """ASGI용 비동기 쿼리 처리 (카탈로그 적재와 Gemini 분석을 동시에 진행)"""
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST 메서드만 지원합니다."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({"error": "잘못된 JSON 형식입니다."}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "잘못된 JSON 형식입니다."}, status=status.HTTP_400_BAD_REQUEST)
+    
+    user_query = str(data.get('query', '')).strip()
+    logger.info(f"쿼리(async): {user_query}")
+    if not user_query:
+        return JsonResponse({"error": "쿼리가 비어 있습니다."}, status=status.HTTP_400_BAD_REQUEST)
+    
+    top_k = _parse_limit(data.get('limit'))
+    if top_k is None:
+        return JsonResponse({"error": "limit은 숫자여야 합니다."}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        pipeline = get_async_pipeline()
+        result = await pipeline.process_query(user_query, top_k=top_k)
+        return JsonResponse(result, status=status.HTTP_200_OK, json_dumps_params={'ensure_ascii': False})
+    except AdmissionRejected as e:
+        response = JsonResponse(
+            {"error": "요청이 많아 잠시 후 다시 시도해 주세요.", "reason": e.reason},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            json_dumps_params={'ensure_ascii': False},
+        )
+        response['Retry-After'] = str(OVERLOAD_RETRY_AFTER_SECONDS)
+        return response
+    except Exception as e:
+        logger.error(f"모델 초기화 실패: {e}")
+        return JsonResponse({"error": "모델 초기화 실패"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @csrf_exempt
@@ -68,14 +203,20 @@ def qr_generate_request(request):
                 'original_data': f"{store_name}_{store_price}_{timezone.now().strftime('%Y%m%d_%H%M%S')}"
             }
             
-            # Pub/Sub Publisher 클라이언트 생성
-            publisher = pubsub_v1.PublisherClient()
-            topic_path = publisher.topic_path(PROJECT_ID, PUBSUB_TOPIC)
+            publisher = get_qr_publisher(PROJECT_ID, PUBSUB_TOPIC)
+            mode = str(data.get('mode') or settings.QR_PUBLISH_MODE).lower()
+            if mode == 'async':
+                # 발행 완료를 기다리지 않고 바로 응답 (실패 시 백그라운드 재시도 후 qr_publish_failures에 기록)
+                publisher.publish_in_background(qr_data)
+                return Response({
+                    "success": True,
+                    "message": "QR 코드 생성 요청이 접수되었습니다.",
+                    "request_id": qr_data['request_id'],
+                    "original_data": qr_data['original_data'],
+                }, status=status.HTTP_202_ACCEPTED)
             
-            # 메시지 발행
-            message_data = json.dumps(qr_data, ensure_ascii=False).encode('utf-8')
-            future = publisher.publish(topic_path, message_data)
-            message_id = future.result(timeout=30.0)
+            # 메시지 발행 (공유 Publisher, 발행 완료까지 대기)
+            message_id = publisher.publish_and_wait(qr_data, timeout=settings.PUBSUB_PUBLISH_TIMEOUT_SECONDS)
             
             logger.info(f"QR 생성 요청 발행 완료: {message_id}")
             
@@ -119,18 +260,9 @@ def qr_get_url(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        # Firestore에서 QR URL 조회
-        db = firestore.Client()
-        docs = db.collection('qr_results').where(
-            'original_data', '==', original_data
-        ).order_by(
-            'created_at', direction=firestore.Query.DESCENDING
-        ).limit(1).stream()
-        
-        qr_url = None
-        for doc in docs:
-            qr_url = doc.to_dict().get('qr_url')
-            break
+        # sha256(original_data) 문서 ID로 단일 조회 (프로세스 캐시, 미완료 결과는 짧게 캐시)
+        result = QR_RESULTS.get(original_data)
+        qr_url = result.get('qr_url') if result else None
         
         if qr_url:
             return Response({
@@ -150,6 +282,46 @@ def qr_get_url(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         
+async def qr_wait(request):
+    """QR 생성 완료까지 대기하는 long-poll 조회 (GET ?original_data=...&timeout=초)
+
+    결과가 이미 있으면 바로, 아니면 qr_results 문서가 생기는 즉시 200으로 응답하고
+    timeout(최대 QR_WAIT_MAX_TIMEOUT_SECONDS) 안에 생기지 않으면 202(pending)로 응답합니다.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"error": "GET 메서드만 지원합니다."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    
+    original_data = request.GET.get('original_data')
+    if not original_data:
+        return JsonResponse({"error": "original_data 파라미터가 필요합니다."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        timeout = float(request.GET.get('timeout') or settings.QR_WAIT_DEFAULT_TIMEOUT_SECONDS)
+    except ValueError:
+        return JsonResponse({"error": "timeout은 숫자여야 합니다."}, status=status.HTTP_400_BAD_REQUEST)
+    timeout = max(0.0, min(timeout, settings.QR_WAIT_MAX_TIMEOUT_SECONDS))
+    
+    try:
+        # 캐시/단일 조회로 이미 끝난 요청은 리스너 없이 응답
+        result = await asyncio.to_thread(QR_RESULTS.get, original_data)
+        if result is None and timeout > 0:
+            result = await QR_RESULT_HUB.wait_async(original_data, timeout)
+    except Exception as e:
+        logger.error(f"QR 결과 대기 중 오류: {e}")
+        return JsonResponse({"error": "QR URL 조회 중 오류가 발생했습니다."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    if result and result.get('qr_url'):
+        return JsonResponse({
+            "success": True,
+            "qr_url": result['qr_url'],
+            "original_data": original_data
+        }, status=status.HTTP_200_OK, json_dumps_params={'ensure_ascii': False})
+    return JsonResponse({
+        "success": False,
+        "pending": True,
+        "original_data": original_data
+    }, status=status.HTTP_202_ACCEPTED, json_dumps_params={'ensure_ascii': False})
+
+
 @api_view(['POST','GET'])
 @permission_classes([AllowAny])
 @csrf_exempt
@@ -167,7 +339,7 @@ def view_business(request):
             return Response({"error": "모든 필드를 입력해야 합니다."}, status=status.HTTP_400_BAD_REQUEST)
         
         # 비즈니스 정보 저장 로직 (예: 데이터베이스에 저장)
-        db = firestore.Client()
+        db = REGISTRY.get('firestore')
         doc_ref = db.collection('businesses').document()
         doc_ref.set({
             'name': business_name,
@@ -180,8 +352,46 @@ def view_business(request):
         
         
         return Response({"message": "비즈니스 정보 저장 완료"}, status=status.HTTP_200_OK)
-    return Response({"error": "잘못된 요청"}, status=status.HTTP_400_BAD_REQUEST)       
-        
-        
-   
+    return Response({"error": "잘못된 요청"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def runtime_stats(request):
+    """프로세스 내부 캐시 상태 조회 (운영 정보이므로 관리자만)"""
+    return Response({
+        "tour_cache": TOUR_CACHE.stats(),
+        "tour_index": TOUR_INDEX.stats(),
+        "vector_index": VECTOR_INDEX.stats() if VECTOR_INDEX is not None else None,
+        "analysis_cache": ANALYSIS_CACHE.stats() if ANALYSIS_CACHE is not None else None,
+        "analysis_single_flight": ANALYSIS_FLIGHTS.stats(),
+        "analysis_async_single_flight": ASYNC_ANALYSIS_FLIGHTS.stats(),
+        "gemini_circuit_breaker": GEMINI_BREAKER.stats(),
+        "gemini_admission": GEMINI_LIMITER.stats(),
+        "gemini_hedging": GEMINI_HEDGE.stats() if GEMINI_HEDGE is not None else None,
+        "clients": REGISTRY.stats(),
+        "qr_publisher": get_qr_publisher(PROJECT_ID, PUBSUB_TOPIC).stats(),
+        "qr_lookup": QR_RESULTS.stats(),
+        "qr_wait": QR_RESULT_HUB.stats(),
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def purge_analysis_cache(request):
+    """쿼리 분석 캐시 비우기 (관리자 전용, query를 주면 해당 질의만)"""
+    if ANALYSIS_CACHE is None:
+        return Response({"error": "분석 캐시가 비활성화되어 있습니다."}, status=status.HTTP_400_BAD_REQUEST)
+    
+    query = request.data.get('query')
+    removed = ANALYSIS_CACHE.purge(query)
+    return Response({
+        "success": True,
+        "query": query,
+        "removed": removed,
+    }, status=status.HTTP_200_OK)
+
 
+def prometheus_metrics(request):
+    """Prometheus 텍스트 형식 메트릭 (요청 수/지연 시간, Gemini, 캐시 적중률, Pub/Sub 발행 지연)"""
+    return HttpResponse(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
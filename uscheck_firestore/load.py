@@ -2,12 +2,15 @@
 """
 us_tourdata_final.txt 파일의 데이터를 Firestore에 추가 로드하는 스크립트
 (기존 데이터 유지, 새로운 데이터만 추가)
+
+--sync: content_hash/modifiedtime을 비교해 추가/변경된 문서만 반영 (--dry-run이면 차이만 출력)
+       원본에 없는 문서 삭제는 --delete-missing을 줄 때만 하며, 삭제 개수를 보여 주고 확인받음
 """
 import os
 import sys
 import json
+import argparse
 import django
-from datetime import datetime
 from google.cloud import firestore as firestore
 
 # Django 설정
@@ -16,8 +19,13 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uscheck_firestore.settings')
 django.setup()
 
 from django.conf import settings
+from tour_ingest import (
+    INGEST_MODES, TOUR_COLLECTION, bulk_ingest, confirm_deletes_interactively, fetch_existing_ids,
+    sync_collection, with_content_hash,
+)
+from tour_pipeline import build_tour_document, iter_tour_items, tour_document_id
 
-def load_additional_data_to_firestore():
+def load_additional_data_to_firestore(mode='bulk', workers=8):
     """us_tourdata_final.txt 데이터를 Firestore에 추가 로드 (기존 데이터 유지)"""
     try:
         # Firestore 클라이언트 가져오기
@@ -34,203 +42,74 @@ def load_additional_data_to_firestore():
             print(f"❌ 파일을 찾을 수 없습니다: {txt_file_path}")
             return
         
-        print(f"📖 파일 읽기 시작: {txt_file_path}")
-        
-        with open(txt_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # 데이터 구조 확인
-        items = data['response']['body']['items']['item']
-        total_count = len(items)
-        
-        print(f"📊 총 {total_count}개 항목 발견")
+        print(f"📖 파일 스트리밍 읽기: {txt_file_path}")
         print(f"🎯 Firestore 컬렉션: uiseong_tourism")
         print(f"📋 프로젝트: {settings.FIRESTORE_PROJECT_ID}")
         print(f"📋 데이터베이스: {settings.FIRESTORE_DATABASE_ID}")
         
         # Firestore 컬렉션 참조
-        collection_ref = db.collection('tour_list')
+        collection_ref = db.collection(TOUR_COLLECTION)
         
-        # 기존 데이터 확인
-        existing_docs = list(collection_ref.stream())
-        existing_content_ids = set()
+        # 기존 데이터 확인 (문서 ID = contentid, ID만 조회)
+        existing_content_ids = fetch_existing_ids(collection_ref)
         
-        if existing_docs:
-            print(f"🔍 기존 {len(existing_docs)}개 문서가 존재합니다.")
-            for doc in existing_docs:
-                doc_data = doc.to_dict()
-                content_id = doc_data.get('contentid')
-                if content_id:
-                    existing_content_ids.add(content_id)
-            print(f"📝 기존 contentid {len(existing_content_ids)}개 확인")
+        if existing_content_ids:
+            print(f"🔍 기존 {len(existing_content_ids)}개 문서가 존재합니다.")
         else:
             print("📋 기존 데이터가 없습니다. 모든 데이터를 새로 추가합니다.")
         
-        # 데이터 로드
-        success_count = 0
-        skip_count = 0
-        error_count = 0
+        # 데이터 로드 (집계만 남기고 문서는 읽는 대로 bulk_ingest로 넘김)
+        counts = {'total': 0, 'new': 0, 'skip': 0, 'error': 0}
+        category_stats = {}
         
-        for i, item in enumerate(items, 1):
-            try:
-                # contentid 확인 및 유효성 검사
-                content_id = item.get('contentid', '').strip()
-                
-                # contentid가 비어있거나 유효하지 않은 경우 대체 ID 생성
-                if not content_id:
-                    content_id = f'item_{i}_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
-                    print(f"⚠️  contentid가 없어서 대체 ID 생성: {content_id}")
-                
-                # 문서 ID 유효성 검사 (Firestore 문서 ID 규칙)
-                if len(content_id) > 1500:  # Firestore 문서 ID 최대 길이
-                    content_id = content_id[:1500]
-                
-                # 특수문자 제거 (Firestore에서 허용하지 않는 문자들)
-                import re
-                content_id = re.sub(r'[^\w\-_.]', '_', content_id)
-                
-                # 기존 데이터 존재 여부 확인
-                if content_id in existing_content_ids:
-                    skip_count += 1
-                    if i % 10 == 0:
-                        print(f"⏭️  항목 {i} 건너뜀 (이미 존재): {item.get('title', 'N/A')}")
-                    continue
-                
-                # 문서 ID로 사용
-                doc_id = content_id
-                
-                # 카테고리 매핑
-                category = get_category_name(item.get('contenttypeid', ''))
-                
-                # 좌표 변환
-                latitude = float(item.get('mapy', 0)) if item.get('mapy') else None
-                longitude = float(item.get('mapx', 0)) if item.get('mapx') else None
-                
-                # 태그 생성
-                tags = []
-                if item.get('tel'):
-                    tags.append('연락처있음')
-                if item.get('firstimage'):
-                    tags.append('이미지있음')
-                if item.get('cpyrhtDivCd'):
-                    tags.append('저작권표시')
-                
-                # 지역 정보 추가
-                tags.append('의성군')
-                tags.append('경상북도')
-                
-                # 분류별 태그 추가
-                if item.get('cat1') == 'A01':
-                    tags.append('자연')
-                elif item.get('cat1') == 'A02':
-                    tags.append('인문')
-                elif item.get('cat1') == 'A03':
-                    tags.append('레포츠')
-                elif item.get('cat1') == 'A04':
-                    tags.append('쇼핑')
-                elif item.get('cat1') == 'A05':
-                    tags.append('음식')
-                elif item.get('cat1') == 'B02':
-                    tags.append('숙박')
-                
-                # Firestore 문서 데이터 구성
-                doc_data = {
-                    # 기본 정보
-                    'title': item.get('title', '').strip(),
-                    'category': category,
-                    'addr1': item.get('addr1', '').strip(),
-                    'addr2': item.get('addr2', '').strip(),
-                    'overview': item.get('overview', '').strip(),
-                    'price': item.get('price', '').strip(),
-                    # 연락처
-                    'tel': item.get('tel', '').strip(),
-                    
-                    # 이미지
-                    'firstimage': item.get('firstimage', '').strip(),
-                    'firstimage2': item.get('firstimage2', '').strip(),
-                    
-                    # 위치 정보
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'mapx': item.get('mapx', '').strip(),
-                    'mapy': item.get('mapy', '').strip(),
-                    
-                    # 분류 정보
-                    'contentid': item.get('contentid', '').strip(),
-                    'contenttypeid': item.get('contenttypeid', '').strip(),
-                    'areacode': item.get('areacode', '').strip(),
-                    'sigungucode': item.get('sigungucode', '').strip(),
+        def new_documents():
+            # 파일 전체를 json.load 하지 않고 항목을 하나씩 읽음
+            for i, item in enumerate(iter_tour_items(txt_file_path), 1):
+                counts['total'] = i
+                try:
+                    doc_id = tour_document_id(item, i)
                     
-                    # 카테고리 정보
-                    'cat1': item.get('cat1', '').strip(),
-                    'cat2': item.get('cat2', '').strip(),
-                    'cat3': item.get('cat3', '').strip(),
+                    # 기존 데이터 존재 여부 확인
+                    if doc_id in existing_content_ids:
+                        counts['skip'] += 1
+                        continue
                     
-                    # 새로운 분류 시스템
-                    'lDongRegnCd': item.get('lDongRegnCd', '').strip(),
-                    'lDongSignguCd': item.get('lDongSignguCd', '').strip(),
-                    'lclsSystm1': item.get('lclsSystm1', '').strip(),
-                    'lclsSystm2': item.get('lclsSystm2', '').strip(),
-                    'lclsSystm3': item.get('lclsSystm3', '').strip(),
+                    doc_data = with_content_hash(build_tour_document(item))
                     
-                    # 저작권 정보
-                    'cpyrhtDivCd': item.get('cpyrhtDivCd', '').strip(),
-                    
-                    # 기타 정보
-                    'zipcode': item.get('zipcode', '').strip(),
-                    'mlevel': item.get('mlevel', '').strip(),
-                    'readcount': 0,
-                    
-                    # 시간 정보
-                    'createdtime': item.get('createdtime', '').strip(),
-                    'modifiedtime': item.get('modifiedtime', '').strip(),
-                    
-                    # 메타데이터
-                    'tags': tags,
-                    'source': 'us_tourdata_final.txt',
-                    'region': '의성군',
-                    'province': '경상북도',
-                    'loaded_at': datetime.now().isoformat(),
-                    
-                    # 검색용 키워드 (제목을 공백으로 분리)
-                    'search_keywords': item.get('title', '').replace('(', ' ').replace(')', ' ').replace('[', ' ').replace(']', ' ').split(),
-                }
-                
-                # 빈 값 제거
-                doc_data = {k: v for k, v in doc_data.items() if v is not None and v != '' and v != []}
-                
-                # Firestore에 저장
-                collection_ref.document(doc_id).set(doc_data)
-                
-                success_count += 1
-                print(f"✅ 새로 추가: {item.get('title', 'N/A')}")
-                
-                if i % 10 == 0:
-                    print(f"⏳ 진행률: {i}/{total_count} ({i/total_count*100:.1f}%) - 추가: {success_count}, 건너뜀: {skip_count}")
+                except Exception as e:
+                    counts['error'] += 1
+                    print(f"❌ 항목 {i} 변환 실패: {e}")
+                    print(f"   제목: {item.get('title', 'N/A')}")
+                    continue
                 
-            except Exception as e:
-                error_count += 1
-                print(f"❌ 항목 {i} 저장 실패: {e}")
-                print(f"   제목: {item.get('title', 'N/A')}")
-                continue
+                counts['new'] += 1
+                cat = doc_data.get('category', '일반')
+                category_stats[cat] = category_stats.get(cat, 0) + 1
+                yield doc_id, doc_data
+        
+        # 병렬 일괄 쓰기 (처리량 초과 시 재시도)
+        report = bulk_ingest(db, new_documents(), collection=TOUR_COLLECTION, mode=mode, workers=workers)
+        total_count = counts['total']
+        skip_count = counts['skip']
+        error_count = counts['error']
+        print(f"📊 총 {total_count}개 항목 확인")
+        print(f"🆕 새로 추가할 항목 {counts['new']}개, 기존 데이터 건너뜀 {skip_count}개")
+        success_count = report.written
+        error_count += report.failed
+        for error in report.errors:
+            print(f"❌ 저장 실패: {error}")
         
         print(f"\n🎉 의성군 관광 데이터 추가 로드 완료!")
         print(f"✅ 새로 추가: {success_count}개")
         print(f"⏭️  기존 데이터 건너뜀: {skip_count}개")
         print(f"❌ 실패: {error_count}개")
         print(f"📊 총 처리: {total_count}개")
+        print(f"⚡ 처리량: {report.docs_per_second:.1f}개/s ({report.elapsed:.2f}s)")
         print(f"🗂️  최종 데이터베이스 예상 크기: {len(existing_content_ids) + success_count}개")
         
         # 새로 추가된 데이터 통계 정보 출력
         if success_count > 0:
             print(f"\n📈 새로 추가된 데이터 통계:")
-            category_stats = {}
-            for item in items:
-                content_id = item.get('contentid')
-                if content_id not in existing_content_ids:
-                    cat = get_category_name(item.get('contenttypeid', ''))
-                    category_stats[cat] = category_stats.get(cat, 0) + 1
-            
             for category, count in sorted(category_stats.items()):
                 print(f"   {category}: {count}개")
         
@@ -239,22 +118,76 @@ def load_additional_data_to_firestore():
         import traceback
         traceback.print_exc()
 
-def get_category_name(contenttypeid):
-    """contenttypeid를 카테고리명으로 변환"""
-    category_map = {
-        '12': '관광지',
-        '14': '문화시설', 
-        '15': '축제공연행사',
-        '28': '레포츠',
-        '32': '숙박',
-        '38': '쇼핑',
-        '39': '음식점'
-    }
-    
-    return category_map.get(contenttypeid, '일반')
+def sync_data_to_firestore(mode='bulk', workers=8, dry_run=False, delete_missing=False, report_file=None,
+                           assume_yes=False):
+    """us_tourdata_final.txt와 tour_list를 비교해 추가/변경(delete_missing이면 삭제도)된 문서만 반영"""
+    try:
+        db = firestore.Client()
+        
+        txt_file_path = 'us_tourdata_final.txt'
+        if not os.path.exists(txt_file_path):
+            print(f"❌ 파일을 찾을 수 없습니다: {txt_file_path}")
+            return
+        
+        print(f"📖 파일 스트리밍 읽기: {txt_file_path}")
+        
+        def documents():
+            # sync_collection이 chunk 단위로 비교/쓰기하므로 목록으로 모으지 않음
+            for i, item in enumerate(iter_tour_items(txt_file_path), 1):
+                try:
+                    yield tour_document_id(item, i), build_tour_document(item)
+                except Exception as e:
+                    print(f"❌ 항목 {i} 변환 실패: {e}")
+                    print(f"   제목: {item.get('title', 'N/A')}")
+        
+        plan, report = sync_collection(
+            db, documents(), collection=TOUR_COLLECTION, delete_missing=delete_missing, dry_run=dry_run,
+            confirm_deletes=None if assume_yes else confirm_deletes_interactively,
+            mode=mode, workers=workers,
+        )
+        
+        if report_file:
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump(plan.report(limit=None), f, ensure_ascii=False)
+            print(f"📝 차이 보고서 저장: {report_file}")
+        
+        if dry_run:
+            print(f"\n🔎 dry-run: Firestore에 쓰지 않았습니다 (예정 쓰기 {plan.writes}회)")
+        elif report is None:
+            print(f"\n✅ 변경 사항이 없습니다.")
+        else:
+            print(f"\n🎉 동기화 완료: {report.summary()}")
+            for error in report.errors:
+                print(f"❌ 저장 실패: {error}")
+        
+    except Exception as e:
+        print(f"❌ 오류 발생: {e}")
+        import traceback
+        traceback.print_exc()
 
 if __name__ == '__main__':
-    print("🏛️  의성군 관광 데이터 Firestore 추가 업로드")
-    print("📝 기존 데이터는 유지하고 새로운 데이터만 추가합니다")
-    print("=" * 60)
-    load_additional_data_to_firestore()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="us_tourdata_final.txt -> Firestore tour_list 추가 로드")
+    parser.add_argument('--mode', choices=INGEST_MODES, default='bulk',
+                        help="bulk: BulkWriter, batch: 500개 단위 배치 병렬 commit")
+    parser.add_argument('--workers', type=int, default=8, help="batch 모드 동시 commit 수")
+    parser.add_argument('--sync', action='store_true',
+                        help="content_hash/modifiedtime 비교로 추가/변경된 문서만 반영")
+    parser.add_argument('--dry-run', action='store_true', help="--sync 차이 보고서만 출력하고 쓰지 않음")
+    parser.add_argument('--delete-missing', action='store_true',
+                        help="--sync에서 원본에 없는 문서도 삭제 (다른 스크립트가 쓴 문서도 지워지므로 주의)")
+    parser.add_argument('--yes', action='store_true', help="--delete-missing 삭제 확인 질문 생략")
+    parser.add_argument('--report-file', help="--sync 차이 보고서를 JSON으로 저장할 경로")
+    args = parser.parse_args()
+    
+    if args.sync or args.dry_run:
+        print("🔄 의성군 관광 데이터 Firestore 동기화" + (" (dry-run)" if args.dry_run else ""))
+        print("📝 추가/변경" + ("/삭제" if args.delete_missing else "") + "된 문서만 반영합니다")
+        print("=" * 60)
+        sync_data_to_firestore(mode=args.mode, workers=args.workers, dry_run=args.dry_run,
+                               delete_missing=args.delete_missing, report_file=args.report_file,
+                               assume_yes=args.yes)
+    else:
+        print("🏛️  의성군 관광 데이터 Firestore 추가 업로드")
+        print("📝 기존 데이터는 유지하고 새로운 데이터만 추가합니다")
+        print("=" * 60)
+        load_additional_data_to_firestore(mode=args.mode, workers=args.workers)
\ No newline at end of file
@@ -1,8 +1,12 @@
 import qrcode
-import tempfile
-import time
+import hashlib
+import io
 import json
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from google.api_core import exceptions as google_exceptions
 from google.cloud import storage
 from google.cloud import firestore
 from markupsafe import escape
@@ -10,40 +14,251 @@ import base64
 
 BUCKET_NAME = "us-check-bucket"
 BUCKET_URL = f"https://storage.googleapis.com/{BUCKET_NAME}/"
+# 파일명이 내용(해시)으로 정해지므로 같은 이름의 객체는 내용이 바뀌지 않음
+QR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 배치 모드: 렌더링은 프로세스 풀(CPU), 존재 확인/업로드는 스레드 풀(I/O)
+QR_RENDER_PROCESSES = int(os.environ.get("QR_RENDER_PROCESSES", "0")) or os.cpu_count() or 1
+QR_UPLOAD_THREADS = int(os.environ.get("QR_UPLOAD_THREADS", "16"))
+QR_PARALLEL_RENDER_MIN = int(os.environ.get("QR_PARALLEL_RENDER_MIN", "8"))  # 이보다 적으면 프로세스 풀 없이 렌더링
+FIRESTORE_BATCH_LIMIT = 500  # Firestore 배치 하나에 넣을 수 있는 최대 쓰기 수
+# pull 워커: 이 횟수만큼 전달돼도 실패한 메시지는 dead-letter 컬렉션에 남기고 ack (무한 재전달 방지)
+QR_MAX_DELIVERY_ATTEMPTS = int(os.environ.get("QR_MAX_DELIVERY_ATTEMPTS", "5"))
+DEAD_LETTER_COLLECTION = "qr_publish_failures"  # API 서버 qr_publisher의 발행 실패 기록과 같은 컬렉션
+PUBLIC_OBJECT_MEMO_LIMIT = 10000  # 공개 확인 기록을 이 개수까지만 보관 (넘으면 비우고 다시 확인)
+
+# 인스턴스가 재사용되는 동안(웜 스타트) 클라이언트를 다시 만들지 않음
+_clients_lock = threading.Lock()
+_storage_client = None
+_firestore_client = None
+_render_pool = None
+_upload_pool = None
+# 이 인스턴스에서 공개 상태를 확인한 객체 이름 (재사용할 때마다 ACL을 다시 쓰지 않도록)
+_public_objects = set()
+
+
+def _get_bucket():
+    global _storage_client
+    if _storage_client is None:
+        with _clients_lock:
+            if _storage_client is None:
+                _storage_client = storage.Client()
+    return _storage_client.bucket(BUCKET_NAME)
+
+
+def _get_firestore():
+    global _firestore_client
+    if _firestore_client is None:
+        with _clients_lock:
+            if _firestore_client is None:
+                _firestore_client = firestore.Client()
+    return _firestore_client
+
+
+def _get_render_pool():
+    global _render_pool
+    if _render_pool is None:
+        with _clients_lock:
+            if _render_pool is None:
+                _render_pool = ProcessPoolExecutor(max_workers=QR_RENDER_PROCESSES)
+    return _render_pool
+
+
+def _get_upload_pool():
+    global _upload_pool
+    if _upload_pool is None:
+        with _clients_lock:
+            if _upload_pool is None:
+                _upload_pool = ThreadPoolExecutor(max_workers=QR_UPLOAD_THREADS, thread_name_prefix="qr-upload")
+    return _upload_pool
+
+
+def _qr_object_name(qr_string):
+    """같은 내용이면 같은 이름 (초 단위 타임스탬프 충돌/중복 생성 방지)"""
+    return f"qr_{hashlib.sha256(qr_string.encode('utf-8')).hexdigest()}.png"
+
+
+def _render_qr_png(qr_string):
+    """임시 파일 없이 메모리에서 PNG 바이트 생성"""
+    buffer = io.BytesIO()
+    qrcode.make(qr_string).save(buffer)
+    return buffer.getvalue()
+
+
+def upload_qr(qr_string):
+    """QR 이미지를 업로드하고 공개 URL 반환 (같은 내용의 객체가 이미 있으면 그대로 재사용)"""
+    filename = _qr_object_name(qr_string)
+    blob = _get_bucket().blob(filename)
+    if _reuse_existing(blob):
+        print(f"[QR] 기존 이미지 재사용: {filename}")
+        return BUCKET_URL + filename
+
+    return _upload_png(blob, _render_qr_png(qr_string))
+
+
+def _reuse_existing(blob):
+    """객체가 있으면 공개 상태를 보장하고 True"""
+    if not blob.exists():
+        return False
+    _ensure_public(blob)
+    return True
+
+
+def _ensure_public(blob):
+    """업로드 직후 공개 설정 전에 실패한 이전 요청이 남긴 비공개 객체도 공개로 바꿈 (멱등)"""
+    if blob.name in _public_objects:
+        return
+    blob.make_public()
+    _remember_public(blob.name)
+
+
+def _remember_public(name):
+    if len(_public_objects) >= PUBLIC_OBJECT_MEMO_LIMIT:
+        _public_objects.clear()
+    _public_objects.add(name)
+
+
+def _upload_png(blob, png):
+    blob.cache_control = QR_CACHE_CONTROL
+    try:
+        # 동시에 같은 내용을 처리하는 다른 인스턴스가 먼저 올렸으면 덮어쓰지 않음
+        # 생성과 동시에 공개 ACL을 적용해 비공개 상태로 남는 구간을 없앰
+        blob.upload_from_string(png, content_type="image/png", if_generation_match=0,
+                                predefined_acl="publicRead")
+    except google_exceptions.PreconditionFailed:
+        print(f"[QR] 다른 요청이 먼저 업로드함, 재사용: {blob.name}")
+        _ensure_public(blob)
+        return BUCKET_URL + blob.name
+    _remember_public(blob.name)
+    return BUCKET_URL + blob.name
+
+
+def upload_qr_batch(qr_strings):
+    """여러 QR을 한 번에 처리 -> {qr_string: qr_url 또는 Exception}
+
+    1. 이미 있는 객체 확인 (스레드 풀)
+    2. 없는 것만 렌더링 (프로세스 풀, 코어 수만큼 병렬)
+    3. 업로드 + 공개 설정 (스레드 풀)
+    """
+    unique = list(dict.fromkeys(qr_strings))
+    bucket = _get_bucket()
+    blobs = {qr_string: bucket.blob(_qr_object_name(qr_string)) for qr_string in unique}
+    upload_pool = _get_upload_pool()
+    results = {}
+
+    missing = []
+    for qr_string, exists in zip(unique, upload_pool.map(lambda q: _safe(_reuse_existing, blobs[q]), unique)):
+        if isinstance(exists, Exception):
+            results[qr_string] = exists
+        elif exists:
+            results[qr_string] = BUCKET_URL + blobs[qr_string].name
+        else:
+            missing.append(qr_string)
+
+    if len(missing) >= QR_PARALLEL_RENDER_MIN and QR_RENDER_PROCESSES > 1:
+        chunksize = max(1, len(missing) // (QR_RENDER_PROCESSES * 4))
+        pngs = list(_get_render_pool().map(_render_qr_png_safe, missing, chunksize=chunksize))
+    else:
+        pngs = [_render_qr_png_safe(qr_string) for qr_string in missing]
+
+    def _upload(item):
+        qr_string, png = item
+        return png if isinstance(png, Exception) else _safe(_upload_png, blobs[qr_string], png)
+
+    uploads = upload_pool.map(_upload, zip(missing, pngs))
+    for qr_string, qr_url in zip(missing, uploads):
+        results[qr_string] = qr_url
+
+    print(f"[QR][batch] 요청 {len(qr_strings)}개, 고유 {len(unique)}개, 재사용 {len(unique) - len(missing)}개, 신규 {len(missing)}개")
+    return results
+
+
+def _render_qr_png_safe(qr_string):
+    """프로세스 풀용 (너무 긴 데이터 등 렌더링 실패는 배치 전체가 아니라 해당 항목만 실패)"""
+    return _safe(_render_qr_png, qr_string)
+
+
+def _safe(fn, *args):
+    """배치에서 항목 하나의 실패가 나머지를 막지 않도록 예외를 값으로 반환"""
+    try:
+        return fn(*args)
+    except Exception as e:
+        return e
+
 
 def generate_qr_http(request):
     request_json = request.get_json()
     if not request_json:
         return {"error": "No JSON data provided"}, 400
 
+    if "batch" in request_json:
+        return generate_qr_batch_http(request_json["batch"])
+
     qr_string = str(request_json.get("store", ""))
     if not qr_string:
         return {"error": "No 'store' field provided"}, 400
 
-    qr_img = qrcode.make(qr_string)
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    filename = f"qr_{timestamp}.png"
-    temp = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
-    qr_img.save(temp.name)
-
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(BUCKET_NAME)
-    blob = bucket.blob(filename)
-    blob.upload_from_filename(temp.name, content_type="image/png")
-    temp.close()
-    os.unlink(temp.name)
-    blob.make_public()
+    qr_url = upload_qr(qr_string)
 
-    return {"result": "success", "qr_url": BUCKET_URL + filename}, 200
+    return {"result": "success", "qr_url": qr_url}, 200
 
-def save_qr_url_to_firestore(qr_url, original_data):
-    db = firestore.Client()
-    doc_ref = db.collection("qr_results").document()
-    doc_ref.set({
+def generate_qr_batch_http(items):
+    """{"batch": ["가게1", {"store": "가게2"}, ...]} 형태의 일괄 생성 요청"""
+    if not isinstance(items, list) or not items:
+        return {"error": "'batch' must be a non-empty list"}, 400
+
+    qr_strings = [str(item.get("store", "")) if isinstance(item, dict) else str(item) for item in items]
+    if not all(qr_strings):
+        return {"error": "Every batch item needs a 'store' value"}, 400
+
+    started = time.perf_counter()
+    urls = upload_qr_batch(qr_strings)
+    results = []
+    for qr_string in qr_strings:
+        qr_url = urls[qr_string]
+        if isinstance(qr_url, Exception):
+            results.append({"store": qr_string, "result": "error", "error": str(qr_url)})
+        else:
+            results.append({"store": qr_string, "result": "success", "qr_url": qr_url})
+    failed = sum(1 for result in results if result["result"] == "error")
+    print(f"[QR][batch] HTTP {len(qr_strings)}개 처리 ({time.perf_counter() - started:.2f}s, 실패 {failed}개)")
+    return {"result": "success" if not failed else "partial", "results": results}, 200
+
+def _qr_result_id(original_data):
+    """qr_results 문서 ID = sha256(original_data) (API 서버 api/qr_results.qr_result_id와 같은 규칙)"""
+    return hashlib.sha256(original_data.encode("utf-8")).hexdigest()
+
+def _original_data(message):
+    """API 서버가 발행한 JSON 메시지의 original_data (JSON이 아니면 메시지 전체)"""
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return message
+    if isinstance(data, dict) and data.get("original_data"):
+        return str(data["original_data"])
+    return message
+
+def _qr_result(qr_url, original_data):
+    return {
         "qr_url": qr_url,
         "original_data": original_data,
         "created_at": firestore.SERVER_TIMESTAMP
-    })
+    }
+
+def save_qr_url_to_firestore(qr_url, original_data):
+    db = _get_firestore()
+    doc_ref = db.collection("qr_results").document(_qr_result_id(original_data))
+    doc_ref.set(_qr_result(qr_url, original_data))
+
+def save_qr_urls_to_firestore(entries):
+    """(qr_url, original_data) 목록을 500개 단위 배치 쓰기로 저장"""
+    db = _get_firestore()
+    collection = db.collection("qr_results")
+    for start in range(0, len(entries), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for qr_url, original_data in entries[start:start + FIRESTORE_BATCH_LIMIT]:
+            batch.set(collection.document(_qr_result_id(original_data)), _qr_result(qr_url, original_data))
+        batch.commit()
 
 def generate_qr_pubsub(event, context):
     if 'data' not in event:
@@ -52,29 +267,16 @@ def generate_qr_pubsub(event, context):
     try:
         message = base64.b64decode(event['data']).decode('utf-8')
         print("[PubSub] 디코딩된 메시지:", message)
-        print("[PubSub] message(repr):", repr(message)) 
+        print("[PubSub] message(repr):", repr(message))
 
         qr_string = message
         if not qr_string:
             print("[PubSub][오류] 값이 없음")
             return
 
-        qr_img = qrcode.make(qr_string)
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        filename = f"qr_{timestamp}.png"
-        temp = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
-        qr_img.save(temp.name)
-
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blob = bucket.blob(filename)
-        blob.upload_from_filename(temp.name, content_type="image/png")
-        temp.close()
-        os.unlink(temp.name)
-        blob.make_public()
-
-        qr_url = BUCKET_URL + filename
-        save_qr_url_to_firestore(qr_url, qr_string)
+        qr_url = upload_qr(qr_string)
+        # /api/qr/generate/pubsub/는 original_data로 조회하므로 메시지 전체가 아니라 그 값을 키로 저장
+        save_qr_url_to_firestore(qr_url, _original_data(qr_string))
         print({"result": "success", "qr_url": qr_url})
     except Exception as e:
         import sys, traceback
@@ -83,3 +285,142 @@ def generate_qr_pubsub(event, context):
         print("[PubSub][오류] Exception message:", str(e))
         traceback.print_exception(exc_type, exc_value, exc_traceback, file=sys.stdout)
 
+
+def process_qr_messages(messages, errors=None):
+    """Pub/Sub 메시지 본문 목록을 일괄 처리 -> 성공한 메시지의 인덱스 집합 (실패한 메시지는 재전달되도록 ack하지 않음)
+
+    errors에 dict를 넘기면 실패한 메시지의 {인덱스: 예외}를 채움
+    """
+    qr_strings = [message for message in messages if message]
+    urls = upload_qr_batch(qr_strings)
+    done = [
+        index for index, message in enumerate(messages)
+        if message and not isinstance(urls[message], Exception)
+    ]
+    if errors is not None:
+        errors.update(
+            (index, urls[message]) for index, message in enumerate(messages)
+            if message and isinstance(urls[message], Exception)
+        )
+    save_qr_urls_to_firestore([(urls[messages[index]], _original_data(messages[index])) for index in done])
+    return set(done) | {index for index, message in enumerate(messages) if not message}
+
+
+class DeliveryTracker:
+    """메시지별 전달 횟수 (구독에 dead-letter 정책이 없으면 delivery_attempt가 0이므로 직접 셈)"""
+
+    def __init__(self, max_attempts=QR_MAX_DELIVERY_ATTEMPTS, max_entries=100000):
+        self.max_attempts = max_attempts
+        self.max_entries = max_entries
+        self._failures = {}
+
+    def attempt(self, received_message):
+        """이번 전달이 몇 번째인지 (Pub/Sub가 알려주는 값과 이 워커가 본 실패 횟수 중 큰 값)"""
+        seen = self._failures.get(received_message.message.message_id, 0) + 1
+        return max(received_message.delivery_attempt or 0, seen)
+
+    def exhausted(self, received_message):
+        return self.attempt(received_message) >= self.max_attempts
+
+    def failed(self, received_message):
+        if len(self._failures) >= self.max_entries:
+            self._failures.clear()
+        message_id = received_message.message.message_id
+        self._failures[message_id] = self._failures.get(message_id, 0) + 1
+
+    def forget(self, received_message):
+        self._failures.pop(received_message.message.message_id, None)
+
+
+def dead_letter_qr_message(subscription_path, received_message, attempts, error):
+    """재처리/조사용으로 원본 메시지와 오류를 Firestore에 기록 (실패하면 False, 메시지는 ack하지 않음)"""
+    message = received_message.message
+    text = message.data.decode("utf-8", errors="replace")
+    try:
+        _get_firestore().collection(DEAD_LETTER_COLLECTION).document(f"pull-{message.message_id}").set({
+            "subscription": subscription_path,
+            "message_id": message.message_id,
+            "message": text,
+            "original_data": _original_data(text),
+            "attempts": attempts,
+            "error": str(error),
+            "failed_at": firestore.SERVER_TIMESTAMP,
+        })
+        return True
+    except Exception as e:
+        print(f"[PubSub][pull][오류] dead-letter 기록 실패 ({message.message_id}): {e} / message: {text}")
+        return False
+
+
+def run_pull_worker(subscription_path, max_messages=FIRESTORE_BATCH_LIMIT, pull_timeout=30.0,
+                    max_attempts=QR_MAX_DELIVERY_ATTEMPTS):
+    """pull 구독에서 메시지를 max_messages개씩 받아 일괄 처리 (대량 가맹점 등록용)
+
+    max_attempts번 전달돼도 실패한 메시지는 dead-letter 컬렉션에 기록한 뒤 ack해서 재전달을 멈춤
+    """
+    from google.cloud import pubsub_v1
+
+    subscriber = pubsub_v1.SubscriberClient()
+    deliveries = DeliveryTracker(max_attempts)
+    print(f"[PubSub][pull] 시작: {subscription_path} (배치 {max_messages}개, 렌더링 프로세스 {QR_RENDER_PROCESSES}개)")
+    with subscriber:
+        while True:
+            try:
+                response = subscriber.pull(
+                    request={"subscription": subscription_path, "max_messages": max_messages},
+                    timeout=pull_timeout,
+                )
+            except google_exceptions.DeadlineExceeded:
+                continue
+            if not response.received_messages:
+                continue
+
+            started = time.perf_counter()
+            received = response.received_messages
+            messages = []
+            errors = {}
+            for index, received_message in enumerate(received):
+                try:
+                    messages.append(received_message.message.data.decode("utf-8"))
+                except UnicodeDecodeError as e:
+                    # 다시 받아도 같은 결과이므로 바로 dead-letter 대상
+                    messages.append("")
+                    errors[index] = e
+            try:
+                done = process_qr_messages(messages, errors) - set(errors)
+            except Exception as e:
+                # Firestore 배치 저장 실패 등: ack하지 않으면 ack 기한 후 전체 재전달
+                print("[PubSub][pull][오류] 배치 처리 실패:", str(e))
+                done = set()
+                errors.update((index, e) for index in range(len(received)) if index not in errors)
+
+            dead_lettered = set()
+            for index, error in errors.items():
+                received_message = received[index]
+                attempts = deliveries.attempt(received_message)
+                if isinstance(error, UnicodeDecodeError) or deliveries.exhausted(received_message):
+                    if dead_letter_qr_message(subscription_path, received_message, attempts, error):
+                        dead_lettered.add(index)
+                        continue
+                deliveries.failed(received_message)
+            for index in done | dead_lettered:
+                deliveries.forget(received[index])
+
+            ack_ids = [received[index].ack_id for index in sorted(done | dead_lettered)]
+            if ack_ids:
+                subscriber.acknowledge(request={"subscription": subscription_path, "ack_ids": ack_ids})
+            elapsed = time.perf_counter() - started
+            print(f"[PubSub][pull] {len(messages)}개 중 {len(done)}개 완료, dead-letter {len(dead_lettered)}개 "
+                  f"({elapsed:.2f}s, {len(messages) / elapsed:.1f}개/s)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="QR 생성 요청 pull 구독 배치 워커")
+    parser.add_argument("subscription", help="projects/<project>/subscriptions/<subscription>")
+    parser.add_argument("--max-messages", type=int, default=FIRESTORE_BATCH_LIMIT)
+    parser.add_argument("--max-attempts", type=int, default=QR_MAX_DELIVERY_ATTEMPTS,
+                        help="이 횟수만큼 실패한 메시지는 qr_publish_failures에 기록하고 ack")
+    args = parser.parse_args()
+    run_pull_worker(args.subscription, max_messages=args.max_messages, max_attempts=args.max_attempts)
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+tour_list 대량 적재 (load.py / upload_json_to_firestore.py 공용)
+
+- 기존 문서 ID는 필드 없는 projection(select([]) -> __name__만)으로 조회하므로
+  전체 문서 본문을 내려받지 않습니다.
+- 쓰기는 두 가지 방식 중 하나로 병렬 전송합니다.
+  bulk : Firestore BulkWriter (20개 단위 배치를 병렬 전송, 처리량 제한/재시도 내장)
+  batch: 500개 단위 WriteBatch를 스레드 풀에서 동시에 commit
+- 두 방식 모두 처리량 초과(RESOURCE_EXHAUSTED)와 일시적 오류는 지수 백오프로 재시도하고,
+  끝나면 문서/초 처리량을 포함한 결과를 돌려줍니다.
+- sync_collection은 문서마다 저장한 content_hash와 modifiedtime을 원본과 비교해
+  추가/변경된 문서만 씁니다 (dry_run이면 차이 보고서만 만들고 쓰지 않음).
+  원본은 chunk_size개씩 비교하고 바로 쓰므로 메모리에는 기존 문서의 해시 목록과 chunk 하나만 둡니다.
+  원본에 없는 문서 삭제는 delete_missing=True일 때만 하며, 다른 스크립트가 쓴 문서도
+  지워질 수 있으므로 삭제 개수를 먼저 출력하고 confirm_deletes로 확인받습니다.
+"""
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from google.api_core import exceptions as google_exceptions
+from google.cloud.firestore_v1.bulk_writer import BulkRetry, BulkWriterOptions
+
+TOUR_COLLECTION = 'tour_list'
+
+# WriteBatch 한 번에 넣을 수 있는 최대 쓰기 수
+FIRESTORE_BATCH_LIMIT = 500
+
+# 재시도할 gRPC 상태 코드: ABORTED, DEADLINE_EXCEEDED, INTERNAL, RESOURCE_EXHAUSTED, UNAVAILABLE
+RETRYABLE_CODES = {10, 4, 13, 8, 14}
+RETRYABLE_EXCEPTIONS = (
+    google_exceptions.Aborted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+)
+
+INGEST_MODES = ('bulk', 'batch')
+
+# sync_collection이 한 번에 비교/쓰기하는 원본 문서 수
+SYNC_CHUNK_SIZE = 5000
+
+# content_hash 계산에서 제외하는 필드 (적재할 때마다 바뀌는 값)
+VOLATILE_FIELDS = ('content_hash', 'loaded_at')
+
+
+class IngestReport:
+    """적재 결과 (BulkWriter 콜백은 여러 스레드에서 호출되므로 lock으로 집계)"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.deleted = 0
+        self.failed = 0
+        self.retried = 0
+        self.errors: List[str] = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add(self, written: int = 0, deleted: int = 0, failed: int = 0, retried: int = 0, error: str = None) -> int:
+        with self._lock:
+            self.written += written
+            self.deleted += deleted
+            self.failed += failed
+            self.retried += retried
+            if error and len(self.errors) < 20:
+                self.errors.append(error)
+            return self.written + self.deleted
+
+    def merge(self, other: 'IngestReport') -> 'IngestReport':
+        """다른 적재 결과를 합침 (sync의 쓰기/삭제처럼 나눠 실행한 경우)"""
+        with self._lock:
+            self.submitted += other.submitted
+            self.written += other.written
+            self.deleted += other.deleted
+            self.failed += other.failed
+            self.retried += other.retried
+            self.errors.extend(other.errors[:max(0, 20 - len(self.errors))])
+            self.elapsed += other.elapsed
+        return self
+
+    def finish(self) -> 'IngestReport':
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def unaccounted(self) -> int:
+        """제출했지만 성공/실패 어느 쪽으로도 집계되지 않은 쓰기 수"""
+        with self._lock:
+            return self.submitted - (self.written + self.deleted + self.failed)
+
+    @property
+    def docs_per_second(self) -> float:
+        return (self.written + self.deleted) / self.elapsed if self.elapsed else 0.0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'submitted': self.submitted,
+                'written': self.written,
+                'deleted': self.deleted,
+                'failed': self.failed,
+                'retried': self.retried,
+                'elapsed_seconds': round(self.elapsed, 3),
+                'docs_per_second': round(self.docs_per_second, 1),
+                'errors': list(self.errors),
+            }
+
+    def summary(self) -> str:
+        return (f"{self.written + self.deleted}개 완료 / 실패 {self.failed}개 / 재시도 {self.retried}회 "
+                f"({self.elapsed:.2f}s, {self.docs_per_second:.1f}개/s, {self.mode})")
+
+
+def fetch_existing_ids(collection_ref) -> Set[str]:
+    """컬렉션의 문서 ID 집합 (필드 없는 projection이라 문서 본문은 전송되지 않음)"""
+    return {snapshot.id for snapshot in collection_ref.select([]).stream()}
+
+
+def content_hash(data: Dict) -> str:
+    """문서 내용 해시 (필드 순서와 VOLATILE_FIELDS에 무관)"""
+    stable = {key: value for key, value in data.items() if key not in VOLATILE_FIELDS}
+    encoded = json.dumps(stable, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def with_content_hash(data: Dict) -> Dict:
+    """content_hash 필드를 붙인 문서 데이터 (다음 sync에서 비교 기준)"""
+    return {**data, 'content_hash': content_hash(data)}
+
+
+def fetch_sync_state(collection_ref) -> Dict[str, Tuple[Optional[str], str]]:
+    """문서 ID -> (content_hash, modifiedtime) (두 필드만 projection으로 조회)"""
+    state = {}
+    for snapshot in collection_ref.select(['content_hash', 'modifiedtime']).stream():
+        data = snapshot.to_dict() or {}
+        state[snapshot.id] = (data.get('content_hash'), data.get('modifiedtime') or '')
+    return state
+
+
+class SyncPlan:
+    """원본과 컬렉션의 차이 (added/changed/deleted만 쓰기 대상)"""
+
+    def __init__(self):
+        self.added: List[Tuple[str, Dict]] = []
+        self.changed: List[Tuple[str, Dict, str]] = []  # (문서 ID, 데이터, 사유)
+        self.deleted: List[str] = []
+        self.unchanged = 0
+        self.stale: List[str] = []  # 컬렉션 쪽 modifiedtime이 더 최신이라 덮어쓰지 않은 문서
+
+    @property
+    def writes(self) -> int:
+        return len(self.added) + len(self.changed) + len(self.deleted)
+
+    def documents(self) -> List[Tuple[str, Dict]]:
+        return self.added + [(doc_id, data) for doc_id, data, _ in self.changed]
+
+    def absorb(self, part: 'SyncPlan') -> None:
+        """chunk 하나의 계획을 합침 (보고서에 쓰는 title만 남기고 문서 본문은 버림)"""
+        self.added.extend((doc_id, {'title': data.get('title', '')}) for doc_id, data in part.added)
+        self.changed.extend((doc_id, {'title': data.get('title', '')}, reason) for doc_id, data, reason in part.changed)
+        self.deleted.extend(part.deleted)
+        self.unchanged += part.unchanged
+        self.stale.extend(part.stale)
+
+    def stats(self) -> Dict:
+        return {
+            'added': len(self.added),
+            'changed': len(self.changed),
+            'deleted': len(self.deleted),
+            'unchanged': self.unchanged,
+            'stale_source': len(self.stale),
+            'writes': self.writes,
+        }
+
+    def report(self, limit: Optional[int] = 50) -> Dict:
+        """dry-run 차이 보고서 (문서 목록은 종류별 limit개까지, None이면 전부)"""
+        return {
+            **self.stats(),
+            'added_ids': [doc_id for doc_id, _ in self.added[:limit]],
+            'changed_ids': [{'id': doc_id, 'reason': reason} for doc_id, _, reason in self.changed[:limit]],
+            'deleted_ids': self.deleted[:limit],
+            'stale_ids': self.stale[:limit],
+        }
+
+    def print_report(self, limit: int = 20) -> None:
+        stats = self.stats()
+        print(f"🧮 차이: 추가 {stats['added']}개, 변경 {stats['changed']}개, 삭제 {stats['deleted']}개, "
+              f"동일 {stats['unchanged']}개, 원본이 오래됨 {stats['stale_source']}개 -> 쓰기 {stats['writes']}회")
+        for doc_id, data in self.added[:limit]:
+            print(f"   + {doc_id} {data.get('title', '')}")
+        for doc_id, data, reason in self.changed[:limit]:
+            print(f"   ~ {doc_id} {data.get('title', '')} ({reason})")
+        for doc_id in self.deleted[:limit]:
+            print(f"   - {doc_id}")
+        for doc_id in self.stale[:limit]:
+            print(f"   ! {doc_id} (컬렉션 쪽 modifiedtime이 더 최신, 건너뜀)")
+        hidden = max(0, len(self.added) - limit) + max(0, len(self.changed) - limit) + max(0, len(self.deleted) - limit)
+        if hidden:
+            print(f"   ... 외 {hidden}개")
+
+
+def plan_sync(documents: Iterable[Tuple[str, Dict]], remote: Dict[str, Tuple[Optional[str], str]],
+              delete_missing: bool = False, seen: Optional[Set[str]] = None) -> SyncPlan:
+    """원본 문서와 fetch_sync_state 결과를 비교해 SyncPlan 생성
+
+    - content_hash가 같으면 건너뜀
+    - 컬렉션 쪽 modifiedtime이 원본보다 최신이면 (오래된 원본 파일) 덮어쓰지 않음
+    - content_hash가 없는 기존 문서는 해시를 채우기 위해 한 번 다시 씀
+    - delete_missing=True일 때만 원본에 없는 문서를 삭제 대상으로 잡음
+    - seen을 넘기면 chunk를 나눠 호출해도 앞 chunk에 나온 문서 ID를 건너뜀
+    """
+    plan = SyncPlan()
+    if seen is None:
+        seen = set()
+    for doc_id, data in documents:
+        if doc_id in seen:
+            continue
+        seen.add(doc_id)
+        data = with_content_hash(data)
+        if doc_id not in remote:
+            plan.added.append((doc_id, data))
+            continue
+        remote_hash, remote_modified = remote[doc_id]
+        modified = data.get('modifiedtime') or ''
+        if remote_hash == data['content_hash']:
+            plan.unchanged += 1
+        elif remote_modified and modified and remote_modified > modified:
+            plan.stale.append(doc_id)
+        elif remote_hash is None:
+            plan.changed.append((doc_id, data, 'no_content_hash'))
+        elif modified != remote_modified:
+            plan.changed.append((doc_id, data, f'modifiedtime {remote_modified or "-"} -> {modified or "-"}'))
+        else:
+            plan.changed.append((doc_id, data, 'content_hash'))
+    if delete_missing:
+        plan.deleted = sorted(doc_id for doc_id in remote if doc_id not in seen)
+    return plan
+
+
+def confirm_deletes_interactively(plan: SyncPlan) -> bool:
+    """삭제 예정 개수를 보여 주고 터미널에서 yes 입력을 받아야 삭제 진행"""
+    try:
+        answer = input(f"⚠️  원본에 없는 문서 {len(plan.deleted)}개를 삭제합니다. 계속하려면 'yes' 입력: ")
+    except EOFError:
+        return False
+    return answer.strip().lower() == 'yes'
+
+
+def sync_collection(db, documents: Iterable[Tuple[str, Dict]], collection: str = TOUR_COLLECTION,
+                    delete_missing: bool = False, dry_run: bool = False,
+                    confirm_deletes: Optional[Callable[[SyncPlan], bool]] = None,
+                    chunk_size: int = SYNC_CHUNK_SIZE, **ingest_options) -> Tuple[SyncPlan, Optional[IngestReport]]:
+    """추가/변경(delete_missing이면 삭제도)된 문서만 쓰기 (dry_run이면 계획만 반환)
+
+    원본은 chunk_size개씩 비교해 바뀐 문서를 곧바로 bulk_ingest로 흘려보내고, 반환하는 plan에는
+    문서 ID/title만 남깁니다. 삭제 대상은 원본을 끝까지 읽은 뒤에 정해지므로 추가/변경 쓰기가 끝난 다음
+    confirm_deletes(plan)로 확인받고, False면 삭제만 뺍니다.
+    """
+    remote = fetch_sync_state(db.collection(collection))
+    print(f"🔍 {collection} 기존 문서 {len(remote)}개 (content_hash/modifiedtime만 조회)")
+    plan = SyncPlan()
+    seen: Set[str] = set()
+
+    def planned_writes():
+        iterator = iter(documents)
+        while True:
+            chunk = list(islice(iterator, max(1, chunk_size)))
+            if not chunk:
+                return
+            part = plan_sync(chunk, remote, seen=seen)
+            plan.absorb(part)
+            yield from part.documents()
+
+    if dry_run:
+        for _ in planned_writes():
+            pass
+        report = None
+    else:
+        report = bulk_ingest(db, planned_writes(), collection=collection, **ingest_options)
+    if delete_missing:
+        plan.deleted = sorted(doc_id for doc_id in remote if doc_id not in seen)
+    plan.print_report()
+    if dry_run:
+        return plan, None
+    if plan.deleted:
+        print(f"🗑️  삭제 예정: {len(plan.deleted)}개 (컬렉션 {len(remote)}개 중)")
+        if confirm_deletes is not None and not confirm_deletes(plan):
+            print("⏭️  삭제를 취소했습니다. 추가/변경만 반영했습니다.")
+            plan.deleted = []
+    if plan.deleted:
+        report.merge(bulk_ingest(db, (), collection=collection, deletes=plan.deleted, **ingest_options))
+    return plan, report if report.submitted else None
+
+
+def bulk_ingest(db, documents: Iterable[Tuple[str, Dict]], collection: str = TOUR_COLLECTION,
+                deletes: Iterable[str] = (), mode: str = 'bulk', workers: int = 8,
+                max_attempts: int = 5, initial_ops_per_second: int = 500, max_ops_per_second: int = 10000,
+                progress_every: int = 1000, merge: bool = False) -> IngestReport:
+    """(문서 ID, 데이터)를 set으로 쓰고 deletes의 문서 ID를 삭제
+
+    documents는 제너레이터여도 되며 읽는 대로 전송하므로 목록 전체를 메모리에 올리지 않습니다
+    (BulkWriter는 처리량 제한에 걸리면 제출을 막고, batch 모드는 commit 중인 배치 수를 workers의 2배로 제한).
+    report.submitted는 제출할 때마다 늘어납니다.
+    """
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Unknown ingest mode: {mode} (choose from {', '.join(INGEST_MODES)})")
+    report = IngestReport(mode)
+    collection_ref = db.collection(collection)
+    delete_ids = set(deletes)
+    operations = _unique_operations(documents, delete_ids, report)
+    first = next(operations, None)
+    if first is None:
+        return report.finish()
+    operations = _prepend(first, operations)
+
+    print(f"🚚 {collection}에 쓰기 시작 ({mode}, 최대 {max_attempts}회 시도)")
+    if mode == 'bulk':
+        _ingest_with_bulk_writer(db, collection_ref, operations, delete_ids, report, max_attempts,
+                                 initial_ops_per_second, max_ops_per_second, progress_every, merge)
+    else:
+        _ingest_with_batches(db, collection_ref, operations, report, workers, max_attempts, progress_every, merge)
+    report.finish()
+    print(f"📈 적재 완료: {report.summary()}")
+    return report
+
+
+def _unique_operations(documents: Iterable[Tuple[str, Dict]], delete_ids: Set[str], report: IngestReport):
+    """(문서 ID, 데이터 또는 삭제면 None)을 하나씩 내보내며 report.submitted 증가
+
+    같은 문서 ID는 처음 나온 값만 쓰고 (plan_sync와 같은 규칙), deletes에 있는 ID는 쓰지 않고 삭제만 함
+    (BulkWriter는 배치를 병렬로 보내 같은 문서에 대한 쓰기 순서를 보장하지 않음)
+    """
+    seen = set(delete_ids)
+    for doc_id, data in documents:
+        if doc_id in seen:
+            continue
+        seen.add(doc_id)
+        report.submitted += 1
+        yield doc_id, data
+    for doc_id in delete_ids:
+        report.submitted += 1
+        yield doc_id, None
+
+
+def _prepend(first, iterator):
+    yield first
+    yield from iterator
+
+
+def _ingest_with_bulk_writer(db, collection_ref, operations, deleted_ids: Set[str], report: IngestReport,
+                             max_attempts: int, initial_ops_per_second: int, max_ops_per_second: int,
+                             progress_every: int, merge: bool) -> None:
+    writer = db.bulk_writer(options=BulkWriterOptions(
+        initial_ops_per_second=initial_ops_per_second,
+        max_ops_per_second=max(initial_ops_per_second, max_ops_per_second),
+        retry=BulkRetry.exponential,
+    ))
+
+    def on_result(reference, result, bulk_writer):
+        is_delete = reference.id in deleted_ids
+        done = report.add(written=0 if is_delete else 1, deleted=1 if is_delete else 0)
+        _print_progress(done, report, progress_every)
+
+    def on_error(failure, bulk_writer):
+        # failure.attempts는 이미 예약된 재시도 횟수(첫 실패 시 0)이므로 방금 실패한 시도는 attempts + 1번째
+        # → batch 모드와 같이 총 시도 횟수가 max_attempts를 넘지 않도록 함
+        if failure.code in RETRYABLE_CODES and failure.attempts + 1 < max_attempts:
+            report.add(retried=1)
+            return True
+        report.add(failed=1, error=f"{failure.operation.reference.id}: {failure.message}")
+        return False
+
+    writer.on_write_result(on_result)
+    writer.on_write_error(on_error)
+    for doc_id, data in operations:
+        reference = collection_ref.document(doc_id)
+        if data is None:
+            writer.delete(reference)
+        else:
+            writer.set(reference, data, merge=merge)
+    # close()는 재시도 예약분을 다시 넣기 전에 writer를 닫아 버리므로 flush()로 끝까지 전송
+    writer.flush()
+    # GAPIC 재시도 후에도 배치 RPC가 예외를 던지면 그 예외는 executor future 안에 남고 콜백이 불리지 않음
+    # → 결과도 실패도 보고되지 않은 나머지를 실패로 기록
+    unaccounted = report.unaccounted
+    if unaccounted > 0:
+        report.add(failed=unaccounted, error=f"{unaccounted}개 쓰기의 결과를 받지 못함 (배치 RPC 실패)")
+
+
+def _ingest_with_batches(db, collection_ref, operations, report: IngestReport, workers: int,
+                         max_attempts: int, progress_every: int, merge: bool) -> None:
+    def commit(chunk):
+        deletes = sum(1 for _, data in chunk if data is None)
+        for attempt in range(1, max_attempts + 1):
+            batch = db.batch()
+            for doc_id, data in chunk:
+                reference = collection_ref.document(doc_id)
+                if data is None:
+                    batch.delete(reference)
+                else:
+                    batch.set(reference, data, merge=merge)
+            try:
+                batch.commit()
+            except RETRYABLE_EXCEPTIONS as e:
+                if attempt == max_attempts:
+                    report.add(failed=len(chunk), error=f"batch({chunk[0][0]}..): {e}")
+                    return
+                report.add(retried=1)
+                delay = min(0.5 * (2 ** (attempt - 1)), 30.0)
+                print(f"⚠️  배치 쓰기 재시도 ({attempt}/{max_attempts}, {delay:.1f}s 후): {e}")
+                time.sleep(delay)
+                continue
+            except Exception as e:
+                report.add(failed=len(chunk), error=f"batch({chunk[0][0]}..): {e}")
+                return
+            done = report.add(written=len(chunk) - deletes, deleted=deletes)
+            _print_progress(done, report, progress_every, step=len(chunk))
+            return
+
+    # 읽은 만큼만 배치로 묶어 보내고, commit 중인 배치가 workers * 2개면 하나가 끝날 때까지 기다림
+    workers = max(1, workers)
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tour-ingest') as executor:
+        while True:
+            chunk = list(islice(operations, FIRESTORE_BATCH_LIMIT))
+            if not chunk:
+                break
+            if len(in_flight) >= workers * 2:
+                _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            in_flight.add(executor.submit(commit, chunk))
+        for future in in_flight:
+            future.result()
+
+
+def _print_progress(done: int, report: IngestReport, progress_every: int, step: int = 1) -> None:
+    if progress_every and done // progress_every != (done - step) // progress_every:
+        elapsed = time.perf_counter() - report.started
+        print(f"⏳ 진행률: {done}/{report.submitted} ({done / report.submitted * 100:.1f}%, {done / elapsed:.1f}개/s)")
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+TourAPI 데이터 단일 패스 스트리밍 파이프라인
+
+add_prices.py -> convert_price_to_string.py -> load.py 순서로 파일 전체를 json.load 하고 다시 쓰던 과정을
+한 번에 처리합니다.
+- iter_tour_items: response.body.items.item 배열을 청크 단위로 읽으며 항목을 하나씩 디코딩
+  (파일 크기와 무관하게 메모리는 항목 하나 + 읽기 버퍼 수준)
+- 단계(stage): 항목 dict -> 항목 dict (None이면 제외). 가격 책정, 가격 문자열화, 정규화,
+  카테고리 매핑, 태그 생성을 원하는 순서로 조합
+- 싱크(sink): Firestore(tour_ingest로 chunk 단위 병렬 쓰기 또는 --sync) 또는 한 줄에 문서 하나인 NDJSON 파일
+
+사용 예:
+    python tour_pipeline.py us_tourdata_final.txt --sink ndjson --output tour_list.ndjson
+    python tour_pipeline.py us_tourdata_final.txt --sink firestore --sync --dry-run
+"""
+import argparse
+import json
+import re
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from add_prices import get_price_by_category_and_title
+from tour_ingest import (
+    INGEST_MODES, TOUR_COLLECTION, bulk_ingest, confirm_deletes_interactively, sync_collection, with_content_hash,
+)
+
+Stage = Callable[[Dict], Optional[Dict]]
+
+TOUR_ITEMS_PATH = ('response', 'body', 'items', 'item')
+
+# Firestore 문서로 옮기는 TourAPI 문자열 필드 (load.py 문서 구성 순서 유지)
+BASIC_FIELDS = ('title', 'category', 'addr1', 'addr2', 'overview', 'price', 'tel', 'firstimage', 'firstimage2')
+DETAIL_FIELDS = (
+    'mapx', 'mapy',
+    'contentid', 'contenttypeid', 'areacode', 'sigungucode',
+    'cat1', 'cat2', 'cat3',
+    'lDongRegnCd', 'lDongSignguCd', 'lclsSystm1', 'lclsSystm2', 'lclsSystm3',
+    'cpyrhtDivCd', 'zipcode', 'mlevel',
+)
+
+CATEGORY_MAP = {
+    '12': '관광지',
+    '14': '문화시설',
+    '15': '축제공연행사',
+    '28': '레포츠',
+    '32': '숙박',
+    '38': '쇼핑',
+    '39': '음식점'
+}
+
+CAT1_TAGS = {
+    'A01': '자연',
+    'A02': '인문',
+    'A03': '레포츠',
+    'A04': '쇼핑',
+    'A05': '음식',
+    'B02': '숙박',
+}
+
+
+class _JSONStream:
+    """파일을 chunk_size 문자씩 읽으면서 raw_decode로 값을 하나씩 꺼내는 커서"""
+
+    def __init__(self, file, chunk_size: int):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        # 이미 소비한 앞부분은 버려서 버퍼가 항목 하나 크기 이상으로 커지지 않게 함
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, *chars: str) -> str:
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected {' or '.join(repr(c) for c in chars)} but found {char!r}")
+        self._pos += 1
+        return char
+
+    def decode(self):
+        """다음 JSON 값 하나 (버퍼 끝에서 잘린 값이면 더 읽어서 다시 시도)"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # 숫자처럼 버퍼 끝에서 끝난 값은 뒤에 이어지는 문자가 있을 수 있음
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+
+def iter_tour_items(path: str, items_path: Sequence[str] = TOUR_ITEMS_PATH,
+                    chunk_size: int = 64 * 1024) -> Iterator[Dict]:
+    """TourAPI 응답 파일의 response.body.items.item 항목을 하나씩 반환"""
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JSONStream(f, chunk_size)
+        for depth, key in enumerate(items_path):
+            # 결과가 없으면 TourAPI는 "items": ""처럼 중간 경로 값을 객체가 아닌 값으로 보냄
+            if depth and stream.peek() != '{':
+                stream.decode()
+                return
+            stream.expect('{')
+            while True:
+                if stream.peek() == '}':
+                    raise KeyError(f"'{key}' not found in {path}")
+                name = stream.decode()
+                stream.expect(':')
+                if name == key:
+                    break
+                stream.decode()  # 경로에 없는 형제 값(header 등)은 건너뜀
+                stream.expect(',', '}')
+
+        # 결과가 하나면 객체, 없으면 빈 문자열로 오는 TourAPI 응답도 처리
+        char = stream.peek()
+        if char == '[':
+            stream.expect('[')
+            if stream.peek() == ']':
+                return
+            while True:
+                yield stream.decode()
+                if stream.expect(',', ']') == ']':
+                    return
+        value = stream.decode()
+        if isinstance(value, dict):
+            yield value
+
+
+def price_stage(overwrite: bool = False) -> Stage:
+    """add_prices 규칙으로 price 책정 (overwrite=False면 이미 있는 price 유지)"""
+    def assign_price(item: Dict) -> Dict:
+        if overwrite or item.get('price') in (None, ''):
+            item = {**item, 'price': get_price_by_category_and_title(item)}
+        return item
+    return assign_price
+
+
+def stringify_price(item: Dict) -> Dict:
+    """price를 문자열로 변환 (convert_price_to_string.py와 같은 결과)"""
+    if 'price' in item and not isinstance(item['price'], str):
+        item = {**item, 'price': str(item['price'])}
+    return item
+
+
+def normalize_item(item: Dict) -> Dict:
+    """문자열 필드 앞뒤 공백 제거"""
+    return {key: value.strip() if isinstance(value, str) else value for key, value in item.items()}
+
+
+def get_category_name(contenttypeid):
+    """contenttypeid를 카테고리명으로 변환"""
+    return CATEGORY_MAP.get(contenttypeid, '일반')
+
+
+def map_category(item: Dict) -> Dict:
+    return {**item, 'category': get_category_name(item.get('contenttypeid', ''))}
+
+
+def tag_item(item: Dict) -> Dict:
+    """연락처/이미지/저작권 여부, 지역, 분류(cat1) 태그와 검색용 키워드 추가"""
+    tags = []
+    if item.get('tel'):
+        tags.append('연락처있음')
+    if item.get('firstimage'):
+        tags.append('이미지있음')
+    if item.get('cpyrhtDivCd'):
+        tags.append('저작권표시')
+
+    # 지역 정보 추가
+    tags.append('의성군')
+    tags.append('경상북도')
+
+    # 분류별 태그 추가
+    if item.get('cat1') in CAT1_TAGS:
+        tags.append(CAT1_TAGS[item['cat1']])
+
+    # 검색용 키워드 (제목을 공백으로 분리)
+    title = item.get('title', '')
+    keywords = title.replace('(', ' ').replace(')', ' ').replace('[', ' ').replace(']', ' ').split()
+    return {**item, 'tags': tags, 'search_keywords': keywords}
+
+
+DEFAULT_STAGES: Tuple[Stage, ...] = (price_stage(), stringify_price, normalize_item, map_category, tag_item)
+
+
+def tour_document_id(item, index):
+    """contentid 기반 Firestore 문서 ID (contentid가 없으면 대체 ID 생성)"""
+    content_id = str(item.get('contentid', '')).strip()
+
+    # contentid가 비어있거나 유효하지 않은 경우 대체 ID 생성
+    if not content_id:
+        content_id = f'item_{index}_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+        print(f"⚠️  contentid가 없어서 대체 ID 생성: {content_id}")
+
+    # 문서 ID 유효성 검사 (Firestore 문서 ID 규칙)
+    if len(content_id) > 1500:  # Firestore 문서 ID 최대 길이
+        content_id = content_id[:1500]
+
+    # 특수문자 제거 (Firestore에서 허용하지 않는 문자들)
+    return re.sub(r'[^\w\-_.]', '_', content_id)
+
+
+def to_tour_document(item: Dict, source: str = 'us_tourdata_final.txt') -> Dict:
+    """단계를 거친 항목 -> tour_list 문서 데이터 (빈 값 제거)"""
+    mapx, mapy = item.get('mapx'), item.get('mapy')
+    doc_data = {field: item.get(field, '') for field in BASIC_FIELDS}
+    doc_data.update({
+        # 위치 정보
+        'latitude': float(mapy) if mapy else None,
+        'longitude': float(mapx) if mapx else None,
+    })
+    doc_data.update({field: item.get(field, '') for field in DETAIL_FIELDS})
+    doc_data.update({
+        'readcount': 0,
+
+        # 시간 정보
+        'createdtime': item.get('createdtime', ''),
+        'modifiedtime': item.get('modifiedtime', ''),
+
+        # 메타데이터
+        'tags': item.get('tags', []),
+        'source': source,
+        'region': '의성군',
+        'province': '경상북도',
+        'loaded_at': datetime.now().isoformat(),
+        'search_keywords': item.get('search_keywords', []),
+    })
+    return {k: v for k, v in doc_data.items() if v is not None and v != '' and v != []}
+
+
+def build_tour_document(item: Dict) -> Dict:
+    """TourAPI 항목 -> tour_list 문서 데이터 (가격은 원본 값 그대로)"""
+    return to_tour_document(tag_item(map_category(normalize_item(item))))
+
+
+class TourPipeline:
+    """항목 스트림에 단계를 차례로 적용해 (문서 ID, 문서) 스트림을 만드는 파이프라인"""
+
+    def __init__(self, stages: Iterable[Stage] = DEFAULT_STAGES, source: str = 'us_tourdata_final.txt'):
+        self.stages: List[Stage] = list(stages)
+        self.source = source
+        self.read = 0
+        self.dropped = 0
+        self.failed = 0
+        self.emitted = 0
+
+    def process(self, item: Dict) -> Optional[Dict]:
+        for stage in self.stages:
+            item = stage(item)
+            if item is None:
+                return None
+        return item
+
+    def documents(self, items: Iterable[Dict]) -> Iterator[Tuple[str, Dict]]:
+        for index, item in enumerate(items, 1):
+            self.read += 1
+            try:
+                processed = self.process(item)
+                if processed is None:
+                    self.dropped += 1
+                    continue
+                document = (tour_document_id(processed, index), to_tour_document(processed, self.source))
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ 항목 {index} 변환 실패: {e} (제목: {item.get('title', 'N/A')})")
+                continue
+            self.emitted += 1
+            yield document
+
+    def run(self, items: Iterable[Dict], sink) -> Dict:
+        started = time.perf_counter()
+        sink_stats = sink.write(self.documents(items))
+        elapsed = time.perf_counter() - started
+        stats = self.stats()
+        stats.update({
+            'elapsed_seconds': round(elapsed, 3),
+            'items_per_second': round(self.read / elapsed, 1) if elapsed else 0.0,
+            'sink': sink_stats,
+        })
+        return stats
+
+    def stats(self) -> Dict:
+        return {'read': self.read, 'dropped': self.dropped, 'failed': self.failed, 'emitted': self.emitted}
+
+
+class NDJSONSink:
+    """한 줄에 {"id": 문서 ID, ...문서} 하나씩 쓰는 압축 출력 (들여쓰기 없음)"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, documents: Iterable[Tuple[str, Dict]]) -> Dict:
+        count = 0
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for doc_id, data in documents:
+                f.write(json.dumps({'id': doc_id, **data}, ensure_ascii=False, separators=(',', ':')))
+                f.write('\n')
+                count += 1
+        print(f"💾 {self.path}에 {count}개 문서 저장")
+        return {'path': self.path, 'written': count}
+
+
+class FirestoreSink:
+    """tour_ingest로 Firestore에 쓰기
+
+    기본은 chunk_size개씩 모아 bulk_ingest로 덮어쓰므로 메모리는 chunk 하나 크기로 일정합니다.
+    sync=True면 tour_ingest.sync_collection으로 추가/변경된 문서만 씁니다 (delete_missing이면 삭제도,
+    confirm_deletes로 확인받은 뒤). 이때도 chunk_size개씩 비교/쓰기하므로 기존 문서의 content_hash/modifiedtime
+    목록과 chunk 하나만 메모리에 둡니다.
+    """
+
+    def __init__(self, db, collection: str = None, chunk_size: int = 5000, sync: bool = False,
+                 dry_run: bool = False, delete_missing: bool = False, confirm_deletes=None, **ingest_options):
+        self.db = db
+        self.collection = collection or TOUR_COLLECTION
+        self.chunk_size = chunk_size
+        self.sync = sync
+        self.dry_run = dry_run
+        self.delete_missing = delete_missing
+        self.confirm_deletes = confirm_deletes
+        self.ingest_options = ingest_options
+
+    def write(self, documents: Iterable[Tuple[str, Dict]]) -> Dict:
+        if self.sync or self.dry_run:
+            plan, report = sync_collection(self.db, documents, collection=self.collection,
+                                           delete_missing=self.delete_missing, dry_run=self.dry_run,
+                                           confirm_deletes=self.confirm_deletes, chunk_size=self.chunk_size,
+                                           **self.ingest_options)
+            return {'plan': plan.stats(), 'ingest': report.stats() if report else None}
+
+        totals = {'written': 0, 'failed': 0, 'retried': 0}
+        started = time.perf_counter()
+        chunk = []
+        for doc_id, data in documents:
+            chunk.append((doc_id, with_content_hash(data)))
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk, totals)
+                chunk = []
+        if chunk:
+            self._flush(chunk, totals)
+        elapsed = time.perf_counter() - started
+        totals['docs_per_second'] = round(totals['written'] / elapsed, 1) if elapsed else 0.0
+        return totals
+
+    def _flush(self, chunk, totals: Dict) -> None:
+        report = bulk_ingest(self.db, chunk, collection=self.collection, **self.ingest_options)
+        totals['written'] += report.written
+        totals['failed'] += report.failed
+        totals['retried'] += report.retried
+        for error in report.errors:
+            print(f"❌ 저장 실패: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TourAPI 응답 파일 -> 가격/정규화/카테고리/태그 -> Firestore 또는 NDJSON")
+    parser.add_argument('input', nargs='?', default='us_tourdata_final.txt', help="TourAPI 응답 JSON 파일")
+    parser.add_argument('--sink', choices=('firestore', 'ndjson'), default='ndjson')
+    parser.add_argument('--output', default='tour_list.ndjson', help="ndjson 출력 경로")
+    parser.add_argument('--reprice', action='store_true', help="이미 있는 price도 add_prices 규칙으로 다시 책정")
+    parser.add_argument('--mode', choices=INGEST_MODES, default='bulk', help="Firestore 쓰기 방식")
+    parser.add_argument('--workers', type=int, default=8, help="batch 모드 동시 commit 수")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="Firestore에 한 번에 넘기는 문서 수")
+    parser.add_argument('--sync', action='store_true', help="추가/변경된 문서만 반영")
+    parser.add_argument('--dry-run', action='store_true', help="--sync 차이 보고서만 출력")
+    parser.add_argument('--delete-missing', action='store_true',
+                        help="--sync에서 원본에 없는 문서도 삭제 (다른 스크립트가 쓴 문서도 지워지므로 주의)")
+    parser.add_argument('--yes', action='store_true', help="--delete-missing 삭제 확인 질문 생략")
+    args = parser.parse_args()
+
+    stages = (price_stage(overwrite=args.reprice), stringify_price, normalize_item, map_category, tag_item)
+    pipeline = TourPipeline(stages)
+    if args.sink == 'ndjson':
+        sink = NDJSONSink(args.output)
+    else:
+        from google.cloud import firestore
+        sink = FirestoreSink(firestore.Client(), chunk_size=args.chunk_size, sync=args.sync, dry_run=args.dry_run,
+                             delete_missing=args.delete_missing,
+                             confirm_deletes=None if args.yes else confirm_deletes_interactively,
+                             mode=args.mode, workers=args.workers)
+
+    print(f"🚰 {args.input} -> {args.sink} 스트리밍 처리 시작")
+    stats = pipeline.run(iter_tour_items(args.input), sink)
+    print(f"\n✅ 완료: 읽음 {stats['read']}개, 출력 {stats['emitted']}개, 제외 {stats['dropped']}개, "
+          f"실패 {stats['failed']}개 ({stats['elapsed_seconds']:.2f}s, {stats['items_per_second']:.1f}개/s)")
+
+
+if __name__ == '__main__':
+    main()
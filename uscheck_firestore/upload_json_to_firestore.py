@@ -1,15 +1,16 @@
-import json
 import os
 from google.cloud import firestore
 from django.conf import settings
 from google.oauth2 import service_account
 from django.core.management.base import BaseCommand
+from tour_ingest import TOUR_COLLECTION, bulk_ingest, with_content_hash
+from tour_pipeline import iter_tour_items
 
 
 cred_path = os.environ.get("FIRESTORE_CREDENTIALS", "./gen-lang-client-0000121060-ea7b2bef1534.json")
 credentials = service_account.Credentials.from_service_account_file(cred_path)
 DATABASE = firestore.Client(credentials=credentials)
-def upload_json_to_firestore():
+def upload_json_to_firestore(mode='bulk'):
     """JSON 파일의 데이터를 Firestore에 업로드"""
     try:
         # Firestore 클라이언트 초기화
@@ -18,64 +19,63 @@ def upload_json_to_firestore():
         # JSON 파일 읽기
         json_file_path = os.path.join(os.path.dirname(__file__), 'uscheck_firestore', 'us_tourdata_final.txt')
         
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
+        # JSON 구조(response.body.items.item)에서 관광지 데이터를 하나씩 읽음
+        tour_items = iter_tour_items(json_file_path)
         
-        # JSON 구조에서 관광지 데이터 추출
-        tour_items = data['response']['body']['items']['item']
-        
-        # tour_list 컬렉션에 데이터 업로드
-        collection_ref = db.collection('tour_list')
-        
-        upload_count = 0
-        for item in tour_items:
-            try:
-                # contentid를 문서 ID로 사용
-                doc_id = item.get('contentid', '')
+        # tour_list 컬렉션에 올릴 문서를 읽는 대로 bulk_ingest로 넘김 (목록으로 모으지 않음)
+        def documents():
+            for item in tour_items:
+                try:
+                    # contentid를 문서 ID로 사용
+                    doc_id = item.get('contentid', '')
                 
-                if not doc_id:
-                    print(f"contentid가 없는 항목 건너뜀: {item.get('title', 'Unknown')}")
-                    continue
+                    if not doc_id:
+                        print(f"contentid가 없는 항목 건너뜀: {item.get('title', 'Unknown')}")
+                        continue
                 
-                # 필요한 필드들 정리
-                tour_data = {
-                    'id': doc_id,  # AI 추천에서 사용할 ID
-                    'name': item.get('title', ''),  # AI 추천에서 사용할 이름
-                    'title': item.get('title', ''),
-                    'overview': item.get('overview', ''),
-                    'addr1': item.get('addr1', ''),
-                    'addr2': item.get('addr2', ''),
-                    'areacode': item.get('areacode', ''),
-                    'cat1': item.get('cat1', ''),
-                    'cat2': item.get('cat2', ''),
-                    'cat3': item.get('cat3', ''),
-                    'contentid': item.get('contentid', ''),
-                    'contenttypeid': item.get('contenttypeid', ''),
-                    'createdtime': item.get('createdtime', ''),
-                    'firstimage': item.get('firstimage', ''),
-                    'firstimage2': item.get('firstimage2', ''),
-                    'mapx': item.get('mapx', ''),
-                    'mapy': item.get('mapy', ''),
-                    'tel': item.get('tel', ''),
-                    'zipcode': item.get('zipcode', ''),
-                    'modifiedtime': item.get('modifiedtime', ''),
-                    'sigungucode': item.get('sigungucode', ''),
-                    'cpyrhtDivCd': item.get('cpyrhtDivCd', ''),
-                    'mlevel': item.get('mlevel', ''),
-                    'category': get_category_name(item.get('cat1', '')),  # AI 추천에서 사용할 카테고리
-                }
+                    # 필요한 필드들 정리
+                    tour_data = {
+                        'id': doc_id,  # AI 추천에서 사용할 ID
+                        'name': item.get('title', ''),  # AI 추천에서 사용할 이름
+                        'title': item.get('title', ''),
+                        'overview': item.get('overview', ''),
+                        'addr1': item.get('addr1', ''),
+                        'addr2': item.get('addr2', ''),
+                        'areacode': item.get('areacode', ''),
+                        'cat1': item.get('cat1', ''),
+                        'cat2': item.get('cat2', ''),
+                        'cat3': item.get('cat3', ''),
+                        'contentid': item.get('contentid', ''),
+                        'contenttypeid': item.get('contenttypeid', ''),
+                        'createdtime': item.get('createdtime', ''),
+                        'firstimage': item.get('firstimage', ''),
+                        'firstimage2': item.get('firstimage2', ''),
+                        'mapx': item.get('mapx', ''),
+                        'mapy': item.get('mapy', ''),
+                        'tel': item.get('tel', ''),
+                        'zipcode': item.get('zipcode', ''),
+                        'modifiedtime': item.get('modifiedtime', ''),
+                        'sigungucode': item.get('sigungucode', ''),
+                        'cpyrhtDivCd': item.get('cpyrhtDivCd', ''),
+                        'mlevel': item.get('mlevel', ''),
+                        'category': get_category_name(item.get('cat1', '')),  # AI 추천에서 사용할 카테고리
+                    }
+                    document = with_content_hash(tour_data)
                 
-                # Firestore에 문서 추가
-                collection_ref.document(doc_id).set(tour_data)
-                upload_count += 1
-                print(f"업로드 완료: {tour_data['title']} (ID: {doc_id})")
+                except Exception as e:
+                    print(f"개별 항목 변환 실패: {item.get('title', 'Unknown')} - {e}")
+                    continue
                 
-            except Exception as e:
-                print(f"개별 항목 업로드 실패: {item.get('title', 'Unknown')} - {e}")
-                continue
+                yield doc_id, document
+        
+        # 항목별 set 대신 병렬 일괄 쓰기 (처리량 초과 시 재시도)
+        report = bulk_ingest(db, documents(), collection=TOUR_COLLECTION, mode=mode)
+        for error in report.errors:
+            print(f"개별 항목 업로드 실패: {error}")
         
-        print(f"\n총 {upload_count}개의 관광지 데이터가 Firestore에 업로드되었습니다.")
-        return True
+        print(f"\n총 {report.written}개의 관광지 데이터가 Firestore에 업로드되었습니다. "
+              f"({report.docs_per_second:.1f}개/s, 실패 {report.failed}개)")
+        return report.failed == 0
         
     except Exception as e:
         print(f"Firestore 업로드 중 오류 발생: {e}")
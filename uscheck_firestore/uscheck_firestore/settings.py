@@ -24,6 +24,91 @@ os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = FIRESTORE_CREDENTIALS
 # Google Cloud Settings
 GOOGLE_APPLICATION_CREDENTIALS = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+# Gemini 응답을 스트리밍으로 받아 keywords/categories가 완성되면 생성 완료 전에 후보 검색 시작
+GEMINI_STREAM_ANALYSIS = os.environ.get('GEMINI_STREAM_ANALYSIS', 'true').lower() == 'true'
+# compact: response_schema로 제한된 짧은 JSON 분석 / legacy: 기존 자유 형식 프롬프트
+GEMINI_ANALYSIS_MODE = os.environ.get('GEMINI_ANALYSIS_MODE', 'legacy')
+GEMINI_COMPACT_MAX_OUTPUT_TOKENS = int(os.environ.get('GEMINI_COMPACT_MAX_OUTPUT_TOKENS', '256'))
+
+# /api/query/ 시간 예산 Settings (Gemini가 느리거나 실패하면 로컬 폴백 분석 사용)
+QUERY_DEADLINE_SECONDS = float(os.environ.get('QUERY_DEADLINE_SECONDS', '12'))
+QUERY_HYDRATION_RESERVE_SECONDS = float(os.environ.get('QUERY_HYDRATION_RESERVE_SECONDS', '2'))
+GEMINI_TIMEOUT_SECONDS = float(os.environ.get('GEMINI_TIMEOUT_SECONDS', '8'))
+GEMINI_MIN_BUDGET_SECONDS = float(os.environ.get('GEMINI_MIN_BUDGET_SECONDS', '1'))
+GEMINI_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('GEMINI_BREAKER_FAILURE_THRESHOLD', '5'))
+GEMINI_BREAKER_RESET_SECONDS = float(os.environ.get('GEMINI_BREAKER_RESET_SECONDS', '30'))
+
+# Gemini 동시 호출 한도 Settings (대기열이 가득 차거나 QUEUE_TIMEOUT 안에 차례가 오지 않으면 OVERLOAD_ACTION)
+GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', '8'))
+GEMINI_MAX_QUEUE = int(os.environ.get('GEMINI_MAX_QUEUE', '16'))
+GEMINI_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('GEMINI_QUEUE_TIMEOUT_SECONDS', '3'))
+GEMINI_OVERLOAD_ACTION = os.environ.get('GEMINI_OVERLOAD_ACTION', 'fallback')  # fallback | reject (503)
+
+# Gemini hedging Settings (최근 지연 시간 p 백분위수가 지나도 응답이 없으면 같은 요청을 한 번 더 전송)
+GEMINI_HEDGE_ENABLED = os.environ.get('GEMINI_HEDGE_ENABLED', 'false').lower() == 'true'
+GEMINI_HEDGE_PERCENTILE = float(os.environ.get('GEMINI_HEDGE_PERCENTILE', '95'))
+GEMINI_HEDGE_MAX_RATIO = float(os.environ.get('GEMINI_HEDGE_MAX_RATIO', '0.1'))  # 전체 요청 중 hedge 비율 상한
+GEMINI_HEDGE_MIN_SAMPLES = int(os.environ.get('GEMINI_HEDGE_MIN_SAMPLES', '20'))
+
+# 추천 결과 구성 규칙 (최소 개수, 음식점 최소 개수, 숙박시설 전부 포함)
+# GEMINI_ANALYSIS_MODE=compact면 이 값과 무관하게 항상 적용 (compact 프롬프트에는 규칙이 없음)
+RECOMMENDATION_QUOTAS_ENABLED = os.environ.get('RECOMMENDATION_QUOTAS_ENABLED', 'false').lower() == 'true'
+RECOMMENDATION_MIN_RESULTS = int(os.environ.get('RECOMMENDATION_MIN_RESULTS', '15'))
+RECOMMENDATION_MIN_RESTAURANTS = int(os.environ.get('RECOMMENDATION_MIN_RESTAURANTS', '3'))
+
+# 워커 시작 시 미리 생성할 공유 클라이언트 (firestore, gemini_model, pubsub_publisher, storage)
+# wsgi.py/asgi.py로 시작한 서버 프로세스에서만 적용
+CLIENT_WARM_UP = [name for name in os.environ.get('CLIENT_WARM_UP', 'firestore,gemini_model').split(',') if name]
+
+# tour_list 스냅샷 캐시 Settings
+TOUR_CACHE_MODE = os.environ.get('TOUR_CACHE_MODE', 'listener')  # listener | poll
+TOUR_CACHE_POLL_INTERVAL = float(os.environ.get('TOUR_CACHE_POLL_INTERVAL', '300'))
+# wsgi.py/asgi.py로 시작한 서버 프로세스에서만 적용 (manage.py 명령과 load.py 등 스크립트는 적재하지 않음)
+TOUR_CACHE_PRELOAD = os.environ.get('TOUR_CACHE_PRELOAD', 'true').lower() == 'true'
+
+# 로컬 벡터 검색 Settings
+SEMANTIC_SEARCH_ENABLED = os.environ.get('SEMANTIC_SEARCH_ENABLED', 'true').lower() == 'true'
+VECTOR_INDEX_DIR = os.environ.get('VECTOR_INDEX_DIR', str(BASE_DIR / 'var' / 'vector_index'))
+VECTOR_INDEX_DIM = int(os.environ.get('VECTOR_INDEX_DIM', '2048'))
+# 디스크에 남길 카탈로그 버전 수 (현재 포함) / 부분 변경 후 IDF 재계산·저장까지 기다리는 시간
+VECTOR_INDEX_KEEP_VERSIONS = int(os.environ.get('VECTOR_INDEX_KEEP_VERSIONS', '2'))
+VECTOR_INDEX_REBUILD_DELAY_SECONDS = float(os.environ.get('VECTOR_INDEX_REBUILD_DELAY_SECONDS', '60'))
+# 키워드 결과를 벡터 검색으로 채울 때의 최소 코사인 유사도 (0~1, 무관한 질의도 0.1 안팎이 나옴)
+VECTOR_SEARCH_MIN_SCORE = float(os.environ.get('VECTOR_SEARCH_MIN_SCORE', '0.2'))
+
+# Gemini 쿼리 분석 캐시 Settings (SQLITE_PATH를 비우면 메모리 계층만 사용)
+ANALYSIS_CACHE_ENABLED = os.environ.get('ANALYSIS_CACHE_ENABLED', 'true').lower() == 'true'
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', '1000'))
+ANALYSIS_CACHE_TTL = float(os.environ.get('ANALYSIS_CACHE_TTL', '86400'))
+# 비워 두면 메모리 캐시만 사용 (워커 간 공유/재시작 후 유지가 필요하면 예: var/analysis_cache.sqlite3)
+ANALYSIS_CACHE_SQLITE_PATH = os.environ.get('ANALYSIS_CACHE_SQLITE_PATH', '')
+
+# /api/query/ 스트리밍 응답 Settings (분석 결과 다음에 관광지를 몇 개씩 묶어 보낼지)
+QUERY_STREAM_BATCH_SIZE = int(os.environ.get('QUERY_STREAM_BATCH_SIZE', '10'))
+
+# 쿼리 파이프라인 OpenTelemetry 계측 (none | console | otlp, otlp는 OTEL_EXPORTER_OTLP_ENDPOINT 사용)
+OTEL_EXPORTER = os.environ.get('OTEL_EXPORTER', 'none').lower()
+OTEL_SERVICE_NAME = os.environ.get('OTEL_SERVICE_NAME', 'uscheck-api')
+
+# QR 생성 요청 Pub/Sub 발행 (공유 PublisherClient 배치/재시도 설정)
+PUBSUB_BATCH_MAX_MESSAGES = int(os.environ.get('PUBSUB_BATCH_MAX_MESSAGES', '100'))
+PUBSUB_BATCH_MAX_BYTES = int(os.environ.get('PUBSUB_BATCH_MAX_BYTES', str(1024 * 1024)))
+PUBSUB_BATCH_MAX_LATENCY_SECONDS = float(os.environ.get('PUBSUB_BATCH_MAX_LATENCY_SECONDS', '0.02'))
+PUBSUB_PUBLISH_TIMEOUT_SECONDS = float(os.environ.get('PUBSUB_PUBLISH_TIMEOUT_SECONDS', '10'))
+# sync: 발행 완료 후 200 응답 / async: 바로 202 응답하고 백그라운드에서 발행 (요청의 mode 값으로 덮어쓸 수 있음)
+QR_PUBLISH_MODE = os.environ.get('QR_PUBLISH_MODE', 'sync').lower()
+QR_PUBLISH_MAX_ATTEMPTS = int(os.environ.get('QR_PUBLISH_MAX_ATTEMPTS', '3'))
+QR_PUBLISH_RETRY_BACKOFF_SECONDS = float(os.environ.get('QR_PUBLISH_RETRY_BACKOFF_SECONDS', '1'))
+# qr_results 조회 캐시 (결과 문서는 바뀌지 않으므로 길게, "아직 없음"은 폴링 간격 정도로 짧게)
+QR_LOOKUP_CACHE_TTL_SECONDS = float(os.environ.get('QR_LOOKUP_CACHE_TTL_SECONDS', '3600'))
+QR_LOOKUP_NEGATIVE_TTL_SECONDS = float(os.environ.get('QR_LOOKUP_NEGATIVE_TTL_SECONDS', '1'))
+QR_LOOKUP_CACHE_MAX_ENTRIES = int(os.environ.get('QR_LOOKUP_CACHE_MAX_ENTRIES', '10000'))
+# /api/qr/wait/ long-poll 대기 시간 (클라이언트가 timeout을 더 길게 줘도 최대값으로 제한)
+QR_WAIT_DEFAULT_TIMEOUT_SECONDS = float(os.environ.get('QR_WAIT_DEFAULT_TIMEOUT_SECONDS', '20'))
+QR_WAIT_MAX_TIMEOUT_SECONDS = float(os.environ.get('QR_WAIT_MAX_TIMEOUT_SECONDS', '25'))
+
+# Prometheus 형식 /metrics 엔드포인트와 라우트별 요청 수/지연 시간 수집
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
 
 
 print(os.path.exists(os.environ["GOOGLE_APPLICATION_CREDENTIALS"]))  # True가 떠야 정상
@@ -72,6 +157,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -82,6 +168,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if not METRICS_ENABLED:
+    MIDDLEWARE.remove('api.middleware.MetricsMiddleware')
+
 ROOT_URLCONF = 'uscheck_firestore.urls'
 
 TEMPLATES = [
@@ -17,6 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from django.urls import path, include
+from django.conf import settings
+from api.views import prometheus_metrics
 
 
 urlpatterns = [
@@ -25,3 +27,6 @@ urlpatterns = [
     path('api/', include('api.urls')),
     
 ]
+
+if settings.METRICS_ENABLED:
+    urlpatterns.append(path('metrics', prometheus_metrics, name='metrics'))
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uscheck_firestore.settings')
 
 application = get_wsgi_application()
+
+# 서버 프로세스에서만 공유 클라이언트 생성/tour_list 스냅샷 미리 적재 (관리 명령/스크립트의 django.setup()에서는 하지 않음)
+from api.apps import start_server_preload  # noqa: E402
+
+start_server_preload()